@@ -11,30 +11,39 @@ Endpoints para gestionar lecciones de audio con sincronización de texto:
 """
 
 import os
+import gzip
+import asyncio
 import json
+import hashlib
 import logging
 from typing import Optional, List
 from fastapi import (
     APIRouter, Depends, HTTPException, UploadFile, File, 
-    Form, Query, BackgroundTasks, status
+    Form, Query, BackgroundTasks, Request, Response, status
 )
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pathlib import Path
 
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.api.deps import get_current_user
 from app.models.models import Usuario, AudioLesson, Estudiante
 from app.schemas.audio_lesson import (
     AudioLessonCreate, AudioLessonUpdate, AudioLessonResponse,
     AudioLessonDetail, AudioLessonList, AudioLessonStatus,
     StudentAudioProgressCreate, StudentAudioProgressResponse,
-    StudentLessonWithProgress, ProcessAudioRequest, ProcessAudioResponse,
-    TimestampsData
+    StudentAudioProgressBatch, StudentAudioProgressBatchResponse,
+    StudentLessonWithProgress, StudentModuleProgressSummary, ProcessAudioRequest, ProcessAudioResponse,
+    ProcessStatusResponse, TimestampsData
 )
 from app.services.audio_lesson_service import audio_lesson_service, AudioLessonServiceError
 from app.services.audio_storage_service import audio_storage_service, AudioStorageError
 from app.services.gentle_service import gentle_service
+from app.services.aligner_service import get_aligner
+from app.services.alignment_cache import alignment_cache
+from app.services import timestamps_codec
+from app.services.lesson_bundle_service import lesson_bundle_service, LessonBundleError
+from app.services.media_serving import MediaFile, lesson_media_cache, load_media_file, media_response
 
 logger = logging.getLogger(__name__)
 
@@ -51,11 +60,16 @@ async def check_gentle_health():
     Returns:
         Estado del servicio de alineación
     """
+    aligner = get_aligner()
     is_healthy = await gentle_service.check_health()
     
     return {
+        "aligner_backend": aligner.name,
+        "aligner_available": is_healthy if aligner is gentle_service else await aligner.check_health(),
         "gentle_available": is_healthy,
         "gentle_url": gentle_service.gentle_url,
+        "circuit_state": gentle_service.breaker.state,
+        "alignment_cache": alignment_cache.stats(),
         "message": "Gentle is ready" if is_healthy else "Gentle service is not available"
     }
 
@@ -237,46 +251,119 @@ async def upload_audio_file(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/{lesson_id}/stream")
-async def stream_audio(
-    lesson_id: int,
-    db: Session = Depends(get_db)
-):
+def _load_lesson_media(lesson_id: int) -> MediaFile:
+    """Carga los metadatos del audio de una lección (solo en fallos de caché)."""
+    db = SessionLocal()
+    try:
+        audio_url = db.query(AudioLesson.audio_url).filter(AudioLesson.id == lesson_id).scalar()
+    finally:
+        db.close()
+    
+    if audio_url is None:
+        raise LookupError("Lesson not found or has no audio file")
+    
+    extension = Path(audio_url).suffix or ".mp3"
+    return load_media_file(audio_url, f"lesson_{lesson_id}{extension}")
+
+
+@router.api_route("/{lesson_id}/stream", methods=["GET", "HEAD"])
+async def stream_audio(lesson_id: int, request: Request):
     """
     Streaming del archivo de audio con soporte para Range requests.
     
     Esto permite que los reproductores de audio soliciten partes específicas
-    del archivo (seeking).
+    del archivo (seeking): responde 206 para uno o varios rangos, 304 si el
+    ETag coincide con If-None-Match y respeta If-Range. Los metadatos del
+    archivo se guardan en memoria, así que el seeking no consulta la base de datos.
     """
-    db_lesson = audio_lesson_service.get_lesson(db, lesson_id)
-    
-    if not db_lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    
-    if not db_lesson.audio_url:
-        raise HTTPException(status_code=404, detail="Lesson has no audio file")
-    
     try:
-        logger.info(f"Streaming audio for lesson {lesson_id}. URL: {db_lesson.audio_url}")
-        file_info = audio_storage_service.get_file_info(db_lesson.audio_url)
-        logger.info(f"File info found: {file_info}")
-        
-        return FileResponse(
-            path=file_info["path"],
-            media_type=file_info["mime_type"],
-            filename=f"lesson_{lesson_id}.mp3"
-        )
+        media = await lesson_media_cache.get(lesson_id, _load_lesson_media)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except AudioStorageError as e:
         logger.error(f"AudioStorageError for lesson {lesson_id}: {e}")
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error streaming lesson {lesson_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return media_response(request, media)
+
+
+def _module_bundle(modulo_id: int):
+    """Construye (o reutiliza) el paquete del módulo en un hilo, con su propia sesión."""
+    db = SessionLocal()
+    try:
+        return lesson_bundle_service.get_bundle(db, modulo_id)
+    finally:
+        db.close()
+
+
+def _module_manifest(modulo_id: int, since: Optional[str]):
+    db = SessionLocal()
+    try:
+        return lesson_bundle_service.get_manifest(db, modulo_id, since=since)
+    finally:
+        db.close()
+
+
+@router.get("/modules/{modulo_id}/manifest")
+async def get_module_manifest(
+    modulo_id: int,
+    since: Optional[str] = Query(None, description="sync_token de la última sincronización"),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Manifiesto offline de un módulo: lecciones con su content_hash, tamaño y
+    URLs de descarga, más el sync_token actual.
+    
+    Con `since` solo se listan las lecciones nuevas o cambiadas desde esa
+    sincronización y las eliminadas (`removed_lessons`); si el token ya no se
+    reconoce, `full_sync` es true y se listan todas.
+    """
+    try:
+        return await asyncio.to_thread(_module_manifest, modulo_id, since)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.api_route("/modules/{modulo_id}/bundle", methods=["GET", "HEAD"])
+async def download_module_bundle(
+    modulo_id: int,
+    request: Request,
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Descarga todas las lecciones del módulo en un .zip (audio, timestamps
+    compactos y manifest.json). El paquete se guarda en caché y solo se
+    reconstruye cuando cambia alguna lección; admite Range para reanudar.
+    """
+    try:
+        path, manifest = await asyncio.to_thread(_module_bundle, modulo_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LessonBundleError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    stat = path.stat()
+    media = MediaFile(
+        path=str(path),
+        size=stat.st_size,
+        mime_type="application/zip",
+        sha256=manifest["sync_token"],
+        mtime=stat.st_mtime,
+        filename=f"modulo_{modulo_id}.zip"
+    )
+    response = media_response(request, media)
+    response.headers["X-Sync-Token"] = manifest["sync_token"]
+    return response
 
 
 @router.get("/{lesson_id}/timestamps")
 def get_lesson_timestamps(
     lesson_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -285,6 +372,12 @@ def get_lesson_timestamps(
     
     Este endpoint es optimizado para la app Android que solo necesita
     los timestamps después de descargar el audio.
+    
+    Formato según el encabezado Accept (ver timestamps_codec):
+    - application/json (default): el JSON guardado, sin volver a serializarlo
+    - application/vnd.audio-timestamps.packed+json: arreglo compacto; con
+      Accept-Encoding: gzip se envía el gzip precalculado tal cual
+    - application/x-msgpack: arreglo compacto en MessagePack
     """
     db_lesson = audio_lesson_service.get_lesson(db, lesson_id)
     
@@ -297,34 +390,73 @@ def get_lesson_timestamps(
             detail="Lesson has no timestamps. Process the audio first."
         )
     
+    media_type = timestamps_codec.negotiate(request.headers.get("accept"))
+    gzip_ok = timestamps_codec.accepts_gzip(request.headers.get("accept-encoding"))
+    
+    # El ETag depende del contenido y de la representación elegida
+    digest = hashlib.sha1(db_lesson.timestamps_json.encode("utf-8")).hexdigest()[:20]
+    variant = {
+        timestamps_codec.MEDIA_TYPE_JSON: "json",
+        timestamps_codec.MEDIA_TYPE_PACKED: "packed-gz" if gzip_ok else "packed",
+        timestamps_codec.MEDIA_TYPE_MSGPACK: "msgpack",
+    }[media_type]
+    headers = {
+        "ETag": f'"{digest}-{variant}"',
+        "Vary": "Accept, Accept-Encoding",
+        "Cache-Control": "private, no-cache",
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and headers["ETag"] in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    if media_type == timestamps_codec.MEDIA_TYPE_JSON:
+        return Response(content=db_lesson.timestamps_json, media_type=media_type, headers=headers)
+    
     try:
-        timestamps = json.loads(db_lesson.timestamps_json)
-        return timestamps
-    except:
+        compact = db_lesson.timestamps_compact
+        if not compact:
+            # Lección procesada antes de la columna compacta
+            compact = timestamps_codec.compress(json.loads(db_lesson.timestamps_json))
+        
+        if media_type == timestamps_codec.MEDIA_TYPE_PACKED:
+            if gzip_ok:
+                headers["Content-Encoding"] = "gzip"
+                return Response(content=compact, media_type=media_type, headers=headers)
+            return Response(content=gzip.decompress(compact), media_type=media_type, headers=headers)
+        
+        body = timestamps_codec.to_msgpack(timestamps_codec.packed_from_compact(compact))
+        return Response(content=body, media_type=media_type, headers=headers)
+    except Exception as e:
+        logger.error(f"Error encoding timestamps for lesson {lesson_id}: {e}")
         raise HTTPException(status_code=500, detail="Error parsing timestamps")
 
 
 # ==================== Audio Processing ====================
 
-@router.post("/{lesson_id}/process", response_model=ProcessAudioResponse)
-async def process_audio_lesson(
+@router.post(
+    "/{lesson_id}/process",
+    response_model=ProcessAudioResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+def process_audio_lesson(
     lesson_id: int,
     request: ProcessAudioRequest = ProcessAudioRequest(),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Procesa el audio de una lección con Gentle para generar timestamps.
+    Encola el procesamiento del audio de una lección con Gentle.
     
-    Este proceso:
+    El trabajo lo ejecuta un worker (`python audio_worker.py`):
     1. Toma el archivo de audio y el texto de la lección
-    2. Envía ambos a Gentle para alineación forzada
+    2. Envía ambos a Gentle para alineación forzada (con reintentos)
     3. Guarda los timestamps resultantes en la base de datos
     
-    El proceso puede tomar varios segundos dependiendo de la duración del audio.
+    Consultar el avance con `GET /{lesson_id}/process/status`.
     """
     try:
-        result = await audio_lesson_service.process_audio_with_gentle(
+        result = audio_lesson_service.enqueue_processing(
             db, lesson_id, force_reprocess=request.force_reprocess
         )
         
@@ -334,13 +466,32 @@ async def process_audio_lesson(
             lesson_id=lesson_id,
             estado=result["estado"],
             words_count=result.get("words_count"),
-            duration_ms=result.get("duration_ms")
+            duration_ms=result.get("duration_ms"),
+            job_id=result.get("job_id")
         )
     
     except AudioLessonServiceError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/{lesson_id}/process/status", response_model=ProcessStatusResponse)
+def get_processing_status(
+    lesson_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Estado del procesamiento: estado de la lección y avance, intentos y
+    último error del trabajo en cola.
+    """
+    result = audio_lesson_service.get_processing_status(db, lesson_id)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    
+    return result
+
+
 # ==================== Student Progress ====================
 
 @router.post("/{lesson_id}/progress", response_model=StudentAudioProgressResponse)
@@ -355,24 +506,14 @@ def update_student_progress(
     
     Este endpoint debe llamarse periódicamente desde la app Android
     para guardar la posición de reproducción actual.
-    """
-    # Verificar que la lección existe
-    db_lesson = audio_lesson_service.get_lesson(db, lesson_id)
-    if not db_lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
     
-    # Obtener el estudiante asociado al usuario
-    estudiante = db.query(Estudiante).filter(
-        Estudiante.usuario_id == current_user.id
-    ).first()
-    
-    if not estudiante:
-        raise HTTPException(
-            status_code=400, 
-            detail="User is not associated with a student profile"
-        )
+    Los pings se combinan en memoria y se escriben por lotes (ver
+    progress_aggregator); la respuesta muestra el progreso como quedará
+    guardado, incluyendo los pings pendientes.
+    """
+    estudiante = _get_current_student(db, current_user)
     
-    progress = audio_lesson_service.update_student_progress(
+    progress = audio_lesson_service.record_student_progress(
         db,
         estudiante_id=estudiante.id,
         lesson_id=lesson_id,
@@ -380,22 +521,38 @@ def update_student_progress(
         completed=progress_data.completed
     )
     
-    return StudentAudioProgressResponse(
-        id=progress.id,
-        estudiante_id=progress.estudiante_id,
-        audio_lesson_id=progress.audio_lesson_id,
-        last_position_ms=progress.last_position_ms,
-        times_completed=progress.times_completed,
-        total_time_listened_ms=progress.total_time_listened_ms,
-        completed=progress.completed,
-        created_at=progress.created_at,
-        updated_at=progress.updated_at
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    
+    return StudentAudioProgressResponse(**progress)
+
+
+@router.post("/student/progress/batch", response_model=StudentAudioProgressBatchResponse)
+def update_student_progress_batch(
+    batch: StudentAudioProgressBatch,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Registra el progreso de varias lecciones (o varios pings de una misma
+    lección, en orden) en una sola llamada; útil para enviar lo acumulado
+    sin conexión. Los pings de lecciones inexistentes se ignoran.
+    """
+    estudiante = _get_current_student(db, current_user)
+    
+    return audio_lesson_service.record_student_progress_batch(
+        db,
+        estudiante_id=estudiante.id,
+        items=[item.model_dump() for item in batch.items]
     )
 
 
 @router.get("/student/lessons", response_model=List[StudentLessonWithProgress])
 def get_student_lessons_with_progress(
+    response: Response,
     modulo_id: Optional[int] = Query(None, description="Filtrar por módulo"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    limit: int = Query(100, ge=1, le=500, description="Lecciones por página"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -404,25 +561,43 @@ def get_student_lessons_with_progress(
     
     Ideal para mostrar una lista de lecciones con indicación visual
     del progreso de cada una.
+    
+    Paginación por cursor: si hay más lecciones, la respuesta incluye el
+    encabezado X-Next-Cursor, que se envía como `cursor` en la siguiente petición.
     """
-    # Obtener el estudiante asociado al usuario
-    estudiante = db.query(Estudiante).filter(
-        Estudiante.usuario_id == current_user.id
-    ).first()
+    estudiante = _get_current_student(db, current_user)
     
-    if not estudiante:
-        raise HTTPException(
-            status_code=400, 
-            detail="User is not associated with a student profile"
-        )
+    after = None
+    if cursor:
+        try:
+            after = audio_lesson_service.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     
     lessons = audio_lesson_service.get_student_lessons_with_progress(
-        db, estudiante_id=estudiante.id, modulo_id=modulo_id
+        db, estudiante_id=estudiante.id, modulo_id=modulo_id, after=after, limit=limit
     )
     
+    if len(lessons) == limit:
+        last = lessons[-1]
+        response.headers["X-Next-Cursor"] = audio_lesson_service.encode_cursor(last["orden"], last["id"])
+    
     return lessons
 
 
+@router.get("/student/modules/summary", response_model=List[StudentModuleProgressSummary])
+def get_student_module_summary(
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Progreso del estudiante agrupado por módulo: lecciones totales,
+    iniciadas y completadas, y tiempo escuchado.
+    """
+    estudiante = _get_current_student(db, current_user)
+    return audio_lesson_service.get_student_module_summary(db, estudiante.id)
+
+
 # ==================== Batch Operations ====================
 
 @router.post("/batch/create-with-audio", response_model=AudioLessonResponse)
@@ -463,19 +638,13 @@ async def create_lesson_with_audio(
         
         db_lesson = audio_lesson_service.set_audio_url(db, db_lesson.id, relative_path)
         
-        # 3. Procesar con Gentle si se solicitó
+        # 3. Encolar el procesamiento con Gentle si se solicitó
         if auto_process:
             try:
-                await audio_lesson_service.process_audio_with_gentle(db, db_lesson.id)
+                audio_lesson_service.enqueue_processing(db, db_lesson.id)
                 db.refresh(db_lesson)
             except AudioLessonServiceError as e:
-                logger.warning(f"Auto-processing failed: {e}")
-                # Log critical error to file
-                try:
-                    with open("debug_gentle_error.log", "a") as f:
-                        f.write(f"Error processing lesson {db_lesson.id}: {str(e)}\n")
-                except:
-                    pass
+                logger.warning(f"Auto-processing could not be queued: {e}")
                 # No fallar la creación por error de procesamiento
         
         return _lesson_to_response(db_lesson)
@@ -505,3 +674,17 @@ def _lesson_to_response(lesson: AudioLesson) -> AudioLessonResponse:
         created_at=lesson.created_at,
         updated_at=lesson.updated_at
     )
+
+
+def _get_current_student(db: Session, current_user: Usuario) -> Estudiante:
+    """Estudiante asociado al usuario (400 si no tiene perfil de estudiante)."""
+    estudiante = db.query(Estudiante).filter(
+        Estudiante.usuario_id == current_user.id
+    ).first()
+    
+    if not estudiante:
+        raise HTTPException(
+            status_code=400, 
+            detail="User is not associated with a student profile"
+        )
+    return estudiante
@@ -10,11 +10,17 @@ Endpoints:
 - DELETE /dialogues/{id} - Soft delete dialogue
 - POST /dialogues/{id}/lines - Update dialogue lines
 - POST /dialogues/{id}/generate-audio - Generate TTS for tutor lines
+- GET /dialogues/tts/cache - TTS cache statistics
+- GET /dialogues/whisper/pool - Transcription queue, batching and latency metrics
 - POST /dialogues/{id}/evaluate - Evaluate student pronunciation
 """
 
 import os
+import re
+import uuid
+import asyncio
 import logging
+import mimetypes
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
@@ -28,8 +34,14 @@ from app.schemas.dialogue import (
     EvaluationRequest, EvaluationResponse, WordEvaluation,
     StudentDialogueProgress, StudentAttemptResponse
 )
-from app.services.pronunciation_service import pronunciation_service
-from app.services.tts_service import tts_service
+from app.services.pronunciation_service import pronunciation_service, PronunciationEvaluationError
+from app.services.audio_preprocessing import AudioPreprocessingError
+from app.services.tts_service import tts_service, DialogueLineAudioRequest
+from app.services.tts_cache import tts_cache
+from app.services.whisper_pool import whisper_pool, WhisperPoolBusy
+from app.services.whisper_batcher import whisper_batcher
+from app.services.audio_storage_service import audio_storage_service, AudioStorageError
+from app.services.audio_blob_service import audio_blob_service, OWNER_DIALOGUE_LINE
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +51,17 @@ router = APIRouter()
 STUDENT_AUDIO_DIR = "uploads/dialogues/student_recordings"
 os.makedirs(STUDENT_AUDIO_DIR, exist_ok=True)
 
+_EXTENSION_RE = re.compile(r"\.[a-z0-9]{1,5}")
+
+
+def _upload_extension(upload: UploadFile) -> str:
+    """Extension of an uploaded recording, from its filename or content type."""
+    ext = os.path.splitext(upload.filename or "")[1].lower()
+    if not ext:
+        content_type = (upload.content_type or "").split(";")[0].strip()
+        ext = mimetypes.guess_extension(content_type) or ""
+    return ext if _EXTENSION_RE.fullmatch(ext) else ".upload"
+
 
 # =====================================================
 # CRUD Endpoints
@@ -229,6 +252,13 @@ def update_dialogue_lines(
     if not dialogue:
         raise HTTPException(status_code=404, detail="Dialogue not found")
     
+    # Lines are recreated with new ids; keep the TTS signature of lines that
+    # come back with the same text and audio so they are not synthesized again
+    previous_signatures = {
+        (line.text, line.audio_url): line.tts_signature
+        for line in dialogue.lines if line.audio_url and line.tts_signature
+    }
+    
     # Delete existing lines
     db.query(DialogueLine).filter(DialogueLine.dialogue_id == dialogue_id).delete()
     
@@ -240,7 +270,8 @@ def update_dialogue_lines(
             text=line_data.text,
             order_index=line_data.order_index if line_data.order_index is not None else i,
             audio_url=line_data.audio_url,
-            alignment_json=line_data.alignment_json
+            alignment_json=line_data.alignment_json,
+            tts_signature=previous_signatures.get((line_data.text, line_data.audio_url))
         )
         db.add(line)
     
@@ -257,9 +288,20 @@ def update_dialogue_lines(
 @router.post("/{dialogue_id}/generate-audio")
 async def generate_dialogue_audio(
     dialogue_id: int,
+    force: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Generate TTS audio for all tutor lines in the dialogue"""
+    """
+    Generate TTS audio for all lines in the dialogue.
+    
+    Lines are synthesized in parallel (DIALOGUE_TTS_CONCURRENCY at a time, with
+    a per-line timeout). Lines whose text and voice did not change since their
+    audio was generated are skipped, and text already in the TTS cache (from
+    this or another dialogue) is reused; force=true synthesizes every line
+    again and replaces its cache entry. Successful lines are
+    saved in a single commit; failed lines are reported and keep their
+    previous audio.
+    """
     dialogue = db.query(Dialogue).filter(Dialogue.id == dialogue_id).first()
     
     if not dialogue:
@@ -271,49 +313,98 @@ async def generate_dialogue_audio(
     if not lines_to_generate:
         raise HTTPException(status_code=400, detail="No lines found in dialogue")
     
-    generated = []
+    results = {}
+    requests = []
     
     # Map role names to their settings
     role_map = {r.name: r for r in dialogue.roles}
     
     for line in lines_to_generate:
+        role_settings = role_map.get(line.role)
+        # Default to female/US if role not found (though it should be)
+        gender = role_settings.voice_gender if role_settings else 'female'
+        accent = role_settings.voice_accent if role_settings else 'en-US'
+        
+        signature = tts_service.line_signature(line.text, gender, accent)
+        if not force and line.audio_url and line.alignment_json and line.tts_signature == signature:
+            results[line.id] = {"line_id": line.id, "status": "unchanged", "audio_url": line.audio_url}
+            continue
+        
+        requests.append(DialogueLineAudioRequest(
+            line_id=line.id, text=line.text, gender=gender, accent=accent
+        ))
+    
+    lines_by_id = {line.id: line for line in lines_to_generate}
+    
+    for outcome in await tts_service.generate_dialogue_batch(dialogue_id, requests, overwrite=force):
+        line = lines_by_id[outcome.line_id]
+        if not outcome.ok:
+            results[line.id] = {
+                "line_id": line.id,
+                "status": "timeout" if outcome.timed_out else "failed",
+                "error": outcome.error
+            }
+            continue
+        
         try:
-            role_settings = role_map.get(line.role)
-            # Default to female/US if role not found (though it should be)
-            gender = role_settings.voice_gender if role_settings else 'female'
-            accent = role_settings.voice_accent if role_settings else 'en-US'
-            
-            audio_path, alignment_json = await tts_service.generate_dialogue_audio(
-                dialogue_id=dialogue_id,
-                line_id=line.id,
-                text=line.text,
-                gender=gender,
-                accent=accent
+            # Deduplicate into the content-addressed store (the TTS file stays as cache)
+            blob_path, _, _ = await asyncio.to_thread(
+                audio_storage_service.ingest_file, outcome.audio_path, False
             )
-            
-            # Update line with audio URL and alignment
-            line.audio_url = audio_path
-            line.alignment_json = alignment_json
-            db.add(line) # Explicitly join session
-            generated.append({"line_id": line.id, "audio_url": audio_path, "alignment": "captured"})
-            
         except Exception as e:
-            logger.error(f"Failed to generate audio for line {line.id}: {e}")
-            generated.append({"line_id": line.id, "error": str(e)})
+            logger.error(f"Failed to store audio for line {line.id}: {e}")
+            results[line.id] = {"line_id": line.id, "status": "failed", "error": str(e)}
+            continue
+        
+        audio_url = audio_storage_service.get_public_path(blob_path)
+        
+        # Update line with audio URL and alignment
+        line.audio_url = audio_url
+        line.alignment_json = outcome.alignment_json
+        line.tts_signature = outcome.signature
+        db.add(line) # Explicitly join session
+        audio_blob_service.set_reference(db, OWNER_DIALOGUE_LINE, line.id, blob_path)
+        results[line.id] = {
+            "line_id": line.id,
+            "status": "generated",
+            "audio_url": audio_url,
+            "alignment": outcome.alignment,
+            "cached": outcome.cached,
+            "elapsed_ms": outcome.elapsed_ms
+        }
     
     db.commit()
     
+    ordered = [results[line.id] for line in lines_to_generate]
+    counts = {}
+    for result in ordered:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    
     return {
-        "message": f"Generated audio for {len(generated)} lines",
+        "message": f"Generated audio for {counts.get('generated', 0)} of {len(ordered)} lines",
         "dialogue_id": dialogue_id,
-        "results": generated
+        "summary": counts,
+        "partial_failure": bool(counts.get("failed") or counts.get("timeout")),
+        "results": ordered
     }
 
 
+@router.get("/tts/cache")
+def get_tts_cache_stats():
+    """Hit/miss counters and disk usage of the shared TTS cache"""
+    return tts_cache.stats()
+
+
 # =====================================================
 # Pronunciation Evaluation
 # =====================================================
 
+@router.get("/whisper/pool")
+def get_whisper_pool_stats():
+    """Queue depth, micro-batching and inference latency of the Whisper pool"""
+    return {**whisper_pool.stats(), "batching": whisper_batcher.stats()}
+
+
 @router.post("/{dialogue_id}/evaluate", response_model=EvaluationResponse)
 async def evaluate_pronunciation(
     dialogue_id: int,
@@ -347,23 +438,42 @@ async def evaluate_pronunciation(
     
     expected_text = target_line.text
     
-    # Save uploaded audio
-    audio_filename = f"dialogue_{dialogue_id}_line_{target_line.id}_{estudiante_id or 'anon'}.wav"
-    audio_path = os.path.join(STUDENT_AUDIO_DIR, audio_filename)
+    # Save uploaded audio with its real extension; the evaluation decodes it
+    # once and keeps only the trimmed 16 kHz WAV (result.audio_path)
+    # uuid: concurrent attempts of the same line must not share (or delete) files
+    audio_basename = (
+        f"dialogue_{dialogue_id}_line_{target_line.id}_{estudiante_id or 'anon'}_{uuid.uuid4().hex[:12]}"
+    )
+    upload_path = os.path.join(STUDENT_AUDIO_DIR, audio_basename + _upload_extension(audio))
     
-    with open(audio_path, "wb") as f:
-        content = await audio.read()
-        f.write(content)
+    try:
+        file_size, _ = await audio_storage_service.stream_upload(audio, upload_path)
+    except AudioStorageError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    logger.info(f"Saved student audio: {audio_path} (Size: {len(content)} bytes)")
+    logger.info(f"Saved student audio: {upload_path} (Size: {file_size} bytes)")
     
     # Evaluate pronunciation
     try:
-        result = await pronunciation_service.evaluate(audio_path, expected_text)
+        result = await pronunciation_service.evaluate(upload_path, expected_text)
         logger.info(f"Evaluation result - Score: {result.score}, Transcribed: '{result.transcription}'")
+    except AudioPreprocessingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except WhisperPoolBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except PronunciationEvaluationError as e:
+        # No attempt is saved: a 0% score would not reflect the recording
+        raise HTTPException(status_code=503 if e.timed_out else 500, detail=str(e))
     except Exception as e:
         logger.error(f"Pronunciation evaluation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Evaluation failed: {str(e)}")
+    finally:
+        if not upload_path.endswith(".wav") and os.path.exists(upload_path):
+            os.remove(upload_path)
     
     # Save attempt if student ID provided
     if estudiante_id:
@@ -372,7 +482,7 @@ async def evaluate_pronunciation(
             estudiante_id=estudiante_id,
             dialogue_id=dialogue_id,
             line_id=target_line.id,
-            audio_path=audio_path,
+            audio_path=result.audio_path,
             transcription=result.transcription,
             alignment_result=json.dumps(result.alignment_data) if result.alignment_data else None,
             score=result.score,
@@ -392,7 +502,13 @@ async def evaluate_pronunciation(
         word_evaluations=[
             WordEvaluation(**w) for w in result.word_evaluations
         ],
-        feedback=result.feedback
+        feedback=result.feedback,
+        substitutions=result.substitutions,
+        deletions=result.deletions,
+        insertions=result.insertions,
+        inserted_words=result.inserted_words,
+        stages=result.stages,
+        timings_ms=result.timings_ms
     )
 
 
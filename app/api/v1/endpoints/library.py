@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
@@ -6,23 +6,32 @@ from datetime import date
 from app.api.deps import get_db, get_current_user
 from app.models.models import Usuario
 from app.services.library_service import LibraryService
+from app.services import reference_cache
+from app.services.library_import_service import (
+    importar_catalogo, decodificar_lineas, detectar_formato, DEFAULT_BATCH_SIZE
+)
 from app.schemas.library import (
     GeneroLiterarioCreate, GeneroLiterarioUpdate, GeneroLiterarioOut,
     EditorialCreate, EditorialUpdate, EditorialOut,
     AutorCreate, AutorUpdate, AutorOut,
-    LibroCreate, LibroUpdate, LibroOut, LibroOutDetailed,
-    PrestamoCreate, PrestamoOut,
+    LibroCreate, LibroUpdate, LibroOut, LibroOutDetailed, LibroImportReporte,
+    PrestamoCreate, PrestamoOut, PrestamoHistorialOut,
     MultaPrestamoOut,
     ReservaCreate, ReservaOut,
-    ModuloLibroOut
+    ModuloLibroOut,
+    PrestamoCalendarDia
 )
 
 router = APIRouter()
 
 # --- Géneros Literarios ---
 @router.get("/generos", response_model=List[GeneroLiterarioOut])
-def read_generos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return LibraryService.get_generos(db, skip=skip, limit=limit)
+def read_generos(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return reference_cache.cached_response(
+        request, db, reference_cache.GENEROS, List[GeneroLiterarioOut],
+        lambda: LibraryService.get_generos(db, skip=skip, limit=limit),
+        skip=skip, limit=limit
+    )
 
 @router.post("/generos", response_model=GeneroLiterarioOut)
 def create_genero(genero_in: GeneroLiterarioCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
@@ -43,8 +52,12 @@ def delete_genero(genero_id: int, db: Session = Depends(get_db), current_user: U
 
 # --- Editoriales ---
 @router.get("/editoriales", response_model=List[EditorialOut])
-def read_editoriales(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return LibraryService.get_editoriales(db, skip=skip, limit=limit)
+def read_editoriales(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return reference_cache.cached_response(
+        request, db, reference_cache.EDITORIALES, List[EditorialOut],
+        lambda: LibraryService.get_editoriales(db, skip=skip, limit=limit),
+        skip=skip, limit=limit
+    )
 
 @router.post("/editoriales", response_model=EditorialOut)
 def create_editorial(editorial_in: EditorialCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
@@ -65,8 +78,12 @@ def delete_editorial(editorial_id: int, db: Session = Depends(get_db), current_u
 
 # --- Autores ---
 @router.get("/autores", response_model=List[AutorOut])
-def read_autores(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return LibraryService.get_autores(db, skip=skip, limit=limit)
+def read_autores(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return reference_cache.cached_response(
+        request, db, reference_cache.AUTORES, List[AutorOut],
+        lambda: LibraryService.get_autores(db, skip=skip, limit=limit),
+        skip=skip, limit=limit
+    )
 
 @router.post("/autores", response_model=AutorOut)
 def create_autor(autor_in: AutorCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
@@ -97,6 +114,25 @@ def read_libros(
 ):
     return LibraryService.get_libros(db, skip=skip, limit=limit, genero_id=genero_id, editorial_id=editorial_id, search=search)
 
+@router.post("/libros/importar", response_model=LibroImportReporte)
+def importar_libros(
+    archivo: UploadFile = File(..., description="Catálogo en CSV o JSON-lines"),
+    formato: Optional[str] = Query(None, description="csv o jsonl (por defecto según la extensión)"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Importación masiva de libros, autores, editoriales y géneros.
+    El archivo se procesa en streaming y por lotes; los errores se reportan por fila.
+    """
+    formato = formato or detectar_formato(archivo.filename)
+    try:
+        return importar_catalogo(db, decodificar_lineas(archivo.file), formato=formato, batch_size=batch_size)
+    except ValueError as e:
+        # Formato no soportado; una lectura interrumpida vuelve en reporte["error_fatal"]
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/libros/{libro_id}", response_model=LibroOutDetailed)
 def read_libro(libro_id: int, db: Session = Depends(get_db)):
     libro = LibraryService.get_libro(db, libro_id)
@@ -135,10 +171,35 @@ def read_prestamos(
     limit: int = 100, 
     estado: Optional[str] = None,
     usuario_id: Optional[int] = None,
+    estudiante_id: Optional[int] = None,
+    profesor_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    return LibraryService.get_prestamos(
+        db, skip=skip, limit=limit, estado=estado,
+        usuario_id=usuario_id, estudiante_id=estudiante_id, profesor_id=profesor_id
+    )
+
+@router.get("/prestamos/historial", response_model=PrestamoHistorialOut)
+def read_historial_prestatario(
+    usuario_id: Optional[int] = None,
+    estudiante_id: Optional[int] = None,
+    profesor_id: Optional[int] = None,
+    estado: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    return LibraryService.get_prestamos(db, skip=skip, limit=limit, estado=estado, usuario_id=usuario_id)
+    """Borrower loan history with keyset pagination and summary (active, overdue, fines)"""
+    try:
+        return LibraryService.get_historial_prestatario(
+            db, usuario_id=usuario_id, estudiante_id=estudiante_id, profesor_id=profesor_id,
+            estado=estado, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/prestamos", response_model=PrestamoOut)
 def create_prestamo(prestamo_in: PrestamoCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
@@ -274,6 +335,33 @@ def get_prestamos_calendario(
     return LibraryService.get_prestamos_calendario(db, fecha_inicio, fecha_fin)
 
 
+@router.get("/prestamos/calendario/resumen", response_model=List[PrestamoCalendarDia])
+def get_prestamos_calendario_resumen(
+    fecha_inicio: date,
+    fecha_fin: date,
+    tipo_prestamo: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Get per-day loan counts (lent, due, returned, overdue) by loan type for calendar view"""
+    if fecha_fin < fecha_inicio:
+        raise HTTPException(status_code=400, detail="fecha_fin debe ser posterior a fecha_inicio")
+    if (fecha_fin - fecha_inicio).days > 366:
+        raise HTTPException(status_code=400, detail="El rango máximo es de un año")
+    return LibraryService.get_prestamos_calendario_resumen(db, fecha_inicio, fecha_fin, tipo_prestamo)
+
+
+@router.get("/prestamos/calendario/dia", response_model=List[PrestamoOut])
+def get_prestamos_calendario_dia(
+    fecha: date,
+    tipo_prestamo: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Get loan details for the selected calendar day"""
+    return LibraryService.get_prestamos_dia(db, fecha, tipo_prestamo)
+
+
 @router.get("/prestamos/usuario/{usuario_id}", response_model=List[PrestamoOut])
 def get_prestamos_usuario(
     usuario_id: int,
@@ -379,11 +467,16 @@ def assign_libro_to_modulo(
 @router.get("/modulos/{modulo_id}/libros", response_model=List[ModuloLibroOut])
 def get_libros_by_modulo(
     modulo_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """Get all books assigned to a module"""
-    return LibraryService.get_libros_by_modulo(db, modulo_id)
+    return reference_cache.cached_response(
+        request, db, reference_cache.MODULO_LIBROS, List[ModuloLibroOut],
+        lambda: LibraryService.get_libros_by_modulo(db, modulo_id),
+        vista="biblioteca", modulo_id=modulo_id
+    )
 
 
 @router.delete("/modulos/{modulo_id}/libros/{libro_id}")
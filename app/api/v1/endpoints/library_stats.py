@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+
+from app.api.deps import get_db, get_current_user
+from app.models.models import Usuario
+from app.services.library_stats_service import LibraryStatsService, ORDEN_TOP_TITULOS
+from app.schemas.library import TopTituloOut, CirculacionModuloOut, TasaCobroMultasOut
+
+router = APIRouter()
+
+
+@router.get("/top-titulos", response_model=List[TopTituloOut])
+def read_top_titulos(
+    orden: str = Query("total", description="total, recientes (90 días), por_copia o reservas"),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Títulos con más circulación (desde la vista materializada)."""
+    if orden not in ORDEN_TOP_TITULOS:
+        raise HTTPException(status_code=400, detail=f"Orden inválido. Use: {', '.join(ORDEN_TOP_TITULOS)}")
+    return LibraryStatsService.get_top_titulos(db, orden=orden, limit=limit)
+
+
+@router.get("/modulos", response_model=List[CirculacionModuloOut])
+def read_circulacion_modulos(
+    modulo_id: Optional[int] = None,
+    tipo_asignacion: Optional[str] = Query(None, description="obligatorio o recomendado"),
+    solo_activos: bool = True,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Circulación académica de los libros asignados a cada módulo."""
+    return LibraryStatsService.get_circulacion_modulos(
+        db, modulo_id=modulo_id, tipo_asignacion=tipo_asignacion, solo_activos=solo_activos
+    )
+
+
+@router.get("/multas", response_model=TasaCobroMultasOut)
+def read_tasa_cobro_multas(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Multas generadas vs. cobradas por mes y tasa de cobro del periodo."""
+    if desde and hasta and hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha final debe ser posterior a la inicial")
+    return LibraryStatsService.get_tasa_cobro_multas(db, desde=desde, hasta=hasta)
+
+
+@router.post("/refrescar")
+def refrescar_estadisticas(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+    """Refresca las vistas materializadas sin bloquear las lecturas."""
+    refreshed = LibraryStatsService.refresh_views(db)
+    return {
+        "refrescado": refreshed,
+        "actualizado_en": LibraryStatsService.get_ultima_actualizacion(db)
+    }
@@ -19,6 +19,7 @@ app.add_middleware(
 )
 
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 
 app.include_router(api_router, prefix="/api/v1")
@@ -33,6 +34,76 @@ if not os.path.exists(UPLOADS_DIR):
     
 app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
 
+from app.services.library_stats_service import run_periodic_refresh, REFRESH_MINUTES
+
+@app.on_event("startup")
+async def start_library_stats_refresh():
+    # Refresco periódico de las vistas de estadísticas de biblioteca
+    if REFRESH_MINUTES > 0:
+        app.state.library_stats_task = asyncio.create_task(run_periodic_refresh(REFRESH_MINUTES))
+
+@app.on_event("shutdown")
+async def stop_library_stats_refresh():
+    task = getattr(app.state, "library_stats_task", None)
+    if task:
+        task.cancel()
+
+from app.services.audio_job_queue import AudioWorker
+
+# Worker de audio dentro de la API (instalaciones de un solo servidor);
+# en producción usar procesos separados: python audio_worker.py
+AUDIO_WORKER_IN_APP = int(os.getenv("AUDIO_WORKER_IN_APP", "0"))
+
+@app.on_event("startup")
+async def start_audio_worker():
+    if AUDIO_WORKER_IN_APP > 0:
+        app.state.audio_worker = AudioWorker(concurrency=AUDIO_WORKER_IN_APP)
+        app.state.audio_worker_task = asyncio.create_task(app.state.audio_worker.run())
+
+@app.on_event("shutdown")
+async def stop_audio_worker():
+    worker = getattr(app.state, "audio_worker", None)
+    if worker:
+        worker.stop()
+        await app.state.audio_worker_task
+
+from app.services.progress_aggregator import progress_aggregator
+
+@app.on_event("startup")
+async def start_progress_aggregator():
+    # Escritura por lotes del progreso de reproducción (0 = escribir cada ping)
+    if progress_aggregator.flush_seconds > 0:
+        app.state.progress_aggregator_task = asyncio.create_task(progress_aggregator.run())
+
+@app.on_event("shutdown")
+async def stop_progress_aggregator():
+    task = getattr(app.state, "progress_aggregator_task", None)
+    if task:
+        progress_aggregator.stop()
+        await task
+
+from app.services.gentle_service import gentle_service
+from app.services.aligner_service import get_aligner
+
+@app.on_event("shutdown")
+async def close_gentle_session():
+    await gentle_service.close()
+    await get_aligner().close()
+
+from app.services.whisper_pool import whisper_pool
+
+# Carga los modelos de Whisper al arrancar en vez de en la primera evaluación
+WHISPER_POOL_PRELOAD = os.getenv("WHISPER_POOL_PRELOAD", "false").lower() == "true"
+
+@app.on_event("startup")
+async def start_whisper_pool():
+    if WHISPER_POOL_PRELOAD:
+        whisper_pool.start()
+
+@app.on_event("shutdown")
+async def stop_whisper_pool():
+    await asyncio.to_thread(whisper_pool.shutdown)
+
 @app.get("/")
 def root():
     return {"message": "Welcome to Institute LMS API"}
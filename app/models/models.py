@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, UniqueConstraint, Numeric, Date, Time, func
+from sqlalchemy import Column, Integer, BigInteger, LargeBinary, String, Boolean, ForeignKey, DateTime, Text, UniqueConstraint, Index, Numeric, Date, Time, func, text
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -845,6 +845,15 @@ class ModuloLibro(Base):
     __table_args__ = (UniqueConstraint('modulo_id', 'libro_id', name='_modulo_libro_uc'),)
 
 
+class CacheVersion(Base):
+    """Versión de cada lista de datos de referencia cacheada (ver app/services/reference_cache.py)"""
+    __tablename__ = "cache_versiones"
+
+    nombre = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 # ==================== FINANCIAL MODELS ====================
 
 class PlanPago(Base):
@@ -1059,6 +1068,8 @@ class AudioLesson(Base):
     # Timestamps generados por Gentle
     # Formato: {"words": [{"word": "Hello", "start": 0, "end": 450}, ...], "duration_ms": 5000}
     timestamps_json = Column(Text, nullable=True)  # JSON almacenado como texto
+    # Mismos timestamps en formato compacto, ya comprimido con gzip (ver timestamps_codec)
+    timestamps_compact = Column(LargeBinary, nullable=True)
     
     # Estado del procesamiento
     estado = Column(String(20), default='PENDIENTE')  # PENDIENTE, PROCESANDO, LISTO, ERROR
@@ -1087,12 +1098,15 @@ class AudioLesson(Base):
     
     @timestamps.setter
     def timestamps(self, value):
-        """Serializa diccionario a JSON string"""
+        """Serializa diccionario a JSON string (y su versión compacta)"""
         import json
+        from app.services.timestamps_codec import compress
         if value:
             self.timestamps_json = json.dumps(value)
+            self.timestamps_compact = compress(value)
         else:
             self.timestamps_json = None
+            self.timestamps_compact = None
 
 
 class StudentAudioProgress(Base):
@@ -1126,6 +1140,87 @@ class StudentAudioProgress(Base):
     lesson = relationship("AudioLesson", back_populates="progress")
 
 
+class AudioProcessingJob(Base):
+    """
+    Trabajo de alineación con Gentle en la cola de procesamiento.
+    Lo toma un worker (audio_worker.py) con SELECT ... FOR UPDATE SKIP LOCKED;
+    los fallos se reintentan con backoff hasta max_attempts.
+    """
+    __tablename__ = "audio_processing_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_lesson_id = Column(Integer, ForeignKey("audio_lessons.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    # Estado del trabajo
+    estado = Column(String(20), default='PENDIENTE', nullable=False)  # PENDIENTE, PROCESANDO, COMPLETADO, ERROR
+    progress = Column(Integer, default=0, nullable=False)  # 0-100
+    force_reprocess = Column(Boolean, default=False, nullable=False)
+
+    # Reintentos
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)  # No se toma antes de esta hora
+    last_error = Column(Text, nullable=True)
+
+    # Bloqueo del worker
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Un solo trabajo activo por lección
+        Index('uq_audio_processing_jobs_activo', 'audio_lesson_id', unique=True,
+              postgresql_where=text("estado IN ('PENDIENTE', 'PROCESANDO')")),
+        Index('idx_audio_processing_jobs_pendientes', 'run_after', 'id',
+              postgresql_where=text("estado = 'PENDIENTE'")),
+    )
+
+    # Relaciones
+    lesson = relationship("AudioLesson")
+
+
+class AudioBlob(Base):
+    """
+    Archivo de audio direccionado por contenido (uploads/audio/blobs/ab/cd/<sha256><ext>).
+    Un mismo blob puede estar referenciado por varias lecciones o líneas de diálogo.
+    """
+    __tablename__ = "audio_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    extension = Column(String(10), nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    mime_type = Column(String(50), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    referencias = relationship("AudioBlobRef", back_populates="blob")
+
+
+class AudioBlobRef(Base):
+    """
+    Referencia de un dueño (lección o línea de diálogo) a su blob de audio.
+    El recolector de basura borra los blobs que no tienen referencias vigentes.
+    """
+    __tablename__ = "audio_blob_refs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_type = Column(String(20), nullable=False)  # LESSON, DIALOGUE_LINE
+    owner_id = Column(Integer, nullable=False)
+    sha256 = Column(String(64), ForeignKey("audio_blobs.sha256"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('owner_type', 'owner_id', name='uq_audio_blob_refs_owner'),
+    )
+
+    blob = relationship("AudioBlob", back_populates="referencias")
+
+
 # =====================================================
 # DIALOGUES - Práctica de Conversación
 # =====================================================
@@ -1191,6 +1286,7 @@ class DialogueLine(Base):
     order_index = Column(Integer, nullable=False)
     audio_url = Column(String(500), nullable=True)  # Audio TTS pre-generado para tutor
     alignment_json = Column(Text, nullable=True)    # JSON con timestamps de palabras (Edge TTS)
+    tts_signature = Column(String(64), nullable=True)  # Voz + texto con que se generó audio_url
     
     # Relaciones
     dialogue = relationship("Dialogue", back_populates="lines")
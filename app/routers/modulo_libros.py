@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from app.api.deps import get_db
 from app.models.models import ModuloLibro, Modulo, Libro
+from app.services import reference_cache
 from app.schemas.modulo_libro import (
     ModuloLibroCreate, 
     ModuloLibroUpdate, 
@@ -15,6 +16,7 @@ router = APIRouter(prefix="/modulos", tags=["modulo-libros"])
 @router.get("/{modulo_id}/libros", response_model=List[ModuloLibroResponse])
 async def get_libros_by_modulo(
     modulo_id: int,
+    request: Request,
     activo_only: bool = True,
     db: Session = Depends(get_db)
 ):
@@ -30,21 +32,24 @@ async def get_libros_by_modulo(
     if not modulo:
         raise HTTPException(status_code=404, detail="Módulo no encontrado")
     
-    # Construir query
-    query = db.query(ModuloLibro).options(
-        joinedload(ModuloLibro.libro),
-        joinedload(ModuloLibro.modulo)
-    ).filter(ModuloLibro.modulo_id == modulo_id)
-    
-    if activo_only:
-        query = query.filter(ModuloLibro.activo == True)
-    
-    asociaciones = query.order_by(
-        ModuloLibro.tipo_asignacion.desc(),  # obligatorio primero
-        ModuloLibro.orden.asc()
-    ).all()
-    
-    return asociaciones
+    def cargar():
+        query = db.query(ModuloLibro).options(
+            joinedload(ModuloLibro.libro),
+            joinedload(ModuloLibro.modulo)
+        ).filter(ModuloLibro.modulo_id == modulo_id)
+        
+        if activo_only:
+            query = query.filter(ModuloLibro.activo == True)
+        
+        return query.order_by(
+            ModuloLibro.tipo_asignacion.desc(),  # obligatorio primero
+            ModuloLibro.orden.asc()
+        ).all()
+    
+    return reference_cache.cached_response(
+        request, db, reference_cache.MODULO_LIBROS, List[ModuloLibroResponse], cargar,
+        modulo_id=modulo_id, activo_only=activo_only
+    )
 
 
 @router.post("/{modulo_id}/libros", response_model=ModuloLibroResponse, status_code=status.HTTP_201_CREATED)
@@ -85,6 +90,7 @@ async def create_modulo_libro(
             existing.descripcion = data.descripcion
             existing.obligatorio = (data.tipo_asignacion == "obligatorio")
             
+            reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
             db.commit()
             db.refresh(existing)
             db.refresh(existing, ['libro', 'modulo'])
@@ -108,6 +114,7 @@ async def create_modulo_libro(
     )
     
     db.add(nueva_asociacion)
+    reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
     db.commit()
     db.refresh(nueva_asociacion)
     
@@ -155,6 +162,7 @@ async def update_modulo_libro(
     if data.descripcion is not None:
         asociacion.descripcion = data.descripcion
     
+    reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
     db.commit()
     db.refresh(asociacion, ['libro', 'modulo'])
     
@@ -187,10 +195,12 @@ async def delete_modulo_libro(
     if soft_delete:
         # Soft delete: marcar como inactivo
         asociacion.activo = False
+        reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
         db.commit()
     else:
         # Hard delete: eliminar registro
         db.delete(asociacion)
+        reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
         db.commit()
     
     return None
@@ -198,6 +208,7 @@ async def delete_modulo_libro(
 
 @router.get("", response_model=List[ModuloLibroResponse])
 async def get_all_modulo_libros(
+    request: Request,
     activo_only: bool = True,
     tipo_asignacion: str = None,
     db: Session = Depends(get_db)
@@ -209,21 +220,25 @@ async def get_all_modulo_libros(
         activo_only: Si es True, solo devuelve asociaciones activas
         tipo_asignacion: Filtrar por tipo ('obligatorio' o 'recomendado')
     """
-    query = db.query(ModuloLibro).options(
-        joinedload(ModuloLibro.libro),
-        joinedload(ModuloLibro.modulo)
+    def cargar():
+        query = db.query(ModuloLibro).options(
+            joinedload(ModuloLibro.libro),
+            joinedload(ModuloLibro.modulo)
+        )
+        
+        if activo_only:
+            query = query.filter(ModuloLibro.activo == True)
+        
+        if tipo_asignacion:
+            query = query.filter(ModuloLibro.tipo_asignacion == tipo_asignacion)
+        
+        return query.order_by(
+            ModuloLibro.modulo_id.asc(),
+            ModuloLibro.tipo_asignacion.desc(),
+            ModuloLibro.orden.asc()
+        ).all()
+    
+    return reference_cache.cached_response(
+        request, db, reference_cache.MODULO_LIBROS, List[ModuloLibroResponse], cargar,
+        activo_only=activo_only, tipo_asignacion=tipo_asignacion
     )
-    
-    if activo_only:
-        query = query.filter(ModuloLibro.activo == True)
-    
-    if tipo_asignacion:
-        query = query.filter(ModuloLibro.tipo_asignacion == tipo_asignacion)
-    
-    asociaciones = query.order_by(
-        ModuloLibro.modulo_id.asc(),
-        ModuloLibro.tipo_asignacion.desc(),
-        ModuloLibro.orden.asc()
-    ).all()
-    
-    return asociaciones
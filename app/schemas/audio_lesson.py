@@ -16,6 +16,14 @@ class AudioLessonStatus(str, Enum):
     ERROR = "ERROR"
 
 
+class AudioJobStatus(str, Enum):
+    """Estados de un trabajo en la cola de procesamiento"""
+    PENDIENTE = "PENDIENTE"
+    PROCESANDO = "PROCESANDO"
+    COMPLETADO = "COMPLETADO"
+    ERROR = "ERROR"
+
+
 class WordTimestamp(BaseModel):
     """Timestamp individual para una palabra"""
     word: str
@@ -135,6 +143,24 @@ class StudentAudioProgressCreate(BaseModel):
     completed: Optional[bool] = False
 
 
+class StudentAudioProgressBatchItem(BaseModel):
+    """Un ping de progreso dentro de un lote"""
+    audio_lesson_id: int
+    last_position_ms: int = Field(..., ge=0)
+    completed: Optional[bool] = False
+
+
+class StudentAudioProgressBatch(BaseModel):
+    """Varios pings de progreso (en orden de reproducción)"""
+    items: List[StudentAudioProgressBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class StudentAudioProgressBatchResponse(BaseModel):
+    """Resultado del registro de un lote de progreso"""
+    accepted: int
+    unknown_lessons: List[int] = []
+
+
 class StudentAudioProgressResponse(BaseModel):
     """Respuesta del progreso del estudiante"""
     id: int
@@ -157,6 +183,18 @@ class StudentLessonWithProgress(AudioLessonResponse):
     progress_percentage: Optional[float] = None
 
 
+class StudentModuleProgressSummary(BaseModel):
+    """Resumen del progreso del estudiante en las lecciones de un módulo"""
+    modulo_id: Optional[int] = None
+    modulo_nombre: Optional[str] = None
+    total_lessons: int
+    started_lessons: int
+    completed_lessons: int
+    total_duration_ms: int
+    listened_ms: int
+    progress_percentage: float
+
+
 # ============ PROCESSING Schemas ============
 
 class ProcessAudioRequest(BaseModel):
@@ -172,3 +210,31 @@ class ProcessAudioResponse(BaseModel):
     estado: AudioLessonStatus
     words_count: Optional[int] = None
     duration_ms: Optional[int] = None
+    job_id: Optional[int] = Field(None, description="Trabajo encolado; consultar GET /{id}/process/status")
+
+
+class AudioProcessingJobResponse(BaseModel):
+    """Estado del trabajo de procesamiento de una lección"""
+    id: int
+    audio_lesson_id: int
+    estado: AudioJobStatus
+    progress: int = Field(..., ge=0, le=100)
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    run_after: datetime
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProcessStatusResponse(BaseModel):
+    """Estado de la lección y de su último trabajo de procesamiento"""
+    lesson_id: int
+    estado: AudioLessonStatus
+    words_count: Optional[int] = None
+    duration_ms: Optional[int] = None
+    job: Optional[AudioProcessingJobResponse] = None
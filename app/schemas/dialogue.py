@@ -2,7 +2,7 @@
 Pydantic schemas for Dialogue/Conversation Practice
 """
 
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -128,6 +128,8 @@ class DialogueDetailResponse(DialogueBase):
 class WordEvaluation(BaseModel):
     word: str
     matched: bool
+    status: Optional[str] = Field(None, description="match, substitution or deletion")
+    spoken: Optional[str] = Field(None, description="Word heard in its place")
     confidence: float
     start_ms: Optional[int] = None
     end_ms: Optional[int] = None
@@ -146,6 +148,12 @@ class EvaluationResponse(BaseModel):
     missed_words: List[str] = []
     word_evaluations: List[WordEvaluation] = []
     feedback: str = Field(..., description="Human-readable feedback")
+    substitutions: int = 0
+    deletions: int = 0
+    insertions: int = 0
+    inserted_words: List[str] = []
+    stages: Dict[str, str] = Field(default_factory=dict, description="Outcome per stage: ok, timeout or failed")
+    timings_ms: Dict[str, float] = Field(default_factory=dict, description="Wall time per stage")
 
 
 # =====================================================
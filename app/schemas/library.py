@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -132,6 +132,23 @@ class LibroOutDetailed(LibroOut):
     editorial: EditorialOut
     libro_autores: List[LibroAutorOut] = []
 
+class LibroImportError(BaseModel):
+    fila: int
+    isbn: Optional[str] = None
+    error: str
+
+class LibroImportReporte(BaseModel):
+    """Resultado de la importación masiva del catálogo"""
+    total_filas: int
+    libros_creados: int
+    generos_creados: int
+    editoriales_creadas: int
+    autores_creados: int
+    errores: List[LibroImportError] = []
+    isbns_creados: List[str] = []
+    # Lectura interrumpida (p. ej. codificación inválida); lo anterior quedó importado
+    error_fatal: Optional[str] = None
+
 # --- Préstamo ---
 class PrestamoBase(BaseModel):
     libro_id: int
@@ -181,6 +198,20 @@ class PrestamoOut(PrestamoBase):
 class PrestamoOutDetailed(PrestamoOut):
     pass
 
+class PrestamoResumenPrestatario(BaseModel):
+    """Resumen compacto del historial de un prestatario"""
+    activos: int
+    atrasados: int
+    total: int
+    total_multas: Decimal
+    multas_pendientes: Decimal
+
+class PrestamoHistorialOut(BaseModel):
+    """Página de historial de préstamos (paginación keyset) con resumen"""
+    items: List[PrestamoOut]
+    next_cursor: Optional[str] = None
+    resumen: PrestamoResumenPrestatario
+
 
 # --- Multa Préstamo ---
 class MultaPrestamoBase(BaseModel):
@@ -289,3 +320,65 @@ class PrestamoCalendar(BaseModel):
 
     class Config:
         from_attributes = True
+
+class PrestamoCalendarConteo(BaseModel):
+    """Conteos de préstamos para un día del calendario"""
+    prestados: int = 0
+    vencen: int = 0
+    devueltos: int = 0
+    atrasados: int = 0
+
+class PrestamoCalendarDia(BaseModel):
+    """Resumen agregado de un día del calendario, desglosado por tipo de préstamo"""
+    fecha: date
+    total: PrestamoCalendarConteo
+    por_tipo: Dict[str, PrestamoCalendarConteo] = {}
+
+# --- Estadísticas ---
+class TopTituloOut(BaseModel):
+    """Circulación de un título (vista mv_biblioteca_circulacion_libro)"""
+    libro_id: int
+    titulo: str
+    isbn: str
+    cantidad_total: int
+    total_prestamos: int
+    prestamos_activos: int
+    prestamos_30_dias: int
+    prestamos_90_dias: int
+    total_reservas: int
+    prestamos_por_copia: Decimal
+    ultimo_prestamo: Optional[date] = None
+
+class CirculacionModuloLibroOut(BaseModel):
+    libro_id: int
+    titulo: str
+    tipo_asignacion: str
+    activo: Optional[bool] = None
+    prestamos_academicos: int
+    prestamos_activos: int
+    prestamos_90_dias: int
+
+class CirculacionModuloOut(BaseModel):
+    """Préstamos académicos de los libros asignados a un módulo"""
+    modulo_id: int
+    modulo_nombre: str
+    total_prestamos: int
+    libros_sin_prestamos: int
+    libros: List[CirculacionModuloLibroOut] = []
+
+class MultasMesOut(BaseModel):
+    mes: date
+    multas_generadas: int
+    multas_pagadas: int
+    monto_generado: Decimal
+    monto_cobrado: Decimal
+    tasa_cobro: float
+
+class TasaCobroMultasOut(BaseModel):
+    """Multas generadas vs. cobradas en el periodo consultado"""
+    multas_generadas: int
+    multas_pagadas: int
+    monto_generado: Decimal
+    monto_cobrado: Decimal
+    tasa_cobro: float
+    meses: List[MultasMesOut] = []
@@ -0,0 +1,328 @@
+"""
+Alineadores de Audio
+====================
+
+Interfaz común para los backends que producen timestamps por palabra a partir
+de un audio y su transcripción. Todos devuelven el mismo formato que
+GentleService._process_gentle_response:
+
+    {
+        "words": [{"word", "start", "end", "confidence"}],   # ms
+        "duration_ms", "transcript", "success_rate", "total_words", "aligned_words"
+    }
+
+El backend whisper agrega "matched" a cada palabra: True solo si el ASR la
+reconoció tal cual (las de bloques replace e interpoladas tienen tiempo pero
+no cuentan como pronunciadas al calificar).
+
+Backends disponibles (variable ALIGNER_BACKEND):
+  - gentle:  alineación forzada vía HTTP (default, ~10-20ms de precisión)
+  - whisper: timestamps por palabra de faster-whisper en el mismo proceso,
+             mapeados sobre el transcript esperado con alineación de secuencias.
+             No requiere el contenedor de Gentle.
+"""
+
+import os
+import re
+import asyncio
+import logging
+import difflib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.alignment_cache import alignment_cache, hash_file, make_key
+
+logger = logging.getLogger(__name__)
+
+ALIGNER_BACKEND = os.getenv("ALIGNER_BACKEND", "gentle").lower()
+WHISPER_ALIGNER_MODEL = os.getenv("WHISPER_ALIGNER_MODEL", "base")
+WHISPER_ALIGNER_LANGUAGE = os.getenv("WHISPER_ALIGNER_LANGUAGE", "en")
+# Transcripciones simultáneas en el proceso (el modelo ya usa varios hilos de CPU)
+WHISPER_ALIGNER_CONCURRENCY = int(os.getenv("WHISPER_ALIGNER_CONCURRENCY", "1"))
+
+_TOKEN_SPLIT_RE = re.compile(r"(\s+)")
+_NON_WORD_RE = re.compile(r"[^\w']+")
+
+
+class AlignmentError(Exception):
+    """Error durante la alineación de audio con texto"""
+    pass
+
+
+class BaseAligner(ABC):
+    """Backend de alineación palabra a palabra."""
+
+    name: str = "base"
+
+    @abstractmethod
+    async def align(self, audio_path: str, transcript: str, **options) -> Dict[str, Any]:
+        """
+        Alinea el audio con el transcript.
+
+        Raises:
+            FileNotFoundError: Si el audio no existe
+            AlignmentError: Si la alineación falla
+        """
+
+    @abstractmethod
+    async def check_health(self) -> bool:
+        """True si el backend puede atender peticiones."""
+
+    async def close(self) -> None:
+        """Libera recursos del backend (sesiones, modelos)."""
+
+
+def tokenize_transcript(transcript: str) -> List[Tuple[str, str]]:
+    """Divide el transcript en (palabra, espacio_posterior) preservando saltos de línea."""
+    word_tokens: List[Tuple[str, str]] = []
+    for t in _TOKEN_SPLIT_RE.split(transcript):
+        if not t.strip():
+            if word_tokens:
+                word_tokens[-1] = (word_tokens[-1][0], word_tokens[-1][1] + t)
+        else:
+            word_tokens.append((t, ""))
+    return word_tokens
+
+
+def normalize_token(word: str) -> str:
+    """Minúsculas y sin puntuación, para comparar palabras entre transcript y ASR."""
+    return _NON_WORD_RE.sub("", word.lower())
+
+
+def map_words_to_transcript(
+    recognized: List[Dict[str, Any]],
+    transcript: str,
+    duration_ms: int = 0
+) -> Dict[str, Any]:
+    """
+    Proyecta palabras reconocidas ({word, start, end, probability}, en segundos)
+    sobre las palabras del transcript esperado.
+
+    Se alinean las dos secuencias normalizadas con difflib.SequenceMatcher:
+      - equal:   la palabra esperada toma el tiempo de la reconocida (matched)
+      - replace: 1 a 1 si los bloques miden igual; si no, el tramo reconocido
+                 se reparte entre las palabras esperadas (no matched)
+      - delete:  palabras esperadas no oídas se interpolan entre sus vecinas
+      - insert:  palabras reconocidas de más se descartan
+    """
+    word_tokens = tokenize_transcript(transcript)
+    expected = [normalize_token(w) for w, _ in word_tokens]
+    heard = [normalize_token(w.get("word", "")) for w in recognized]
+
+    # (start_ms, end_ms, confidence) por palabra esperada; None = sin tiempo
+    timings: List[Optional[Tuple[int, int, float]]] = [None] * len(word_tokens)
+    # Índices de palabras esperadas que el ASR reconoció tal cual
+    heard_exactly = set()
+    matched = 0
+
+    matcher = difflib.SequenceMatcher(None, expected, heard, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for k in range(i2 - i1):
+                w = recognized[j1 + k]
+                timings[i1 + k] = (
+                    int(w["start"] * 1000),
+                    int(w["end"] * 1000),
+                    round(float(w.get("probability", 0.9)), 3)
+                )
+            heard_exactly.update(range(i1, i2))
+            matched += i2 - i1
+        elif tag == "replace" and i2 - i1 == j2 - j1:
+            # Mismo número de palabras: correspondencia 1 a 1 (palabra mal reconocida)
+            for k in range(i2 - i1):
+                w = recognized[j1 + k]
+                timings[i1 + k] = (
+                    int(w["start"] * 1000),
+                    int(w["end"] * 1000),
+                    round(float(w.get("probability", 0.9)) * 0.5, 3)
+                )
+        elif tag == "replace":
+            block = recognized[j1:j2]
+            start_ms = int(block[0]["start"] * 1000)
+            end_ms = int(block[-1]["end"] * 1000)
+            step = (end_ms - start_ms) / (i2 - i1)
+            probability = sum(float(w.get("probability", 0.9)) for w in block) / len(block)
+            for k in range(i2 - i1):
+                timings[i1 + k] = (
+                    int(start_ms + step * k),
+                    int(start_ms + step * (k + 1)),
+                    round(probability * 0.5, 3)
+                )
+
+    # Interpolar huecos (palabras esperadas que el ASR no reconoció)
+    i = 0
+    while i < len(timings):
+        if timings[i] is not None:
+            i += 1
+            continue
+        j = i
+        while j < len(timings) and timings[j] is None:
+            j += 1
+        gap_start = timings[i - 1][1] if i > 0 else 0
+        gap_end = timings[j][0] if j < len(timings) else max(gap_start, duration_ms)
+        step = max(gap_end - gap_start, 0) / (j - i)
+        for k in range(j - i):
+            timings[i + k] = (int(gap_start + step * k), int(gap_start + step * (k + 1)), 0.0)
+        i = j
+
+    words = []
+    max_end_time = 0
+    for k, ((original_word, trailing_space), (start_ms, end_ms, confidence)) in enumerate(zip(word_tokens, timings)):
+        final_word_str = original_word
+        newlines = trailing_space.count("\n")
+        if newlines > 0:
+            final_word_str += "\n" * newlines
+
+        words.append({
+            "word": final_word_str,
+            "start": start_ms,
+            "end": end_ms,
+            "confidence": confidence,
+            "matched": k in heard_exactly
+        })
+        max_end_time = max(max_end_time, end_ms)
+
+    return {
+        "words": words,
+        "duration_ms": max(max_end_time, duration_ms),
+        "transcript": " ".join(w.get("word", "").strip() for w in recognized),
+        "success_rate": matched / len(word_tokens) if word_tokens else 0,
+        "total_words": len(words),
+        "aligned_words": matched
+    }
+
+
+class WhisperAligner(BaseAligner):
+    """
+    Alineación con faster-whisper en el mismo proceso: transcribe con
+    timestamps por palabra y proyecta el resultado sobre el transcript esperado.
+
+    Menos precisa que Gentle en los bordes de palabra (~50-100ms), pero no
+    depende de un servicio externo.
+    """
+
+    name = "whisper"
+
+    def __init__(
+        self,
+        model_size: str = WHISPER_ALIGNER_MODEL,
+        language: str = WHISPER_ALIGNER_LANGUAGE,
+        max_concurrency: int = WHISPER_ALIGNER_CONCURRENCY
+    ):
+        self.model_size = model_size
+        self.language = language
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def _transcribe_words(self, audio: Any) -> Dict[str, Any]:
+        """
+        Transcripción síncrona de una ruta o de muestras de 16 kHz ya decodificadas;
+        devuelve la respuesta cruda (segundos) que se guarda en caché.
+        """
+        from app.services.whisper_service import get_whisper_model
+
+        model = get_whisper_model(self.model_size)
+        segments, info = model.transcribe(
+            audio,
+            language=self.language,
+            word_timestamps=True,
+            beam_size=5,
+            vad_filter=True
+        )
+
+        words = []
+        for segment in segments:
+            for word in segment.words or []:
+                words.append({
+                    "word": word.word.strip(),
+                    "start": round(word.start, 3),
+                    "end": round(word.end, 3),
+                    "probability": round(word.probability, 3)
+                })
+
+        return {"words": words, "duration": info.duration}
+
+    async def align(self, audio_path: str, transcript: str, **options) -> Dict[str, Any]:
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        if not transcript or not transcript.strip():
+            raise AlignmentError("Transcript cannot be empty")
+
+        cache_key = None
+        if alignment_cache.enabled:
+            audio_sha256 = await asyncio.to_thread(hash_file, audio_path)
+            cache_key = make_key(audio_sha256, transcript, {
+                "aligner": self.name, "model": self.model_size, "language": self.language
+            })
+            cached = await asyncio.to_thread(alignment_cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Alignment cache hit for: {audio_path}")
+                return self._process_response(cached, transcript)
+
+        logger.info(f"Starting whisper alignment for: {audio_path}")
+
+        try:
+            # options["samples"]: el mismo audio ya decodificado (audio_preprocessing)
+            audio = options["samples"] if options.get("samples") is not None else audio_path
+            async with self._get_semaphore():
+                result = await asyncio.to_thread(self._transcribe_words, audio)
+        except ImportError as e:
+            raise AlignmentError(str(e))
+        except Exception as e:
+            raise AlignmentError(f"Whisper alignment failed: {e}")
+
+        if cache_key:
+            await asyncio.to_thread(alignment_cache.put, cache_key, result)
+
+        return self._process_response(result, transcript)
+
+    def _process_response(self, response: Dict[str, Any], transcript: str) -> Dict[str, Any]:
+        result = map_words_to_transcript(
+            response.get("words", []),
+            transcript,
+            duration_ms=int(response.get("duration", 0) * 1000)
+        )
+        logger.info(
+            f"Alignment complete: {result['aligned_words']}/{result['total_words']} "
+            f"transcript words matched by whisper."
+        )
+        return result
+
+    async def check_health(self) -> bool:
+        try:
+            import faster_whisper  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+
+_aligners: Dict[str, BaseAligner] = {}
+
+
+def get_aligner(name: Optional[str] = None) -> BaseAligner:
+    """
+    Devuelve el alineador configurado (ALIGNER_BACKEND) o el indicado por nombre.
+    Las instancias se reutilizan.
+    """
+    name = (name or ALIGNER_BACKEND).lower()
+
+    if name not in _aligners:
+        if name == "gentle":
+            # Import diferido: gentle_service importa este módulo
+            from app.services.gentle_service import gentle_service
+            _aligners[name] = gentle_service
+        elif name == "whisper":
+            _aligners[name] = WhisperAligner()
+        else:
+            raise ValueError(f"Unknown aligner backend: {name}")
+
+    return _aligners[name]
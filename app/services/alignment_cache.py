@@ -0,0 +1,167 @@
+"""
+Caché de Alineaciones
+=====================
+
+Guarda en disco la respuesta cruda del alineador para no volver a alinear el
+mismo audio con el mismo texto. La clave combina:
+  - SHA-256 del contenido del audio (no de la ruta: re-subir el mismo archivo acierta)
+  - hash del transcript normalizado (espacios, mayúsculas y forma Unicode)
+  - las opciones del alineador (backend, modo conservador, ...)
+
+Se guarda la respuesta sin procesar; el formato final (saltos de línea del
+transcript original) se reconstruye en cada acierto, así que dos transcripts
+que solo difieren en formato comparten entrada.
+
+El tamaño total está acotado (ALIGNMENT_CACHE_MAX_MB) y se expulsan primero
+las entradas usadas hace más tiempo (LRU por mtime).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 del archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_transcript(transcript: str) -> str:
+    text = unicodedata.normalize("NFC", transcript)
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def make_key(audio_sha256: str, transcript: str, options: Dict[str, Any]) -> str:
+    transcript_hash = hashlib.sha256(normalize_transcript(transcript).encode("utf-8")).hexdigest()
+    options_json = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(f"{audio_sha256}:{transcript_hash}:{options_json}".encode("utf-8")).hexdigest()
+
+
+class AlignmentCache:
+    """Caché en disco, acotado por tamaño, con métricas de aciertos."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("ALIGNMENT_CACHE_DIR", "uploads/cache/alignments"))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.getenv("ALIGNMENT_CACHE_MAX_MB", "200")) * 1024 * 1024)
+        self.enabled = os.getenv("ALIGNMENT_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        return [p for p in self.cache_dir.glob("*/*.json") if p.is_file()]
+
+    def _ensure_size(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(p.stat().st_size for p in self._entries())
+        return self._total_bytes
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # marca de uso para el LRU
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        if len(body) > self.max_bytes:
+            return
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store alignment in cache: {e}")
+            return
+
+        with self._lock:
+            self.stores += 1
+            self._total_bytes = self._ensure_size() + len(body) - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Elimina las entradas menos usadas hasta quedar al 90% del límite."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+                self.evictions += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "size_bytes": self._ensure_size(),
+                "max_bytes": self.max_bytes
+            }
+
+
+# Instancia global del caché
+alignment_cache = AlignmentCache()
@@ -0,0 +1,363 @@
+"""
+Referencias y Recolección de Basura de Blobs de Audio
+=====================================================
+
+Los audios se guardan por contenido (ver audio_storage_service). La tabla
+audio_blob_refs registra qué lección o línea de diálogo usa cada blob; las
+escrituras llaman a set_reference() antes de su db.commit(), igual que
+bump_version() en la caché de referencia.
+
+Recolección de basura (mark-and-sweep, python audio_storage.py gc):
+  - mark:  referencias cuyo dueño sigue existiendo + rutas de blob que aparezcan
+           en audio_lessons.audio_url / dialogue_lines.audio_url
+  - sweep: archivos en blobs/ y filas de audio_blobs sin marcar. Los archivos
+           modificados hace menos de GC_GRACE_MINUTES se respetan (una subida
+           guarda el blob antes de que su referencia se confirme).
+"""
+
+import mimetypes
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+from app.models.models import AudioBlob, AudioBlobRef, AudioLesson, DialogueLine
+from app.services.audio_storage_service import audio_storage_service
+
+OWNER_LESSON = "LESSON"
+OWNER_DIALOGUE_LINE = "DIALOGUE_LINE"
+
+GC_GRACE_MINUTES = int(os.getenv("AUDIO_GC_GRACE_MINUTES", "60"))
+
+# Clave del advisory lock: una sola recolección a la vez
+_GC_LOCK_KEY = 72_190_037
+
+
+def _walk_files(root: Path) -> Iterator[Tuple[Path, os.stat_result]]:
+    if not root.exists():
+        return
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath) / name
+            try:
+                yield path, path.stat()
+            except OSError:
+                continue
+
+
+def _dir_usage(root: Path) -> Dict[str, int]:
+    files = 0
+    size = 0
+    for _, st in _walk_files(root):
+        files += 1
+        size += st.st_size
+    return {"files": files, "bytes": size}
+
+
+class AudioBlobService:
+
+    def set_reference(
+        self,
+        db: Session,
+        owner_type: str,
+        owner_id: int,
+        audio_path: Optional[str]
+    ) -> Optional[str]:
+        """
+        Apunta la referencia del dueño al blob de `audio_path` (sin hacer commit).
+        Si la ruta no es un blob (archivo antiguo o vacío) se elimina la referencia.
+
+        Returns:
+            SHA-256 del blob referenciado, o None
+        """
+        sha256 = audio_storage_service.parse_blob_sha256(audio_path) if audio_path else None
+
+        if not sha256:
+            db.query(AudioBlobRef).filter(
+                AudioBlobRef.owner_type == owner_type,
+                AudioBlobRef.owner_id == owner_id
+            ).delete(synchronize_session=False)
+            return None
+
+        abs_path = audio_storage_service.get_absolute_path(audio_path)
+        size = abs_path.stat().st_size if abs_path.exists() else 0
+
+        db.execute(text("""
+            INSERT INTO audio_blobs (sha256, extension, size_bytes, mime_type, created_at)
+            VALUES (:sha256, :extension, :size, :mime_type, NOW())
+            ON CONFLICT (sha256) DO NOTHING
+        """), {
+            "sha256": sha256,
+            "extension": abs_path.suffix.lower(),
+            "size": size,
+            "mime_type": mimetypes.guess_type(str(abs_path))[0]
+        })
+        db.execute(text("""
+            INSERT INTO audio_blob_refs (owner_type, owner_id, sha256, created_at, updated_at)
+            VALUES (:owner_type, :owner_id, :sha256, NOW(), NOW())
+            ON CONFLICT (owner_type, owner_id) DO UPDATE
+            SET sha256 = EXCLUDED.sha256, updated_at = NOW()
+        """), {"owner_type": owner_type, "owner_id": owner_id, "sha256": sha256})
+        return sha256
+
+    # ==================== Mark & Sweep ====================
+
+    def _mark(self, db: Session, dry_run: bool) -> Tuple[Set[str], int]:
+        """Devuelve (blobs vivos, referencias colgantes)."""
+        owner_exists = or_(
+            and_(AudioBlobRef.owner_type == OWNER_LESSON,
+                 db.query(AudioLesson.id).filter(AudioLesson.id == AudioBlobRef.owner_id).exists()),
+            and_(AudioBlobRef.owner_type == OWNER_DIALOGUE_LINE,
+                 db.query(DialogueLine.id).filter(DialogueLine.id == AudioBlobRef.owner_id).exists())
+        )
+
+        live = {sha for (sha,) in db.query(AudioBlobRef.sha256).filter(owner_exists).distinct()}
+
+        # Referencias de lecciones o líneas que ya no existen
+        dangling = db.query(AudioBlobRef).filter(~owner_exists)
+        dangling_count = dangling.count()
+        if dangling_count and not dry_run:
+            dangling.delete(synchronize_session=False)
+
+        # Rutas de blob sin referencia registrada (p. ej. escritas por código antiguo)
+        for model in (AudioLesson, DialogueLine):
+            for (audio_url,) in db.query(model.audio_url).filter(model.audio_url.like("%blobs/%")):
+                sha = audio_storage_service.parse_blob_sha256(audio_url)
+                if sha:
+                    live.add(sha)
+
+        return live, dangling_count
+
+    def collect_garbage(
+        self,
+        db: Session,
+        dry_run: bool = False,
+        grace_minutes: int = GC_GRACE_MINUTES
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Borra los blobs sin referencias. Devuelve None si otra recolección
+        está en curso.
+        """
+        locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                            {"key": _GC_LOCK_KEY}).scalar()
+        if not locked:
+            db.rollback()
+            return None
+
+        live, dangling_refs = self._mark(db, dry_run)
+        cutoff = time.time() - grace_minutes * 60
+        blobs_root = audio_storage_service.base_path / "blobs"
+
+        deleted_files = 0
+        freed_bytes = 0
+        kept_recent = 0
+        for path, st in list(_walk_files(blobs_root)):
+            sha = audio_storage_service.parse_blob_sha256(str(path))
+            if sha and sha in live:
+                continue
+            if st.st_mtime > cutoff:
+                kept_recent += 1
+                continue
+            deleted_files += 1
+            freed_bytes += st.st_size
+            if not dry_run:
+                try:
+                    path.unlink()
+                except OSError:
+                    deleted_files -= 1
+                    freed_bytes -= st.st_size
+
+        # Filas de blobs sin referencia (con el mismo período de gracia que los archivos)
+        orphan_rows = db.query(AudioBlob).filter(~AudioBlob.sha256.in_(live)) if live else db.query(AudioBlob)
+        deleted_rows = 0
+        for blob in orphan_rows.all():
+            path = audio_storage_service.blob_path(blob.sha256, blob.extension)
+            if path.exists() and path.stat().st_mtime > cutoff:
+                continue
+            deleted_rows += 1
+            if not dry_run:
+                db.delete(blob)
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+            self._remove_empty_dirs(blobs_root)
+            self._remove_stale_uploads(cutoff)
+
+        return {
+            "dry_run": dry_run,
+            "live_blobs": len(live),
+            "dangling_refs": dangling_refs,
+            "deleted_files": deleted_files,
+            "deleted_rows": deleted_rows,
+            "freed_bytes": freed_bytes,
+            "kept_recent": kept_recent
+        }
+
+    @staticmethod
+    def _remove_empty_dirs(root: Path) -> None:
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            if Path(dirpath) != root and not dirnames and not filenames:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _remove_stale_uploads(cutoff: float) -> None:
+        """Subidas interrumpidas que quedaron en temp/."""
+        for path, st in list(_walk_files(audio_storage_service.base_path / "temp")):
+            if st.st_mtime < cutoff:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    # ==================== Reporte ====================
+
+    def disk_usage(self, db: Session) -> Dict[str, Any]:
+        """Uso de disco del almacenamiento de audio y ahorro por deduplicación."""
+        from app.services.alignment_cache import alignment_cache
+        from app.services.tts_cache import tts_cache
+        from app.services.tts_service import DIALOGUE_AUDIO_DIR
+
+        base = audio_storage_service.base_path
+        live = {sha for (sha,) in db.query(AudioBlobRef.sha256).distinct()}
+
+        blobs = {"files": 0, "bytes": 0}
+        unreferenced = {"files": 0, "bytes": 0}
+        sizes: Dict[str, int] = {}
+        for path, st in _walk_files(base / "blobs"):
+            sha = audio_storage_service.parse_blob_sha256(str(path))
+            blobs["files"] += 1
+            blobs["bytes"] += st.st_size
+            if sha:
+                sizes[sha] = st.st_size
+            if sha not in live:
+                unreferenced["files"] += 1
+                unreferenced["bytes"] += st.st_size
+
+        # Lo que ocuparían las referencias si cada dueño tuviera su propia copia
+        logical_bytes = sum(
+            sizes.get(sha, 0) for (sha,) in db.query(AudioBlobRef.sha256)
+        )
+        referenced_bytes = sum(sizes.get(sha, 0) for sha in live)
+
+        refs_by_type = dict(
+            db.execute(text(
+                "SELECT owner_type, COUNT(*) FROM audio_blob_refs GROUP BY owner_type"
+            )).all()
+        )
+
+        return {
+            "blobs": blobs,
+            "referenced_bytes": referenced_bytes,
+            "unreferenced": unreferenced,
+            "references": refs_by_type,
+            "logical_bytes": logical_bytes,
+            "dedup_saved_bytes": max(logical_bytes - referenced_bytes, 0),
+            "directories": {
+                "legacy_lessons": _dir_usage(base / "lessons"),
+                "temp": _dir_usage(base / "temp"),
+                "dialogue_tts": _dir_usage(Path(DIALOGUE_AUDIO_DIR)),
+                "tts_cache": _dir_usage(tts_cache.cache_dir),
+                "alignment_cache": _dir_usage(alignment_cache.cache_dir)
+            }
+        }
+
+    # ==================== Migración ====================
+
+    def migrate_legacy_files(self, db: Session, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Mueve los audios de lecciones con nombre antiguo (lesson_{id}_{fecha})
+        al almacenamiento por contenido y registra sus referencias. Las líneas
+        de diálogo se enlazan sin borrar el archivo TTS original, que el
+        servicio TTS usa como caché.
+        """
+        result = {"lessons": 0, "dialogue_lines": 0, "missing": 0}
+        migrated_files = set()
+
+        for lesson in db.query(AudioLesson).filter(AudioLesson.audio_url.isnot(None)).all():
+            if audio_storage_service.parse_blob_sha256(lesson.audio_url):
+                self.set_reference(db, OWNER_LESSON, lesson.id, lesson.audio_url)
+                continue
+            abs_path = audio_storage_service.get_absolute_path(lesson.audio_url)
+            if not abs_path.exists():
+                result["missing"] += 1
+                continue
+            result["lessons"] += 1
+            if dry_run:
+                continue
+            relative_path, _, _ = audio_storage_service.ingest_file(str(abs_path), move=False)
+            # Solo se borran los archivos del directorio antiguo; rutas externas se dejan
+            if abs_path.resolve().parent == (audio_storage_service.base_path / "lessons").resolve():
+                migrated_files.add(abs_path)
+            lesson.audio_url = relative_path
+            self.set_reference(db, OWNER_LESSON, lesson.id, relative_path)
+
+        for line in db.query(DialogueLine).filter(DialogueLine.audio_url.isnot(None)).all():
+            if audio_storage_service.parse_blob_sha256(line.audio_url):
+                # URLs guardadas como ruta del sistema de archivos (AUDIO_STORAGE_PATH absoluto)
+                if os.path.isabs(line.audio_url):
+                    line.audio_url = audio_storage_service.get_public_path(line.audio_url)
+                self.set_reference(db, OWNER_DIALOGUE_LINE, line.id, line.audio_url)
+                continue
+            if not os.path.exists(line.audio_url):
+                result["missing"] += 1
+                continue
+            result["dialogue_lines"] += 1
+            if dry_run:
+                continue
+            relative_path, _, _ = audio_storage_service.ingest_file(line.audio_url, move=False)
+            line.audio_url = audio_storage_service.get_public_path(relative_path)
+            self.set_reference(db, OWNER_DIALOGUE_LINE, line.id, relative_path)
+
+        if dry_run:
+            db.rollback()
+            return result
+
+        db.commit()
+        # Los archivos antiguos se borran solo cuando las nuevas rutas están confirmadas
+        for path in migrated_files:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        return result
+
+    def purge_legacy_tts(self, db: Session, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Borra los audios TTS con el esquema anterior (md5 y
+        dialogue_{id}/line_{id}.mp3), reemplazados por el caché TTS. Los
+        archivos que alguna línea de diálogo todavía usa como audio_url se
+        conservan (corra antes `migrar`).
+        """
+        from app.services.tts_service import DIALOGUE_AUDIO_DIR
+
+        in_use = {
+            os.path.normpath(url)
+            for (url,) in db.query(DialogueLine.audio_url).filter(DialogueLine.audio_url.isnot(None))
+        }
+        result = {"deleted_files": 0, "freed_bytes": 0, "kept_in_use": 0}
+        for path, st in _walk_files(Path(DIALOGUE_AUDIO_DIR)):
+            if os.path.normpath(str(path)) in in_use:
+                result["kept_in_use"] += 1
+                continue
+            result["deleted_files"] += 1
+            result["freed_bytes"] += st.st_size
+            if not dry_run:
+                path.unlink(missing_ok=True)
+
+        if not dry_run:
+            for dirpath, dirnames, filenames in os.walk(DIALOGUE_AUDIO_DIR, topdown=False):
+                if dirpath != DIALOGUE_AUDIO_DIR and not dirnames and not filenames:
+                    os.rmdir(dirpath)
+        return result
+
+
+# Instancia global del servicio
+audio_blob_service = AudioBlobService()
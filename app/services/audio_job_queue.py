@@ -0,0 +1,351 @@
+"""
+Cola de Procesamiento de Audio
+==============================
+
+Cola respaldada por PostgreSQL para la alineación con Gentle. Los endpoints
+encolan un trabajo y responden de inmediato; los workers (audio_worker.py)
+toman trabajos con SELECT ... FOR UPDATE SKIP LOCKED, de modo que varios
+procesos pueden consumir la cola sin pisarse.
+
+Mientras procesa, el worker renueva locked_at cada AUDIO_JOB_HEARTBEAT_SECONDS.
+Un trabajo sin renovar durante AUDIO_JOB_LOCK_TIMEOUT_SECONDS se da por
+abandonado (worker caído): vuelve a la cola, o queda en ERROR si ya agotó sus
+intentos (un trabajo que tumba al worker no se reintenta para siempre). Solo
+el worker que tiene el bloqueo (locked_by) puede completar o fallar el trabajo.
+
+Ciclo de vida de un trabajo:
+    PENDIENTE -> PROCESANDO -> COMPLETADO
+                            -> PENDIENTE (reintento con backoff)
+                            -> ERROR (agotó max_attempts)
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.models import AudioLesson, AudioProcessingJob
+from app.services.gentle_service import gentle_service
+from app.schemas.audio_lesson import AudioLessonStatus, AudioJobStatus
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv("AUDIO_JOB_MAX_ATTEMPTS", "3"))
+BACKOFF_SECONDS = float(os.getenv("AUDIO_JOB_BACKOFF_SECONDS", "10"))
+MAX_BACKOFF_SECONDS = float(os.getenv("AUDIO_JOB_MAX_BACKOFF_SECONDS", "600"))
+# Un trabajo bloqueado más tiempo que esto se considera abandonado (worker caído)
+LOCK_TIMEOUT_SECONDS = int(os.getenv("AUDIO_JOB_LOCK_TIMEOUT_SECONDS", "900"))
+# Cada cuánto renueva locked_at el worker que procesa (muy por debajo del timeout)
+HEARTBEAT_SECONDS = float(os.getenv("AUDIO_JOB_HEARTBEAT_SECONDS", "60"))
+
+ACTIVE_STATES = (AudioJobStatus.PENDIENTE.value, AudioJobStatus.PROCESANDO.value)
+
+
+class AudioJobQueue:
+    """Operaciones sobre la tabla audio_processing_jobs."""
+
+    def enqueue(
+        self,
+        db: Session,
+        lesson: AudioLesson,
+        force_reprocess: bool = False
+    ) -> AudioProcessingJob:
+        """
+        Encola el procesamiento de una lección. Si ya hay un trabajo activo
+        para la lección, devuelve ese trabajo en lugar de crear otro.
+        """
+        active = self.get_active_job(db, lesson.id)
+        if active:
+            return active
+
+        job = AudioProcessingJob(
+            audio_lesson_id=lesson.id,
+            estado=AudioJobStatus.PENDIENTE.value,
+            force_reprocess=force_reprocess,
+            max_attempts=MAX_ATTEMPTS,
+            run_after=datetime.utcnow()
+        )
+        db.add(job)
+        lesson.estado = AudioLessonStatus.PROCESANDO.value
+        lesson.updated_at = datetime.utcnow()
+
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otra petición encoló la misma lección al mismo tiempo
+            db.rollback()
+            return self.get_active_job(db, lesson.id)
+
+        db.refresh(job)
+        logger.info(f"Enqueued audio processing job {job.id} for lesson {lesson.id}")
+        return job
+
+    def get_active_job(self, db: Session, lesson_id: int) -> Optional[AudioProcessingJob]:
+        return db.query(AudioProcessingJob).filter(
+            AudioProcessingJob.audio_lesson_id == lesson_id,
+            AudioProcessingJob.estado.in_(ACTIVE_STATES)
+        ).first()
+
+    def get_latest_job(self, db: Session, lesson_id: int) -> Optional[AudioProcessingJob]:
+        return db.query(AudioProcessingJob).filter(
+            AudioProcessingJob.audio_lesson_id == lesson_id
+        ).order_by(AudioProcessingJob.id.desc()).first()
+
+    def claim(self, db: Session, worker_id: str) -> Optional[AudioProcessingJob]:
+        """
+        Toma el siguiente trabajo listo. Las filas bloqueadas por otros
+        workers se saltan (SKIP LOCKED) en lugar de esperar.
+        """
+        now = datetime.utcnow()
+        job = db.query(AudioProcessingJob).filter(
+            AudioProcessingJob.estado == AudioJobStatus.PENDIENTE.value,
+            AudioProcessingJob.run_after <= now
+        ).order_by(
+            AudioProcessingJob.run_after, AudioProcessingJob.id
+        ).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.rollback()
+            return None
+
+        job.estado = AudioJobStatus.PROCESANDO.value
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts += 1
+        job.progress = 10
+        if not job.started_at:
+            job.started_at = now
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def set_progress(self, db: Session, job: AudioProcessingJob, progress: int) -> None:
+        job.progress = progress
+        db.commit()
+
+    def heartbeat(self, db: Session, job_id: int, worker_id: str) -> bool:
+        """Renueva el bloqueo del trabajo. False si otro worker ya lo tomó."""
+        renewed = db.query(AudioProcessingJob).filter(
+            AudioProcessingJob.id == job_id,
+            AudioProcessingJob.estado == AudioJobStatus.PROCESANDO.value,
+            AudioProcessingJob.locked_by == worker_id
+        ).update({AudioProcessingJob.locked_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return bool(renewed)
+
+    def _owned(self, db: Session, job: AudioProcessingJob, worker_id: str) -> Optional[AudioProcessingJob]:
+        """
+        Bloquea y recarga el trabajo si `worker_id` sigue siendo su dueño. Si se
+        liberó por timeout y otro worker lo tomó, su estado no debe pisarse.
+        """
+        owned = db.query(AudioProcessingJob).filter(
+            AudioProcessingJob.id == job.id,
+            AudioProcessingJob.locked_by == worker_id
+        ).with_for_update().populate_existing().first()
+        if not owned:
+            db.rollback()
+            logger.warning(f"Job {job.id} is no longer locked by {worker_id}; result discarded")
+        return owned
+
+    def complete(self, db: Session, job: AudioProcessingJob, worker_id: str) -> bool:
+        job = self._owned(db, job, worker_id)
+        if not job:
+            return False
+        job.estado = AudioJobStatus.COMPLETADO.value
+        job.progress = 100
+        job.last_error = None
+        job.locked_by = None
+        job.locked_at = None
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return True
+
+    def fail(self, db: Session, job: AudioProcessingJob, worker_id: str, error: str) -> bool:
+        """
+        Registra un intento fallido. Si quedan intentos, el trabajo vuelve a
+        PENDIENTE con backoff exponencial; si no, queda en ERROR junto con la lección.
+        """
+        job = self._owned(db, job, worker_id)
+        if not job:
+            return False
+        job.last_error = error
+        job.locked_by = None
+        job.locked_at = None
+
+        lesson = db.query(AudioLesson).filter(AudioLesson.id == job.audio_lesson_id).first()
+
+        if job.attempts < job.max_attempts:
+            delay = min(BACKOFF_SECONDS * (2 ** (job.attempts - 1)), MAX_BACKOFF_SECONDS)
+            job.estado = AudioJobStatus.PENDIENTE.value
+            job.progress = 0
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            if lesson:
+                # La lección sigue en cola mientras haya reintentos
+                lesson.estado = AudioLessonStatus.PROCESANDO.value
+            logger.warning(
+                f"Job {job.id} attempt {job.attempts}/{job.max_attempts} failed, "
+                f"retrying in {delay:.0f}s: {error}"
+            )
+        else:
+            job.estado = AudioJobStatus.ERROR.value
+            job.finished_at = datetime.utcnow()
+            if lesson:
+                lesson.estado = AudioLessonStatus.ERROR.value
+            logger.error(f"Job {job.id} failed after {job.attempts} attempts: {error}")
+
+        db.commit()
+        return True
+
+    def release_stale(self, db: Session) -> int:
+        """
+        Devuelve a la cola los trabajos cuyo worker dejó de responder (sin
+        heartbeat durante LOCK_TIMEOUT_SECONDS). Los que ya agotaron sus
+        intentos quedan en ERROR junto con su lección.
+        """
+        now = datetime.utcnow()
+        limit = now - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+        stale = db.query(AudioProcessingJob).filter(
+            AudioProcessingJob.estado == AudioJobStatus.PROCESANDO.value,
+            AudioProcessingJob.locked_at < limit
+        ).with_for_update(skip_locked=True).all()
+
+        failed = 0
+        for job in stale:
+            job.locked_by = None
+            job.locked_at = None
+            job.progress = 0
+            if job.attempts >= job.max_attempts:
+                job.estado = AudioJobStatus.ERROR.value
+                job.last_error = f"Worker stopped responding (attempt {job.attempts}/{job.max_attempts})"
+                job.finished_at = now
+                lesson = db.query(AudioLesson).filter(AudioLesson.id == job.audio_lesson_id).first()
+                if lesson:
+                    lesson.estado = AudioLessonStatus.ERROR.value
+                failed += 1
+            else:
+                job.estado = AudioJobStatus.PENDIENTE.value
+                job.run_after = now
+        db.commit()
+
+        if stale:
+            logger.warning(
+                f"Released {len(stale) - failed} stale audio processing jobs, "
+                f"{failed} marked as ERROR (no attempts left)"
+            )
+        return len(stale)
+
+
+class AudioWorker:
+    """
+    Consume la cola con `concurrency` trabajos en paralelo. Las operaciones
+    de base de datos (síncronas) se ejecutan en hilos; la alineación con
+    Gentle es asíncrona.
+    """
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 2.0, worker_name: Optional[str] = None):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self._last_release = 0.0
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info(f"Audio worker {self.worker_name} started with concurrency {self.concurrency}")
+        try:
+            await asyncio.gather(*(self._loop(i) for i in range(self.concurrency)))
+        finally:
+            await gentle_service.close()
+        logger.info(f"Audio worker {self.worker_name} stopped")
+
+    async def _loop(self, slot: int) -> None:
+        worker_id = f"{self.worker_name}:{slot}"
+        while not self._stopping.is_set():
+            try:
+                processed = await self.run_once(worker_id)
+            except Exception as e:
+                logger.error(f"Audio worker {worker_id} error: {e}")
+                processed = False
+
+            if not processed:
+                if slot == 0:
+                    await self._maybe_release_stale()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self, worker_id: str) -> bool:
+        """Procesa un trabajo si hay alguno listo. Devuelve True si procesó uno."""
+        # Import diferido: audio_lesson_service importa esta cola
+        from app.services.audio_lesson_service import audio_lesson_service, AudioLessonServiceError
+
+        db = SessionLocal()
+        try:
+            job = await asyncio.to_thread(audio_job_queue.claim, db, worker_id)
+            if not job:
+                return False
+
+            logger.info(f"Worker {worker_id} processing job {job.id} (lesson {job.audio_lesson_id})")
+            heartbeat = asyncio.create_task(self._heartbeat(job.id, worker_id))
+            try:
+                await asyncio.to_thread(audio_job_queue.set_progress, db, job, 30)
+                await audio_lesson_service.process_audio_with_gentle(
+                    db, job.audio_lesson_id, force_reprocess=job.force_reprocess
+                )
+            except AudioLessonServiceError as e:
+                await asyncio.to_thread(audio_job_queue.fail, db, job, worker_id, str(e))
+            except Exception as e:
+                db.rollback()
+                await asyncio.to_thread(audio_job_queue.fail, db, job, worker_id, f"Unexpected error: {e}")
+            else:
+                await asyncio.to_thread(audio_job_queue.complete, db, job, worker_id)
+            finally:
+                heartbeat.cancel()
+            return True
+        finally:
+            db.close()
+
+    async def _heartbeat(self, job_id: int, worker_id: str) -> None:
+        """Renueva locked_at mientras dura el trabajo (alineaciones por fragmentos largas)."""
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                if not await asyncio.to_thread(self._renew_lock, job_id, worker_id):
+                    logger.warning(f"Job {job_id} lock was taken over; {worker_id} stops renewing it")
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat for job {job_id} failed: {e}")
+
+    def _renew_lock(self, job_id: int, worker_id: str) -> bool:
+        # Sesión propia: la del trabajo la usa el procesamiento en paralelo
+        db = SessionLocal()
+        try:
+            return audio_job_queue.heartbeat(db, job_id, worker_id)
+        finally:
+            db.close()
+
+    async def _maybe_release_stale(self) -> None:
+        now = asyncio.get_running_loop().time()
+        if now - self._last_release >= 60:
+            self._last_release = now
+            await asyncio.to_thread(self._release_stale)
+
+    def _release_stale(self) -> None:
+        db = SessionLocal()
+        try:
+            audio_job_queue.release_stale(db)
+        finally:
+            db.close()
+
+
+# Instancia global de la cola
+audio_job_queue = AudioJobQueue()
@@ -12,12 +12,16 @@ import logging
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from fastapi import BackgroundTasks
+from sqlalchemy import and_, or_, func, tuple_
 
 from app.models.models import AudioLesson, StudentAudioProgress, Modulo, Curso
-from app.services.gentle_service import gentle_service, GentleAlignmentError
+from app.services.aligner_service import AlignmentError
+from app.services.chunked_alignment import chunked_aligner
 from app.services.audio_storage_service import audio_storage_service, AudioStorageError
+from app.services.audio_blob_service import audio_blob_service, OWNER_LESSON
+from app.services.media_serving import lesson_media_cache
+from app.services.audio_job_queue import audio_job_queue
+from app.services.progress_aggregator import progress_aggregator
 from app.schemas.audio_lesson import (
     AudioLessonCreate, AudioLessonUpdate, AudioLessonStatus,
     TimestampsData, WordTimestamp
@@ -238,7 +242,11 @@ class AudioLessonService:
             db_lesson.audio_duration_ms = duration_ms
         db_lesson.updated_at = datetime.utcnow()
         
+        # El blob anterior queda sin referencia y lo borra el recolector de basura
+        audio_blob_service.set_reference(db, OWNER_LESSON, lesson_id, audio_url)
+        
         db.commit()
+        lesson_media_cache.invalidate(lesson_id)
         db.refresh(db_lesson)
         
         return db_lesson
@@ -283,7 +291,7 @@ class AudioLessonService:
                 "message": "Lesson already processed",
                 "lesson_id": lesson_id,
                 "estado": db_lesson.estado,
-                "words_count": len(db_lesson.timestamps_json.get("words", [])) if db_lesson.timestamps_json else 0
+                "words_count": len(db_lesson.timestamps.get("words", [])) if db_lesson.timestamps else 0
             }
         
         # Marcar como procesando
@@ -302,19 +310,18 @@ class AudioLessonService:
             if not os.path.exists(audio_path):
                 raise AudioLessonServiceError(f"Audio file not found: {audio_path}")
             
-            # Procesar con Gentle
-            result = await gentle_service.align_with_retry(
+            # Alinear con el backend configurado; las grabaciones largas se alinean
+            # por fragmentos (los reintentos del trabajo completo los maneja la cola)
+            result = await chunked_aligner.align(
                 audio_path=audio_path,
                 transcript=db_lesson.transcript_text
             )
             
-            # Guardar timestamps (como JSON string para la columna Text)
-            timestamps_data = {
+            # Guardar timestamps (JSON en la columna Text + versión compacta en gzip)
+            db_lesson.timestamps = {
                 "words": result["words"],
                 "duration_ms": result["duration_ms"]
             }
-            
-            db_lesson.timestamps_json = json.dumps(timestamps_data)
             db_lesson.audio_duration_ms = result["duration_ms"]
             db_lesson.estado = AudioLessonStatus.LISTO.value
             db_lesson.updated_at = datetime.utcnow()
@@ -337,7 +344,7 @@ class AudioLessonService:
                 "success_rate": result["success_rate"]
             }
         
-        except (GentleAlignmentError, AudioStorageError) as e:
+        except (AlignmentError, AudioStorageError) as e:
             db_lesson.estado = AudioLessonStatus.ERROR.value
             db.commit()
             
@@ -352,38 +359,75 @@ class AudioLessonService:
                 
             raise AudioLessonServiceError(f"Processing failed: {e}")
     
-    def process_audio_background(
+    def enqueue_processing(
         self,
-        background_tasks: BackgroundTasks,
         db: Session,
-        lesson_id: int
-    ) -> None:
+        lesson_id: int,
+        force_reprocess: bool = False
+    ) -> Dict[str, Any]:
         """
-        Inicia el procesamiento de audio en background.
+        Encola el procesamiento de una lección; un worker (audio_worker.py)
+        lo ejecuta y el cliente consulta el avance con get_processing_status().
         
         Args:
-            background_tasks: FastAPI BackgroundTasks
             db: Sesión de base de datos
             lesson_id: ID de la lección
+            force_reprocess: Forzar reprocesamiento
+        
+        Returns:
+            Dict con el estado de la lección y el trabajo encolado
+        
+        Raises:
+            AudioLessonServiceError: Si la lección no se puede procesar
         """
         db_lesson = self.get_lesson(db, lesson_id)
         
-        if db_lesson:
-            db_lesson.estado = AudioLessonStatus.PROCESANDO.value
-            db.commit()
+        if not db_lesson:
+            raise AudioLessonServiceError(f"Lesson not found: {lesson_id}")
         
-        # Nota: Para background tasks async, necesitaríamos usar Celery o similar
-        # Por ahora, el procesamiento se hace sincrónicamente en el endpoint
-        background_tasks.add_task(
-            self._background_process_wrapper,
-            lesson_id
-        )
+        if not db_lesson.audio_url:
+            raise AudioLessonServiceError("Lesson has no audio file")
+        
+        if not db_lesson.transcript_text:
+            raise AudioLessonServiceError("Lesson has no transcript")
+        
+        if db_lesson.estado == AudioLessonStatus.LISTO.value and not force_reprocess:
+            return {
+                "success": True,
+                "message": "Lesson already processed",
+                "lesson_id": lesson_id,
+                "estado": db_lesson.estado,
+                "words_count": len(db_lesson.timestamps.get("words", [])) if db_lesson.timestamps else 0,
+                "duration_ms": db_lesson.audio_duration_ms,
+                "job_id": None
+            }
+        
+        job = audio_job_queue.enqueue(db, db_lesson, force_reprocess=force_reprocess)
+        db.refresh(db_lesson)
+        
+        return {
+            "success": True,
+            "message": "Audio processing queued",
+            "lesson_id": lesson_id,
+            "estado": db_lesson.estado,
+            "job_id": job.id
+        }
     
-    async def _background_process_wrapper(self, lesson_id: int) -> None:
-        """Wrapper para procesamiento en background."""
-        # Nota: Esto requiere crear una nueva sesión de DB
-        # En producción, usar Celery o similar
-        logger.info(f"Background processing for lesson {lesson_id}")
+    def get_processing_status(self, db: Session, lesson_id: int) -> Optional[Dict[str, Any]]:
+        """Estado de la lección y de su último trabajo de procesamiento."""
+        db_lesson = self.get_lesson(db, lesson_id)
+        
+        if not db_lesson:
+            return None
+        
+        timestamps = db_lesson.timestamps
+        return {
+            "lesson_id": lesson_id,
+            "estado": db_lesson.estado,
+            "words_count": len(timestamps.get("words", [])) if timestamps else None,
+            "duration_ms": db_lesson.audio_duration_ms,
+            "job": audio_job_queue.get_latest_job(db, lesson_id)
+        }
     
     # ==================== Student Progress ====================
     
@@ -453,52 +497,203 @@ class AudioLessonService:
         
         return progress
     
+    def record_student_progress(
+        self,
+        db: Session,
+        estudiante_id: int,
+        lesson_id: int,
+        position_ms: int,
+        completed: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Registra un ping de progreso en el agregador (se escribe en el próximo
+        lote) y devuelve el progreso como quedará al escribirse.
+        
+        Una sola consulta verifica la lección y lee el progreso guardado; solo
+        el primer ping de una lección se escribe de inmediato, para tener id.
+        
+        Returns:
+            Dict con los campos de StudentAudioProgressResponse, o None si la
+            lección no existe
+        """
+        row = self._lesson_progress_row(db, estudiante_id, lesson_id)
+        if row is None:
+            return None
+        progress = row[1]
+        
+        progress_aggregator.record(estudiante_id, lesson_id, position_ms, completed)
+        
+        if progress is None:
+            progress_aggregator.flush(db, keys=[(estudiante_id, lesson_id)])
+            progress = self._lesson_progress_row(db, estudiante_id, lesson_id)[1]
+            if progress is None:
+                # Otro proceso ya tomó el ping del agregador (modo sin buffer)
+                progress = self.get_student_progress(db, estudiante_id, lesson_id)
+        
+        result = {
+            "id": progress.id,
+            "estudiante_id": estudiante_id,
+            "audio_lesson_id": lesson_id,
+            "last_position_ms": progress.last_position_ms or 0,
+            "times_completed": progress.times_completed or 0,
+            "total_time_listened_ms": progress.total_time_listened_ms or 0,
+            "completed": bool(progress.completed),
+            "created_at": progress.created_at,
+            "updated_at": progress.updated_at
+        }
+        
+        pending = progress_aggregator.pending_for(estudiante_id, lesson_id)
+        if pending:
+            (result["last_position_ms"], result["total_time_listened_ms"],
+             result["times_completed"], result["completed"]) = pending.apply_to(
+                result["last_position_ms"], result["total_time_listened_ms"],
+                result["times_completed"], result["completed"]
+            )
+            result["updated_at"] = datetime.utcnow()
+        
+        return result
+    
+    def record_student_progress_batch(
+        self,
+        db: Session,
+        estudiante_id: int,
+        items: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Registra varios pings (de una o varias lecciones, en orden) en el
+        agregador. Los de lecciones inexistentes se descartan.
+        
+        Returns:
+            {"accepted": n, "unknown_lessons": [ids]}
+        """
+        lesson_ids = {item["audio_lesson_id"] for item in items}
+        existing = {
+            lesson_id for (lesson_id,) in
+            db.query(AudioLesson.id).filter(AudioLesson.id.in_(lesson_ids))
+        } if lesson_ids else set()
+        
+        accepted = 0
+        for item in items:
+            if item["audio_lesson_id"] not in existing:
+                continue
+            progress_aggregator.record(
+                estudiante_id, item["audio_lesson_id"],
+                item["last_position_ms"], item.get("completed", False)
+            )
+            accepted += 1
+        
+        return {"accepted": accepted, "unknown_lessons": sorted(lesson_ids - existing)}
+    
+    def _lesson_progress_row(self, db: Session, estudiante_id: int, lesson_id: int):
+        """(id de la lección, progreso o None), o None si la lección no existe."""
+        return (
+            db.query(AudioLesson.id, StudentAudioProgress)
+            .outerjoin(StudentAudioProgress, and_(
+                StudentAudioProgress.audio_lesson_id == AudioLesson.id,
+                StudentAudioProgress.estudiante_id == estudiante_id
+            ))
+            .filter(AudioLesson.id == lesson_id)
+            .first()
+        )
+    
+    @staticmethod
+    def encode_cursor(orden: Optional[int], lesson_id: int) -> str:
+        """Cursor de paginación (keyset) a partir de la última lección devuelta."""
+        return f"{orden or 0}:{lesson_id}"
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """Inverso de encode_cursor(); lanza ValueError si el cursor no es válido."""
+        orden, _, lesson_id = cursor.partition(":")
+        return int(orden), int(lesson_id)
+    
     def get_student_lessons_with_progress(
         self,
         db: Session,
         estudiante_id: int,
-        modulo_id: Optional[int] = None
+        modulo_id: Optional[int] = None,
+        after: Optional[tuple] = None,
+        limit: int = 100
     ) -> List[Dict[str, Any]]:
         """
         Obtiene las lecciones de un estudiante con su progreso.
         
+        Una sola consulta: audio_lessons LEFT JOIN student_audio_progress (del
+        estudiante) y los nombres de módulo/curso. La paginación es por keyset
+        sobre (orden, id), así que las páginas siguientes no recorren las anteriores.
+        
         Args:
             db: Sesión de base de datos
             estudiante_id: ID del estudiante
             modulo_id: Filtrar por módulo
+            after: (orden, id) de la última lección de la página anterior
+            limit: Máximo de lecciones
         
         Returns:
             Lista de lecciones con progreso
         """
-        lessons = self.get_lessons(db, modulo_id=modulo_id)
+        orden = func.coalesce(AudioLesson.orden, 0)
+        query = (
+            db.query(
+                AudioLesson,
+                Modulo.nombre.label("modulo_nombre"),
+                Curso.id.label("curso_existente"),
+                StudentAudioProgress
+            )
+            .outerjoin(StudentAudioProgress, and_(
+                StudentAudioProgress.audio_lesson_id == AudioLesson.id,
+                StudentAudioProgress.estudiante_id == estudiante_id
+            ))
+            .outerjoin(Modulo, Modulo.id == AudioLesson.modulo_id)
+            .outerjoin(Curso, Curso.id == AudioLesson.curso_id)
+            .filter(AudioLesson.activo == True)
+        )
+        
+        if modulo_id:
+            query = query.filter(AudioLesson.modulo_id == modulo_id)
+        
+        if after:
+            query = query.filter(tuple_(orden, AudioLesson.id) > tuple_(after[0], after[1]))
+        
+        rows = query.order_by(orden, AudioLesson.id).limit(limit).all()
         
         result = []
-        for lesson in lessons:
-            progress = self.get_student_progress(db, estudiante_id, lesson.id)
-            
+        for lesson, modulo_nombre, curso_existente, progress in rows:
             lesson_dict = {
                 "id": lesson.id,
                 "titulo": lesson.titulo,
                 "descripcion": lesson.descripcion,
+                "modulo_id": lesson.modulo_id,
+                "curso_id": lesson.curso_id,
+                "modulo_nombre": modulo_nombre,
+                "curso_nombre": f"Curso {curso_existente}" if curso_existente else None,
                 "audio_url": lesson.audio_url,
                 "audio_duration_ms": lesson.audio_duration_ms,
                 "estado": lesson.estado,
-                "orden": lesson.orden,
+                "orden": lesson.orden or 0,
+                "activo": lesson.activo,
+                "created_at": lesson.created_at,
+                "updated_at": lesson.updated_at,
                 "progress": None,
                 "progress_percentage": 0
             }
             
             if progress:
                 lesson_dict["progress"] = {
-                    "last_position_ms": progress.last_position_ms,
-                    "times_completed": progress.times_completed,
-                    "total_time_listened_ms": progress.total_time_listened_ms,
-                    "completed": progress.completed
+                    "id": progress.id,
+                    "estudiante_id": progress.estudiante_id,
+                    "audio_lesson_id": progress.audio_lesson_id,
+                    "last_position_ms": progress.last_position_ms or 0,
+                    "times_completed": progress.times_completed or 0,
+                    "total_time_listened_ms": progress.total_time_listened_ms or 0,
+                    "completed": bool(progress.completed),
+                    "created_at": progress.created_at,
+                    "updated_at": progress.updated_at
                 }
                 
                 if lesson.audio_duration_ms and lesson.audio_duration_ms > 0:
                     lesson_dict["progress_percentage"] = round(
-                        (progress.last_position_ms / lesson.audio_duration_ms) * 100,
+                        ((progress.last_position_ms or 0) / lesson.audio_duration_ms) * 100,
                         1
                     )
             
@@ -506,6 +701,57 @@ class AudioLessonService:
         
         return result
     
+    def get_student_module_summary(
+        self,
+        db: Session,
+        estudiante_id: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Resumen del progreso del estudiante por módulo (una sola consulta agrupada).
+        
+        Returns:
+            Lista con total de lecciones, iniciadas, completadas, duración total,
+            tiempo escuchado y porcentaje completado de cada módulo
+        """
+        completed = func.count(StudentAudioProgress.id).filter(StudentAudioProgress.completed == True)
+        total = func.count(AudioLesson.id)
+        
+        rows = (
+            db.query(
+                AudioLesson.modulo_id,
+                Modulo.nombre,
+                total.label("total_lessons"),
+                func.count(StudentAudioProgress.id).label("started_lessons"),
+                completed.label("completed_lessons"),
+                func.coalesce(func.sum(AudioLesson.audio_duration_ms), 0).label("total_duration_ms"),
+                func.coalesce(func.sum(StudentAudioProgress.total_time_listened_ms), 0).label("listened_ms")
+            )
+            .outerjoin(StudentAudioProgress, and_(
+                StudentAudioProgress.audio_lesson_id == AudioLesson.id,
+                StudentAudioProgress.estudiante_id == estudiante_id
+            ))
+            .outerjoin(Modulo, Modulo.id == AudioLesson.modulo_id)
+            .filter(AudioLesson.activo == True)
+            .group_by(AudioLesson.modulo_id, Modulo.nombre, Modulo.orden)
+            .order_by(func.coalesce(Modulo.orden, 0), AudioLesson.modulo_id)
+            .all()
+        )
+        
+        return [
+            {
+                "modulo_id": row.modulo_id,
+                "modulo_nombre": row.nombre,
+                "total_lessons": row.total_lessons,
+                "started_lessons": row.started_lessons,
+                "completed_lessons": row.completed_lessons,
+                "total_duration_ms": int(row.total_duration_ms),
+                "listened_ms": int(row.listened_ms),
+                "progress_percentage": round(row.completed_lessons / row.total_lessons * 100, 1)
+                if row.total_lessons else 0
+            }
+            for row in rows
+        ]
+    
     # ==================== Utility Methods ====================
     
     def get_lesson_with_details(
@@ -523,12 +769,20 @@ class AudioLessonService:
         Returns:
             Dict con la lección y detalles o None
         """
-        db_lesson = self.get_lesson(db, lesson_id)
+        row = (
+            db.query(AudioLesson, Modulo.nombre, Curso.id)
+            .outerjoin(Modulo, Modulo.id == AudioLesson.modulo_id)
+            .outerjoin(Curso, Curso.id == AudioLesson.curso_id)
+            .filter(AudioLesson.id == lesson_id)
+            .first()
+        )
         
-        if not db_lesson:
+        if not row:
             return None
         
-        result = {
+        db_lesson, modulo_nombre, curso_existente = row
+        
+        return {
             "id": db_lesson.id,
             "titulo": db_lesson.titulo,
             "descripcion": db_lesson.descripcion,
@@ -543,23 +797,9 @@ class AudioLessonService:
             "activo": db_lesson.activo,
             "created_at": db_lesson.created_at,
             "updated_at": db_lesson.updated_at,
-            "modulo_nombre": None,
-            "curso_nombre": None
+            "modulo_nombre": modulo_nombre,
+            "curso_nombre": f"Curso {curso_existente}" if curso_existente else None
         }
-        
-        # Obtener nombre del módulo
-        if db_lesson.modulo_id:
-            modulo = db.query(Modulo).filter(Modulo.id == db_lesson.modulo_id).first()
-            if modulo:
-                result["modulo_nombre"] = modulo.nombre
-        
-        # Obtener nombre del curso si existe
-        if db_lesson.curso_id:
-            curso = db.query(Curso).filter(Curso.id == db_lesson.curso_id).first()
-            if curso:
-                result["curso_nombre"] = f"Curso {curso.id}"
-        
-        return result
 
 
 # Instancia global del servicio
@@ -0,0 +1,171 @@
+"""
+Evaluation Audio Preprocessing
+==============================
+
+Student recordings arrive in whatever format the browser produced (webm,
+ogg, mp4, wav...). Before any inference, each upload is decoded exactly once
+to 16 kHz mono PCM in memory:
+
+    prepared = preprocess_audio(upload_path)
+
+    prepared.samples  -> float32 array handed to Whisper (no second decode)
+    prepared.path     -> 16-bit PCM WAV of the same samples, for the aligner
+                         (Gentle receives a real audio/x-wav file)
+
+Leading and trailing silence is trimmed (frames below
+EVAL_SILENCE_THRESHOLD_DB, keeping EVAL_SILENCE_PADDING_MS around the
+speech), so word times are relative to the stored WAV. Recordings that
+cannot be decoded, contain no speech, or run longer than
+EVAL_MAX_AUDIO_SECONDS are rejected with AudioPreprocessingError before
+Whisper or the aligner are called.
+"""
+
+import os
+import uuid
+import wave
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+EVAL_MIN_SPEECH_SECONDS = float(os.getenv("EVAL_MIN_SPEECH_SECONDS", "0.3"))
+# One Whisper window, the longest clip the micro-batcher transcribes in a batch
+EVAL_MAX_AUDIO_SECONDS = float(os.getenv("EVAL_MAX_AUDIO_SECONDS", "30"))
+EVAL_SILENCE_THRESHOLD_DB = float(os.getenv("EVAL_SILENCE_THRESHOLD_DB", "-40"))
+EVAL_SILENCE_PADDING_MS = int(os.getenv("EVAL_SILENCE_PADDING_MS", "150"))
+
+# Energy is measured over 20 ms frames
+FRAME_MS = 20
+
+
+class AudioPreprocessingError(ValueError):
+    """The recording cannot be evaluated (undecodable, empty or too long)"""
+    pass
+
+
+@dataclass
+class PreparedAudio:
+    """A decoded, trimmed recording shared by every evaluation stage"""
+    samples: np.ndarray  # float32, mono, SAMPLE_RATE
+    path: str  # 16-bit PCM WAV of `samples`
+    original_duration_ms: int
+    trimmed_start_ms: int
+    sample_rate: int = SAMPLE_RATE
+
+    @property
+    def duration_ms(self) -> int:
+        return int(len(self.samples) * 1000 / self.sample_rate)
+
+
+def decode_audio(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode any container/codec PyAV understands to float32 mono samples.
+
+    Only decoding errors become AudioPreprocessingError (422); a missing
+    faster-whisper/PyAV or any other server fault propagates as a 500.
+    """
+    import av
+    from faster_whisper.audio import decode_audio as _decode
+
+    try:
+        return _decode(path, sampling_rate=sample_rate)
+    except (av.error.FFmpegError, ValueError, OSError) as e:
+        raise AudioPreprocessingError(f"Could not decode audio: {e}")
+
+
+def find_speech_bounds(
+    samples: np.ndarray,
+    sample_rate: int = SAMPLE_RATE,
+    threshold_db: float = EVAL_SILENCE_THRESHOLD_DB,
+    padding_ms: int = EVAL_SILENCE_PADDING_MS
+) -> Tuple[int, int]:
+    """
+    Sample range [start, end) that keeps everything between the first and
+    the last frame louder than `threshold_db` (dBFS), plus padding.
+    Returns (0, 0) when no frame reaches the threshold.
+    """
+    frame = sample_rate * FRAME_MS // 1000
+    frames = len(samples) // frame
+    if frames == 0:
+        return 0, 0
+
+    blocks = samples[:frames * frame].reshape(frames, frame)
+    rms = np.sqrt(np.mean(np.square(blocks, dtype=np.float64), axis=1))
+    voiced = np.flatnonzero(20 * np.log10(rms + 1e-10) > threshold_db)
+    if len(voiced) == 0:
+        return 0, 0
+
+    padding = sample_rate * padding_ms // 1000
+    start = max(int(voiced[0]) * frame - padding, 0)
+    end = min((int(voiced[-1]) + 1) * frame + padding, len(samples))
+    return start, end
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> None:
+    """Write float32 samples as 16-bit PCM WAV (atomic replace)."""
+    tmp_path = os.path.join(os.path.dirname(path) or ".", f".{os.path.basename(path)}.{uuid.uuid4().hex}.part")
+    try:
+        with wave.open(tmp_path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(sample_rate)
+            f.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def preprocess_audio(
+    source_path: str,
+    output_path: Optional[str] = None,
+    min_seconds: float = EVAL_MIN_SPEECH_SECONDS,
+    max_seconds: float = EVAL_MAX_AUDIO_SECONDS
+) -> PreparedAudio:
+    """
+    Decode, trim and validate a recording, and write the WAV the aligner reads.
+
+    Args:
+        source_path: Uploaded file, any format
+        output_path: WAV destination (default: source path with .wav);
+            may be the source itself, which is only replaced after decoding
+
+    Raises:
+        FileNotFoundError: If the source does not exist
+        AudioPreprocessingError: If the recording cannot be evaluated
+    """
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Audio file not found: {source_path}")
+
+    samples = decode_audio(source_path)
+    original_duration_ms = int(len(samples) * 1000 / SAMPLE_RATE)
+
+    start, end = find_speech_bounds(samples)
+    if end - start < min_seconds * SAMPLE_RATE:
+        raise AudioPreprocessingError("No speech detected in the recording")
+    if end - start > max_seconds * SAMPLE_RATE:
+        raise AudioPreprocessingError(
+            f"Recording too long: {(end - start) / SAMPLE_RATE:.1f}s of audio (max {max_seconds:g}s)"
+        )
+
+    # Copy so the untrimmed buffer can be freed
+    samples = samples[start:end].copy()
+    output_path = output_path or os.path.splitext(source_path)[0] + ".wav"
+    write_wav(output_path, samples)
+
+    prepared = PreparedAudio(
+        samples=samples,
+        path=output_path,
+        original_duration_ms=original_duration_ms,
+        trimmed_start_ms=int(start * 1000 / SAMPLE_RATE)
+    )
+    logger.info(
+        f"Preprocessed {source_path}: {original_duration_ms}ms -> {prepared.duration_ms}ms "
+        f"(trimmed {prepared.trimmed_start_ms}ms at the start)"
+    )
+    return prepared
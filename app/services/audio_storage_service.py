@@ -4,20 +4,39 @@ Servicio de Almacenamiento de Archivos de Audio
 
 Maneja el almacenamiento y recuperación de archivos de audio para las lecciones.
 Soporta almacenamiento local con opción de migrar a S3/MinIO en el futuro.
+
+Los archivos nuevos se guardan direccionados por contenido:
+
+    uploads/audio/blobs/ab/cd/<sha256><ext>
+
+de modo que subir dos veces el mismo audio no ocupa espacio extra. Las rutas
+siguen siendo relativas (audio/blobs/...) y se resuelven con
+get_absolute_path/get_file_info igual que las antiguas (audio/lessons/...).
+Las referencias y la recolección de basura están en audio_blob_service.
 """
 
 import os
+import re
+import uuid
+import asyncio
 import shutil
 import hashlib
 import mimetypes
 import logging
 from pathlib import Path
-from typing import Optional, Tuple, BinaryIO
+from typing import Optional, Tuple, BinaryIO, Union
 from datetime import datetime
+
+import aiofiles
 from fastapi import UploadFile
 
 logger = logging.getLogger(__name__)
 
+# Prefijo de las URLs de audio: app.main monta UPLOADS_DIR en /uploads
+PUBLIC_AUDIO_PREFIX = "uploads/audio"
+
+_BLOB_PATH_RE = re.compile(r"blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$")
+
 
 class AudioStorageError(Exception):
     """Error en operaciones de almacenamiento de audio"""
@@ -49,6 +68,9 @@ class AudioStorageService:
     # Tamaño máximo de archivo (50 MB)
     MAX_FILE_SIZE = 50 * 1024 * 1024
     
+    # Tamaño de bloque al copiar subidas a disco
+    CHUNK_SIZE = 1024 * 1024
+    
     def __init__(self, base_path: Optional[str] = None):
         """
         Inicializa el servicio de almacenamiento.
@@ -67,6 +89,7 @@ class AudioStorageService:
         self.base_path.mkdir(parents=True, exist_ok=True)
         (self.base_path / "lessons").mkdir(exist_ok=True)
         (self.base_path / "temp").mkdir(exist_ok=True)
+        (self.base_path / "blobs").mkdir(exist_ok=True)
         logger.info(f"Audio storage initialized at: {self.base_path.absolute()}")
     
     def _validate_file(self, file: UploadFile) -> str:
@@ -93,19 +116,131 @@ class AudioStorageService:
         
         return self.ALLOWED_MIME_TYPES[content_type]
     
-    def _generate_filename(self, lesson_id: int, extension: str) -> str:
+    def blob_path(self, sha256: str, extension: str) -> Path:
+        """Ruta del blob: blobs/<2 primeros hex>/<2 siguientes>/<sha256><ext>."""
+        return self.base_path / "blobs" / sha256[:2] / sha256[2:4] / f"{sha256}{extension}"
+    
+    def _relative(self, path: Path) -> str:
+        return str(path.relative_to(self.base_path.parent))
+    
+    @staticmethod
+    def parse_blob_sha256(path: str) -> Optional[str]:
+        """Devuelve el SHA-256 si la ruta es de un blob, o None si es un archivo antiguo."""
+        match = _BLOB_PATH_RE.search(str(path).replace("\\", "/"))
+        return match.group(1) if match else None
+    
+    def _store_blob(self, src_path: Path, sha256: str, extension: str, move: bool = True) -> Path:
+        """
+        Coloca un archivo ya hasheado en su ruta de blob. Si el blob ya existe
+        (mismo contenido), se descarta la copia nueva y se actualiza su mtime
+        para que el recolector de basura respete el período de gracia.
+        """
+        blob_path = self.blob_path(sha256, extension)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        if blob_path.exists():
+            os.utime(blob_path)
+            if move:
+                src_path.unlink()
+            logger.info(f"Deduplicated audio blob {sha256[:12]}")
+            return blob_path
+        
+        if move:
+            os.replace(src_path, blob_path)
+        else:
+            # Enlace duro cuando se puede (sin copiar datos); si no, copia atómica
+            try:
+                os.link(src_path, blob_path)
+            except OSError:
+                tmp_path = blob_path.with_name(f".{blob_path.name}.{uuid.uuid4().hex}.part")
+                shutil.copyfile(src_path, tmp_path)
+                os.replace(tmp_path, blob_path)
+        return blob_path
+    
+    def ingest_file(self, path: str, move: bool = True) -> Tuple[str, int, str]:
         """
-        Genera un nombre de archivo único para la lección.
+        Incorpora un archivo existente (audio antiguo, audio TTS) al almacenamiento
+        por contenido.
         
         Args:
-            lesson_id: ID de la lección
-            extension: Extensión del archivo
+            path: Ruta del archivo
+            move: Mover el archivo (True) o dejarlo en su lugar (enlace duro o copia)
         
         Returns:
-            Nombre de archivo único
+            Tuple de (ruta relativa del blob, tamaño en bytes, SHA-256)
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"lesson_{lesson_id}_{timestamp}{extension}"
+        src_path = Path(path)
+        digest = hashlib.sha256()
+        with open(src_path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        
+        file_size = src_path.stat().st_size
+        blob_path = self._store_blob(src_path, sha256, src_path.suffix.lower() or ".mp3", move=move)
+        return self._relative(blob_path), file_size, sha256
+    
+    async def stream_upload(
+        self,
+        file: UploadFile,
+        dest_path: Union[str, Path],
+        max_size: Optional[int] = None
+    ) -> Tuple[int, str]:
+        """
+        Copia una subida a disco por bloques, sin cargarla completa en memoria.
+        
+        Escribe en un archivo temporal junto al destino, valida el tamaño a
+        medida que llegan los bloques, calcula el SHA-256 al vuelo y al final
+        renombra de forma atómica; si algo falla no queda un archivo a medias.
+        
+        Args:
+            file: Archivo subido
+            dest_path: Ruta final del archivo
+            max_size: Tamaño máximo en bytes (default: MAX_FILE_SIZE)
+        
+        Returns:
+            Tuple de (tamaño en bytes, SHA-256 hexadecimal)
+        
+        Raises:
+            AudioStorageError: Si el archivo excede el tamaño máximo
+        """
+        max_size = max_size or self.MAX_FILE_SIZE
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest_path.parent / f".{dest_path.name}.{uuid.uuid4().hex}.part"
+        
+        digest = hashlib.sha256()
+        file_size = 0
+        
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = await file.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        raise AudioStorageError(
+                            f"File too large: more than {max_size / (1024*1024):.2f} MB. "
+                            f"Maximum allowed: {max_size / (1024*1024)} MB"
+                        )
+                    
+                    digest.update(chunk)
+                    await out.write(chunk)
+                
+                await out.flush()
+                await asyncio.to_thread(os.fsync, out.fileno())
+            
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise
+        
+        return file_size, digest.hexdigest()
     
     async def save_audio_file(
         self,
@@ -129,30 +264,17 @@ class AudioStorageService:
             # Validar archivo
             extension = self._validate_file(file)
             
-            # Generar nombre único
-            filename = self._generate_filename(lesson_id, extension)
-            file_path = self.base_path / "lessons" / filename
-            
-            # Leer y guardar el contenido
-            content = await file.read()
-            file_size = len(content)
+            # Copiar por bloques a temp/ validando el tamaño y calculando el hash
+            tmp_path = self.base_path / "temp" / f"upload_{uuid.uuid4().hex}{extension}"
+            file_size, sha256 = await self.stream_upload(file, tmp_path)
             
-            # Validar tamaño
-            if file_size > self.MAX_FILE_SIZE:
-                raise AudioStorageError(
-                    f"File too large: {file_size / (1024*1024):.2f} MB. "
-                    f"Maximum allowed: {self.MAX_FILE_SIZE / (1024*1024)} MB"
-                )
+            # Mover a su ruta por contenido (o descartar si ya existía)
+            blob_path = self._store_blob(tmp_path, sha256, extension)
             
-            # Guardar archivo
-            with open(file_path, 'wb') as f:
-                f.write(content)
-            
-            logger.info(f"Saved audio file: {file_path} ({file_size} bytes)")
+            logger.info(f"Saved audio for lesson {lesson_id}: {blob_path} ({file_size} bytes)")
             
             # Retornar ruta relativa al base_path
-            relative_path = str(file_path.relative_to(self.base_path.parent))
-            return relative_path, file_size
+            return self._relative(blob_path), file_size
         
         except AudioStorageError:
             raise
@@ -180,19 +302,27 @@ class AudioStorageService:
         Returns:
             Tuple de (ruta relativa, tamaño en bytes)
         """
-        filename = self._generate_filename(lesson_id, extension)
-        file_path = self.base_path / "lessons" / filename
-        
         file_size = len(content)
         
         if file_size > self.MAX_FILE_SIZE:
             raise AudioStorageError(f"File too large: {file_size} bytes")
         
-        with open(file_path, 'wb') as f:
+        sha256 = hashlib.sha256(content).hexdigest()
+        tmp_path = self.base_path / "temp" / f"upload_{uuid.uuid4().hex}{extension}"
+        with open(tmp_path, 'wb') as f:
             f.write(content)
         
-        relative_path = str(file_path.relative_to(self.base_path.parent))
-        return relative_path, file_size
+        blob_path = self._store_blob(tmp_path, sha256, extension)
+        logger.info(f"Saved audio for lesson {lesson_id}: {blob_path} ({file_size} bytes)")
+        return self._relative(blob_path), file_size
+    
+    def get_public_path(self, relative_path: str) -> str:
+        """
+        Ruta bajo el directorio uploads servido como estático (uploads/audio/...),
+        sea cual sea base_path (en Docker es absoluto: /app/uploads/audio).
+        """
+        path = (self.base_path.parent / relative_path).relative_to(self.base_path)
+        return f"{PUBLIC_AUDIO_PREFIX}/{path.as_posix()}"
     
     def get_absolute_path(self, relative_path: str) -> Path:
         """
@@ -257,7 +387,8 @@ class AudioStorageService:
             relative_path: Ruta relativa del archivo
         
         Returns:
-            Dict con información del archivo
+            Dict con información del archivo (sha256 es None en archivos
+            anteriores al almacenamiento por contenido)
         """
         abs_path = self.get_absolute_path(relative_path)
         
@@ -271,6 +402,7 @@ class AudioStorageService:
             "path": str(abs_path),
             "size": stat.st_size,
             "mime_type": mime_type,
+            "sha256": self.parse_blob_sha256(str(abs_path)),
             "created": datetime.fromtimestamp(stat.st_ctime),
             "modified": datetime.fromtimestamp(stat.st_mtime)
         }
@@ -282,12 +414,18 @@ class AudioStorageService:
         Args:
             relative_path: Ruta relativa del archivo
         
+        Los blobs pueden estar compartidos entre varias lecciones; no se borran
+        aquí sino con el recolector de basura (audio_storage.py gc).
+        
         Returns:
-            True si se eliminó, False si no existía
+            True si se eliminó, False si no existía (o es un blob)
         """
         try:
             abs_path = self.get_absolute_path(relative_path)
             
+            if self.parse_blob_sha256(str(abs_path)):
+                return False
+            
             if abs_path.exists():
                 abs_path.unlink()
                 logger.info(f"Deleted audio file: {abs_path}")
@@ -0,0 +1,309 @@
+"""
+Alineación por Fragmentos
+=========================
+
+Las grabaciones largas no se envían al alineador en una sola petición: el
+tiempo de alineación crece más que linealmente y un fallo pierde todo el
+trabajo. Para lecciones de más de ALIGN_CHUNK_MIN_SECONDS:
+
+  1. Se decodifica el audio (16 kHz mono) y se detectan los silencios.
+  2. El transcript se divide en párrafos/líneas (o frases, o palabras).
+  3. Se agrupan párrafos hasta ~ALIGN_CHUNK_TARGET_SECONDS y se corta en el
+     silencio más cercano al punto estimado (proporción de caracteres).
+  4. Cada fragmento se alinea por separado, hasta ALIGN_CHUNK_CONCURRENCY a la
+     vez, con reintentos individuales.
+  5. Los timestamps se desplazan con el inicio del fragmento y se unen en el
+     mismo formato de timestamps_json.
+
+Cada fragmento pasa por el caché de alineaciones, así que si un trabajo
+falla y la cola lo reintenta, solo se vuelven a alinear los fragmentos que
+fallaron.
+"""
+
+import os
+import re
+import wave
+import asyncio
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.aligner_service import AlignmentError, BaseAligner, get_aligner
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Por debajo de esta duración se alinea en una sola petición
+ALIGN_CHUNK_MIN_SECONDS = float(os.getenv("ALIGN_CHUNK_MIN_SECONDS", "90"))
+ALIGN_CHUNK_TARGET_SECONDS = float(os.getenv("ALIGN_CHUNK_TARGET_SECONDS", "45"))
+ALIGN_CHUNK_CONCURRENCY = int(os.getenv("ALIGN_CHUNK_CONCURRENCY", "3"))
+ALIGN_CHUNK_RETRIES = int(os.getenv("ALIGN_CHUNK_RETRIES", "2"))
+# Silencio: tramo al menos ALIGN_SILENCE_MIN_MS por debajo de ALIGN_SILENCE_DB
+# respecto al nivel de voz (percentil 95 de la energía)
+ALIGN_SILENCE_MIN_MS = int(os.getenv("ALIGN_SILENCE_MIN_MS", "300"))
+ALIGN_SILENCE_DB = float(os.getenv("ALIGN_SILENCE_DB", "30"))
+
+_FRAME_MS = 20
+_LINE_END_RE = re.compile(r"\n\s*")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_END_RE = re.compile(r"\s+")
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    start_s: float
+    end_s: float
+
+
+def split_units(transcript: str) -> List[str]:
+    """
+    Divide el transcript en unidades que terminan en salto de línea; si no
+    hay saltos, en frases; y si tampoco hay puntuación, en palabras. La
+    concatenación de las unidades (salvo el espacio inicial) reproduce el
+    transcript original.
+    """
+    text = transcript.lstrip()
+    units = _split_keep(text, _LINE_END_RE)
+    if len(units) <= 1:
+        units = _split_keep(text, _SENTENCE_END_RE)
+    if len(units) <= 1:
+        units = _split_keep(text, _WORD_END_RE)
+    return [u for u in units if u.strip()]
+
+
+def _split_keep(text: str, separator: re.Pattern) -> List[str]:
+    """Divide en el separador conservándolo al final de cada parte."""
+    parts = []
+    last = 0
+    for m in separator.finditer(text):
+        if m.end() > last:
+            parts.append(text[last:m.end()])
+            last = m.end()
+    if last < len(text):
+        parts.append(text[last:])
+    return parts
+
+
+def find_silences(samples, min_silence_ms: int = ALIGN_SILENCE_MIN_MS,
+                  threshold_db: float = ALIGN_SILENCE_DB) -> List[Tuple[float, float]]:
+    """Devuelve los silencios (inicio, fin) en segundos."""
+    import numpy as np
+
+    frame = SAMPLE_RATE * _FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+    loud = float(np.percentile(rms, 95))
+    if loud <= 0:
+        return []
+    quiet = rms < loud * (10 ** (-threshold_db / 20))
+
+    silences = []
+    min_frames = max(1, min_silence_ms // _FRAME_MS)
+    run_start = None
+    for i, is_quiet in enumerate(quiet.tolist() + [False]):
+        if is_quiet and run_start is None:
+            run_start = i
+        elif not is_quiet and run_start is not None:
+            if i - run_start >= min_frames:
+                silences.append((run_start * _FRAME_MS / 1000, i * _FRAME_MS / 1000))
+            run_start = None
+    return silences
+
+
+def plan_chunks(
+    units: List[str],
+    silences: List[Tuple[float, float]],
+    duration_s: float,
+    target_s: float = ALIGN_CHUNK_TARGET_SECONDS
+) -> List[Chunk]:
+    """
+    Agrupa unidades en fragmentos de ~target_s. Solo se corta en un límite de
+    párrafo que tenga un silencio cerca del instante estimado para ese límite;
+    si no hay silencio, el párrafo se une al fragmento actual.
+    """
+    total_chars = sum(len(u) for u in units) or 1
+    window = max(3.0, target_s * 0.15)
+
+    chunks: List[Chunk] = []
+    current: List[str] = []
+    chunk_start = 0.0
+    chars_done = 0
+
+    for i, unit in enumerate(units):
+        current.append(unit)
+        chars_done += len(unit)
+        estimate = duration_s * chars_done / total_chars
+
+        is_last = i == len(units) - 1
+        if is_last or estimate - chunk_start < target_s:
+            continue
+        if duration_s - estimate < target_s / 3:
+            continue  # no dejar un último fragmento demasiado corto
+
+        near = [s for s in silences if abs((s[0] + s[1]) / 2 - estimate) <= window and s[0] > chunk_start]
+        if not near:
+            continue
+        silence = min(near, key=lambda s: abs((s[0] + s[1]) / 2 - estimate))
+        cut = (silence[0] + silence[1]) / 2
+
+        chunks.append(Chunk(len(chunks), "".join(current), chunk_start, cut))
+        current = []
+        chunk_start = cut
+
+    if current:
+        chunks.append(Chunk(len(chunks), "".join(current), chunk_start, duration_s))
+    return chunks
+
+
+def _write_wav(path: str, samples) -> None:
+    import numpy as np
+
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+
+
+def _decode(audio_path: str):
+    from faster_whisper.audio import decode_audio
+    return decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+
+
+class ChunkedAligner:
+    """
+    Envuelve un backend de alineación (por defecto el configurado en
+    ALIGNER_BACKEND) y fragmenta las grabaciones largas.
+    """
+
+    def __init__(
+        self,
+        aligner: Optional[BaseAligner] = None,
+        min_seconds: float = ALIGN_CHUNK_MIN_SECONDS,
+        target_seconds: float = ALIGN_CHUNK_TARGET_SECONDS,
+        max_concurrency: int = ALIGN_CHUNK_CONCURRENCY,
+        retries: int = ALIGN_CHUNK_RETRIES
+    ):
+        self._aligner = aligner
+        self.min_seconds = min_seconds
+        self.target_seconds = target_seconds
+        self.max_concurrency = max(1, max_concurrency)
+        self.retries = max(0, retries)
+
+    @property
+    def aligner(self) -> BaseAligner:
+        return self._aligner or get_aligner()
+
+    async def align(self, audio_path: str, transcript: str, **options) -> Dict[str, Any]:
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        try:
+            samples = await asyncio.to_thread(_decode, audio_path)
+        except Exception as e:
+            # Sin decodificador (o audio que no se puede leer) se alinea entero
+            logger.warning(f"Could not decode {audio_path} for chunking, aligning in one request: {e}")
+            return await self.aligner.align(audio_path, transcript, **options)
+
+        duration_s = len(samples) / SAMPLE_RATE
+        if duration_s < self.min_seconds:
+            return await self.aligner.align(audio_path, transcript, **options)
+
+        units = split_units(transcript)
+        silences = await asyncio.to_thread(find_silences, samples)
+        chunks = plan_chunks(units, silences, duration_s, self.target_seconds)
+
+        if len(chunks) <= 1:
+            return await self.aligner.align(audio_path, transcript, **options)
+
+        logger.info(
+            f"Aligning {audio_path} ({duration_s:.0f}s) in {len(chunks)} chunks "
+            f"with concurrency {self.max_concurrency}"
+        )
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        with tempfile.TemporaryDirectory(prefix="align_chunks_") as tmp_dir:
+            results = await asyncio.gather(
+                *(self._align_chunk(c, samples, tmp_dir, semaphore, options) for c in chunks),
+                return_exceptions=True
+            )
+
+        failed = [(c, r) for c, r in zip(chunks, results) if isinstance(r, BaseException)]
+        if failed:
+            details = "; ".join(f"chunk {c.index}: {r}" for c, r in failed)
+            raise AlignmentError(f"{len(failed)}/{len(chunks)} chunks failed to align: {details}")
+
+        return self._stitch(chunks, results)
+
+    async def _align_chunk(
+        self,
+        chunk: Chunk,
+        samples,
+        tmp_dir: str,
+        semaphore: asyncio.Semaphore,
+        options: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        from app.services.gentle_service import GentleUnavailableError
+
+        chunk_path = os.path.join(tmp_dir, f"chunk_{chunk.index:03d}.wav")
+        start = int(chunk.start_s * SAMPLE_RATE)
+        end = int(chunk.end_s * SAMPLE_RATE)
+        await asyncio.to_thread(_write_wav, chunk_path, samples[start:end])
+
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    return await self.aligner.align(chunk_path, chunk.text, **options)
+            except GentleUnavailableError:
+                raise  # circuito abierto: reintentar ahora no sirve
+            except AlignmentError as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                logger.warning(f"Chunk {chunk.index} failed (attempt {attempt}), retrying: {e}")
+                await asyncio.sleep(2 ** (attempt - 1))
+
+    def _stitch(self, chunks: List[Chunk], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        words = []
+        duration_ms = 0
+        aligned_words = 0
+        transcripts = []
+
+        for chunk, result in zip(chunks, results):
+            offset_ms = int(chunk.start_s * 1000)
+            for w in result["words"]:
+                words.append({
+                    **w,
+                    "start": w["start"] + offset_ms,
+                    "end": w["end"] + offset_ms
+                })
+            if result["words"]:
+                duration_ms = max(duration_ms, words[-1]["end"])
+            if result.get("duration_ms"):
+                duration_ms = max(duration_ms, result["duration_ms"] + offset_ms)
+            aligned_words += result.get("aligned_words", 0)
+            transcripts.append(result.get("transcript", ""))
+
+        return {
+            "words": words,
+            "duration_ms": duration_ms,
+            "transcript": " ".join(t for t in transcripts if t),
+            "success_rate": aligned_words / len(words) if words else 0,
+            "total_words": len(words),
+            "aligned_words": aligned_words,
+            "chunks": len(chunks)
+        }
+
+
+# Instancia global (usa el backend configurado)
+chunked_aligner = ChunkedAligner()
@@ -11,37 +11,147 @@ Docker: docker run -p 8765:8765 lowerquality/gentle
 
 import os
 import json
+import time
 import logging
+import mimetypes
 import aiohttp
 import asyncio
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 
+from app.services.alignment_cache import alignment_cache, hash_file, make_key
+from app.services.aligner_service import AlignmentError, BaseAligner
+
 logger = logging.getLogger(__name__)
 
+# Alineaciones simultáneas contra Gentle (es intensivo en CPU)
+GENTLE_MAX_CONCURRENCY = int(os.getenv("GENTLE_MAX_CONCURRENCY", "2"))
+# Fallos consecutivos que abren el circuito y segundos que permanece abierto
+GENTLE_CIRCUIT_FAILURES = int(os.getenv("GENTLE_CIRCUIT_FAILURES", "5"))
+GENTLE_CIRCUIT_RESET_SECONDS = float(os.getenv("GENTLE_CIRCUIT_RESET_SECONDS", "30"))
+
 
-class GentleAlignmentError(Exception):
+class GentleAlignmentError(AlignmentError):
     """Error durante el proceso de alineación con Gentle"""
     pass
 
 
-class GentleService:
+class GentleUnavailableError(GentleAlignmentError):
+    """Gentle no está disponible (circuito abierto); no se intentó la petición"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simple: tras `failure_threshold` fallos consecutivos deja
+    de enviar peticiones durante `reset_timeout` segundos; luego permite una
+    petición de prueba (semiabierto) y se cierra si tiene éxito.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+    
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+    
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+    
+    def release_probe(self) -> None:
+        """
+        Libera la petición de prueba que terminó sin resultado de Gentle
+        (cancelada o con un error local), para que la siguiente pueda probar.
+        """
+        self._probing = False
+    
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.error(f"Gentle circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+class GentleService(BaseAligner):
     """
     Servicio para realizar alineación forzada de audio con texto usando Gentle.
     
     Gentle produce timestamps muy precisos (~10-20ms) cuando se le proporciona
     tanto el audio como el texto correspondiente.
+    
+    Usa una sola sesión HTTP (pool de conexiones keep-alive) por event loop,
+    limita las alineaciones simultáneas con un semáforo y corta las peticiones
+    con un circuit breaker cuando Gentle falla repetidamente.
     """
     
-    def __init__(self, gentle_url: Optional[str] = None):
+    name = "gentle"
+    
+    def __init__(
+        self,
+        gentle_url: Optional[str] = None,
+        max_concurrency: int = GENTLE_MAX_CONCURRENCY
+    ):
         """
         Inicializa el servicio de Gentle.
         
         Args:
             gentle_url: URL del servicio Gentle (default: http://localhost:8765)
+            max_concurrency: Alineaciones simultáneas permitidas
         """
         self.gentle_url = gentle_url or os.getenv("GENTLE_URL", "http://localhost:8765")
         self.timeout = aiohttp.ClientTimeout(total=300)  # 5 minutos máximo
+        self.max_concurrency = max(1, max_concurrency)
+        self.breaker = CircuitBreaker(GENTLE_CIRCUIT_FAILURES, GENTLE_CIRCUIT_RESET_SECONDS)
+        
+        # La sesión y el semáforo pertenecen al event loop que los creó
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency + 2,  # margen para health checks
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._session
+    
+    async def close(self) -> None:
+        """Cierra la sesión HTTP (al apagar la aplicación o el worker)."""
+        if self._session and not self._session.closed and self._loop is asyncio.get_running_loop():
+            await self._session.close()
+        self._session = None
+        self._semaphore = None
+        self._loop = None
     
     async def check_health(self) -> bool:
         """
@@ -51,12 +161,23 @@ class GentleService:
             True si está disponible, False en caso contrario
         """
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                async with session.get(f"{self.gentle_url}/") as response:
-                    return response.status == 200
+            session = self._get_session()
+            async with session.get(
+                f"{self.gentle_url}/", timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                healthy = response.status == 200
         except Exception as e:
             logger.warning(f"Gentle service not available: {e}")
             return False
+        
+        if healthy:
+            self.breaker.record_success()
+        return healthy
+    
+    async def align(self, audio_path: str, transcript: str, **options) -> Dict[str, Any]:
+        return await self.align_audio_with_transcript(
+            audio_path, transcript, conservative=options.get("conservative", False)
+        )
     
     async def align_audio_with_transcript(
         self,
@@ -66,6 +187,13 @@ class GentleService:
     ) -> Dict[str, Any]:
         """
         Realiza la alineación forzada de un archivo de audio con su transcripción.
+        
+        El audio se envía como multipart leyendo el archivo por bloques, sin
+        cargarlo completo en memoria.
+        
+        Raises:
+            GentleUnavailableError: Si el circuito está abierto
+            GentleAlignmentError: Si Gentle falla o responde con error
         """
         # Validar que el archivo existe
         if not os.path.exists(audio_path):
@@ -75,50 +203,79 @@ class GentleService:
         if not transcript or not transcript.strip():
             raise GentleAlignmentError("Transcript cannot be empty")
         
+        # Consultar el caché antes de ir a la red
+        cache_key = None
+        if alignment_cache.enabled:
+            audio_sha256 = await asyncio.to_thread(hash_file, audio_path)
+            cache_key = make_key(audio_sha256, transcript, {"aligner": "gentle", "conservative": conservative})
+            cached = await asyncio.to_thread(alignment_cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Alignment cache hit for: {audio_path}")
+                return self._process_gentle_response(cached, transcript)
+        
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if not self.breaker.allow_request():
+            raise GentleUnavailableError(
+                f"Gentle circuit is open after {self.breaker.failures} consecutive failures"
+            )
+        
         logger.info(f"Starting alignment for: {audio_path}")
         logger.debug(f"Transcript length: {len(transcript)} characters")
         
+        url = f"{self.gentle_url}/transcriptions?async=false"
+        if conservative:
+            url += "&conservative=true"
+        
+        content_type = mimetypes.guess_type(audio_path)[0] or 'audio/mpeg'
+        
         try:
-            async with aiohttp.ClientSession(timeout=self.timeout) as session:
-                # Preparar el form data
-                data = aiohttp.FormData()
-                
-                # Agregar el archivo de audio
+            session = self._get_session()
+            async with self._semaphore:
                 with open(audio_path, 'rb') as audio_file:
+                    data = aiohttp.FormData()
                     data.add_field(
                         'audio',
-                        audio_file.read(),
+                        audio_file,
                         filename=os.path.basename(audio_path),
-                        content_type='audio/mpeg'
+                        content_type=content_type
                     )
-                
-                # Agregar la transcripción
-                data.add_field('transcript', transcript)
-                
-                # Hacer la petición a Gentle
-                url = f"{self.gentle_url}/transcriptions?async=false"
-                if conservative:
-                    url += "&conservative=true"
-                
-                # Use retry logic for connection
-                async with session.post(url, data=data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise GentleAlignmentError(
-                            f"Gentle returned status {response.status}: {error_text}"
-                        )
+                    data.add_field('transcript', transcript)
                     
-                    result = await response.json()
-            
-            # Procesar el resultado usando el transcript original para preservar formato
-            return self._process_gentle_response(result, transcript)
+                    async with session.post(url, data=data) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            # Un 4xx indica que Gentle responde; solo los 5xx abren el circuito
+                            if response.status >= 500:
+                                self.breaker.record_failure()
+                            else:
+                                self.breaker.record_success()
+                            raise GentleAlignmentError(
+                                f"Gentle returned status {response.status}: {error_text}"
+                            )
+                        
+                        result = await response.json()
         
         except aiohttp.ClientError as e:
+            self.breaker.record_failure()
             raise GentleAlignmentError(f"Connection error with Gentle: {e}")
         except asyncio.TimeoutError:
+            self.breaker.record_failure()
             raise GentleAlignmentError("Timeout waiting for Gentle alignment")
         except json.JSONDecodeError as e:
             raise GentleAlignmentError(f"Invalid JSON response from Gentle: {e}")
+        finally:
+            # Cancelación (EVAL_ALIGN_TIMEOUT, cliente desconectado) o error local:
+            # sin esto el circuito quedaría semiabierto con la prueba tomada para siempre
+            if probe:
+                self.breaker.release_probe()
+        
+        self.breaker.record_success()
+        
+        if cache_key:
+            await asyncio.to_thread(alignment_cache.put, cache_key, result)
+        
+        # Procesar el resultado usando el transcript original para preservar formato
+        return self._process_gentle_response(result, transcript)
     
     def _process_gentle_response(self, response: Dict[str, Any], original_transcript: str = "") -> Dict[str, Any]:
         """
@@ -235,32 +392,6 @@ class GentleService:
         # Helper antiguo mantenido por compatibilidad si se necesita
         pass
 
-    async def align_with_retry(
-        self,
-        audio_path: str,
-        transcript: str,
-        max_retries: int = 3,
-        delay_seconds: float = 2.0
-    ) -> Dict[str, Any]:
-        """
-        Realiza alineación con reintentos automáticos en caso de fallo.
-        """
-        last_error = None
-        
-        for attempt in range(max_retries):
-            try:
-                return await self.align_audio_with_transcript(audio_path, transcript)
-            except GentleAlignmentError as e:
-                last_error = e
-                logger.warning(f"Alignment attempt {attempt + 1}/{max_retries} failed: {e}")
-                
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(delay_seconds)
-        
-        raise GentleAlignmentError(
-            f"All {max_retries} alignment attempts failed. Last error: {last_error}"
-        )
-
 
 # Instancia global del servicio
 gentle_service = GentleService()
@@ -0,0 +1,295 @@
+"""
+Paquetes Offline por Módulo
+===========================
+
+Empaqueta en un solo .zip todas las lecciones de un módulo para que la app
+Android las descargue de una vez:
+
+    manifest.json                       metadatos del módulo y de cada lección
+    lessons/<id>/audio.<ext>            audio (sin recomprimir)
+    lessons/<id>/timestamps.json        timestamps en formato compacto (timestamps_codec)
+
+Cada lección tiene un content_hash (audio + timestamps + textos); el hash del
+paquete sale de los hashes de sus lecciones. El .zip se guarda en
+LESSON_BUNDLE_DIR y solo se reconstruye cuando ese hash cambia.
+
+Sincronización: el manifiesto devuelve un sync_token (el hash del paquete).
+Con ?since=<token> se compara contra el manifiesto guardado de ese token y
+solo se listan las lecciones nuevas o cambiadas y las eliminadas. Si el token
+es desconocido (muy antiguo o de otro servidor) se responde con full_sync=True.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.models import AudioLesson, Modulo
+from app.services import timestamps_codec
+from app.services.alignment_cache import hash_file
+from app.services.audio_storage_service import audio_storage_service
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = Path(os.getenv("LESSON_BUNDLE_DIR", "uploads/cache/bundles"))
+# Manifiestos anteriores que se conservan por módulo para responder a ?since=
+MANIFEST_HISTORY = int(os.getenv("LESSON_BUNDLE_HISTORY", "20"))
+# Un paquete reemplazado se borra pasado este tiempo: una descarga en curso
+# puede tener su ruta (get_bundle) y abrir el archivo después
+SUPERSEDED_GRACE_SECONDS = float(os.getenv("LESSON_BUNDLE_GRACE_SECONDS", "300"))
+
+BUNDLE_FORMAT_VERSION = 1
+
+
+class LessonBundleError(Exception):
+    """Error al construir o leer un paquete de lecciones"""
+    pass
+
+
+class LessonBundleService:
+
+    def __init__(self, bundle_dir: Path = BUNDLE_DIR):
+        self.bundle_dir = bundle_dir
+        self.bundle_dir.mkdir(parents=True, exist_ok=True)
+        (self.bundle_dir / "manifests").mkdir(exist_ok=True)
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        # ruta -> (tamaño, mtime, sha256) de audios antiguos (los blobs lo llevan en la ruta);
+        # una entrada por archivo: al cambiar el archivo se reemplaza la anterior
+        self._audio_hashes: Dict[str, Tuple[int, float, str]] = {}
+        # paquete reemplazado -> momento en que se vio reemplazado por primera vez
+        self._superseded: Dict[Path, float] = {}
+
+    # ==================== Hashes ====================
+
+    def _audio_sha256(self, audio_url: str) -> Tuple[Path, str]:
+        sha256 = audio_storage_service.parse_blob_sha256(audio_url)
+        path = audio_storage_service.get_absolute_path(audio_url)
+        if sha256:
+            return path, sha256
+        st = path.stat()
+        cached = self._audio_hashes.get(str(path))
+        if cached and cached[:2] == (st.st_size, st.st_mtime):
+            return path, cached[2]
+        sha256 = hash_file(str(path))
+        self._audio_hashes[str(path)] = (st.st_size, st.st_mtime, sha256)
+        return path, sha256
+
+    def _lesson_entry(self, lesson: AudioLesson) -> Optional[Dict[str, Any]]:
+        """Metadatos y content_hash de una lección, o None si su audio no está disponible."""
+        try:
+            audio_path, audio_sha = self._audio_sha256(lesson.audio_url)
+            audio_size = audio_path.stat().st_size
+        except OSError:
+            logger.warning(f"Lesson {lesson.id}: audio not found, left out of the bundle")
+            return None
+
+        timestamps_sha = hashlib.sha256(
+            lesson.timestamps_json.encode("utf-8")
+        ).hexdigest() if lesson.timestamps_json else None
+
+        content = json.dumps([
+            audio_sha, timestamps_sha, lesson.titulo, lesson.descripcion,
+            lesson.transcript_text, lesson.orden, lesson.audio_duration_ms
+        ], ensure_ascii=False)
+
+        return {
+            "id": lesson.id,
+            "titulo": lesson.titulo,
+            "descripcion": lesson.descripcion,
+            "orden": lesson.orden or 0,
+            "audio_duration_ms": lesson.audio_duration_ms,
+            "transcript_text": lesson.transcript_text,
+            "content_hash": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            "audio_sha256": audio_sha,
+            "audio_size": audio_size,
+            "audio_file": f"lessons/{lesson.id}/audio{audio_path.suffix.lower() or '.mp3'}",
+            "timestamps_file": f"lessons/{lesson.id}/timestamps.json" if lesson.timestamps_json else None,
+            # Para descargar solo esta lección (sincronización incremental)
+            "audio_url": f"/api/v1/audio-lessons/{lesson.id}/stream",
+            "timestamps_url": f"/api/v1/audio-lessons/{lesson.id}/timestamps" if lesson.timestamps_json else None,
+            "_audio_path": str(audio_path),
+        }
+
+    def build_manifest(self, db: Session, modulo_id: int) -> Dict[str, Any]:
+        """
+        Manifiesto actual del módulo (sin construir el paquete).
+
+        Raises:
+            LookupError: si el módulo no existe
+        """
+        modulo = db.query(Modulo).filter(Modulo.id == modulo_id).first()
+        if not modulo:
+            raise LookupError(f"Module {modulo_id} not found")
+
+        lessons = (
+            db.query(AudioLesson)
+            .filter(
+                AudioLesson.modulo_id == modulo_id,
+                AudioLesson.activo == True,
+                AudioLesson.audio_url.isnot(None)
+            )
+            .order_by(AudioLesson.orden, AudioLesson.id)
+            .all()
+        )
+
+        entries = [e for e in (self._lesson_entry(l) for l in lessons) if e]
+        bundle_hash = hashlib.sha256(
+            "\n".join(f"{e['id']}:{e['content_hash']}" for e in entries).encode("utf-8")
+        ).hexdigest()
+
+        return {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "modulo_id": modulo.id,
+            "modulo_nombre": modulo.nombre,
+            "sync_token": bundle_hash[:32],
+            "lessons": entries,
+            "_lessons": lessons,
+        }
+
+    # ==================== Paquete ====================
+
+    def bundle_path(self, modulo_id: int, sync_token: str) -> Path:
+        return self.bundle_dir / f"modulo_{modulo_id}_{sync_token}.zip"
+
+    def _manifest_path(self, modulo_id: int, sync_token: str) -> Path:
+        return self.bundle_dir / "manifests" / f"modulo_{modulo_id}_{sync_token}.json"
+
+    def _module_lock(self, modulo_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(modulo_id, threading.Lock())
+
+    @staticmethod
+    def _public(manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Manifiesto sin los campos internos (los que empiezan con _)."""
+        result = {k: v for k, v in manifest.items() if not k.startswith("_")}
+        result["lessons"] = [
+            {k: v for k, v in e.items() if not k.startswith("_")} for e in manifest["lessons"]
+        ]
+        return result
+
+    def get_bundle(self, db: Session, modulo_id: int) -> Tuple[Path, Dict[str, Any]]:
+        """
+        Ruta del .zip del módulo, construyéndolo solo si el contenido cambió.
+
+        Returns:
+            (ruta del paquete, manifiesto público)
+        """
+        manifest = self.build_manifest(db, modulo_id)
+        token = manifest["sync_token"]
+        path = self.bundle_path(modulo_id, token)
+
+        with self._module_lock(modulo_id):
+            if not path.exists():
+                self._write_bundle(path, manifest)
+            self._remove_old_bundles(modulo_id, keep=path)
+            self._save_manifest(manifest)
+
+        return path, self._public(manifest)
+
+    def _write_bundle(self, path: Path, manifest: Dict[str, Any]) -> None:
+        lessons_by_id = {l.id: l for l in manifest["_lessons"]}
+        public = self._public(manifest)
+        public["built_at"] = datetime.utcnow().isoformat()
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+
+        try:
+            with zipfile.ZipFile(tmp_path, "w") as archive:
+                for entry in manifest["lessons"]:
+                    # El audio ya está comprimido: se guarda sin deflate
+                    archive.write(entry["_audio_path"], entry["audio_file"], compress_type=zipfile.ZIP_STORED)
+                    lesson = lessons_by_id[entry["id"]]
+                    if entry["timestamps_file"]:
+                        packed = timestamps_codec.dumps_packed(json.loads(lesson.timestamps_json))
+                        archive.writestr(entry["timestamps_file"], packed, compress_type=zipfile.ZIP_DEFLATED)
+                archive.writestr(
+                    "manifest.json",
+                    json.dumps(public, ensure_ascii=False, indent=1),
+                    compress_type=zipfile.ZIP_DEFLATED
+                )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            raise LessonBundleError(f"Error building bundle for module {manifest['modulo_id']}: {e}")
+
+        logger.info(
+            f"Built bundle for module {manifest['modulo_id']}: "
+            f"{len(manifest['lessons'])} lessons, {path.stat().st_size / 1024:.0f} KB"
+        )
+
+    def _remove_old_bundles(self, modulo_id: int, keep: Path) -> None:
+        """Borra los paquetes reemplazados cuando ya pasó SUPERSEDED_GRACE_SECONDS."""
+        now = time.monotonic()
+        for old in self.bundle_dir.glob(f"modulo_{modulo_id}_*.zip"):
+            if old == keep:
+                continue
+            since = self._superseded.setdefault(old, now)
+            if now - since >= SUPERSEDED_GRACE_SECONDS:
+                old.unlink(missing_ok=True)
+                self._superseded.pop(old, None)
+
+    # ==================== Sincronización ====================
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> None:
+        path = self._manifest_path(manifest["modulo_id"], manifest["sync_token"])
+        if path.exists():
+            os.utime(path)
+            return
+        hashes = {str(e["id"]): e["content_hash"] for e in manifest["lessons"]}
+        path.write_text(json.dumps(hashes))
+
+        history = sorted(
+            path.parent.glob(f"modulo_{manifest['modulo_id']}_*.json"),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True
+        )
+        for old in history[MANIFEST_HISTORY:]:
+            old.unlink(missing_ok=True)
+
+    def _load_manifest_hashes(self, modulo_id: int, sync_token: str) -> Optional[Dict[str, str]]:
+        if not sync_token.isalnum():
+            return None
+        path = self._manifest_path(modulo_id, sync_token)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def get_manifest(self, db: Session, modulo_id: int, since: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Manifiesto del módulo. Con `since` (sync_token de una sincronización
+        anterior) solo incluye las lecciones nuevas o cambiadas y lista las eliminadas.
+        """
+        manifest = self.build_manifest(db, modulo_id)
+        with self._module_lock(modulo_id):
+            self._save_manifest(manifest)
+        public = self._public(manifest)
+        public["full_sync"] = True
+        public["removed_lessons"] = []
+
+        if since and since != public["sync_token"]:
+            previous = self._load_manifest_hashes(modulo_id, since)
+            if previous is not None:
+                current_ids = {str(e["id"]) for e in public["lessons"]}
+                public["lessons"] = [
+                    e for e in public["lessons"] if previous.get(str(e["id"])) != e["content_hash"]
+                ]
+                public["removed_lessons"] = sorted(int(i) for i in previous.keys() - current_ids)
+                public["full_sync"] = False
+        elif since:
+            public["lessons"] = []
+            public["full_sync"] = False
+
+        return public
+
+
+# Instancia global del servicio
+lesson_bundle_service = LessonBundleService()
@@ -0,0 +1,434 @@
+"""
+Importación masiva del catálogo de biblioteca
+=============================================
+
+Carga libros desde CSV o JSON-lines en streaming, sin una petición HTTP por libro.
+
+- Autor, Editorial y GeneroLiterario se resuelven por clave natural con mapas
+  en memoria (se crean solo los que no existen, una vez por archivo).
+- Libro y LibroAutor se insertan en lotes con INSERT ... VALUES múltiples.
+- Los errores se reportan por fila; una fila inválida no aborta su lote.
+
+Formato CSV (cabecera obligatoria):
+    isbn,titulo,subtitulo,genero,editorial,editorial_pais,autores,anio_publicacion,
+    numero_paginas,idioma,cantidad_total,ubicacion_fisica,descripcion
+
+    `autores` separa autores con ";" y cada autor como "Apellidos, Nombres".
+
+Formato JSON-lines: un objeto por línea con las mismas claves; `autores` puede
+ser la misma cadena o una lista de {"nombres": ..., "apellidos": ...}.
+"""
+
+import codecs
+import csv
+import json
+import logging
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.models import GeneroLiterario, Editorial, Autor, Libro, LibroAutor
+from app.services import reference_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _clave(valor: Optional[str]) -> str:
+    """Clave natural normalizada (sin espacios extra, minúsculas)"""
+    return " ".join((valor or "").split()).lower()
+
+
+def _limpiar(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _entero(valor: Any, campo: str) -> Optional[int]:
+    valor = _limpiar(valor)
+    if valor is None:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"'{campo}' debe ser un número entero")
+
+
+def _parse_autores(valor: Any) -> List[Tuple[str, str]]:
+    """Devuelve [(nombres, apellidos), ...] preservando el orden"""
+    if not valor:
+        return []
+
+    autores = []
+    if isinstance(valor, list):
+        for item in valor:
+            if isinstance(item, dict):
+                nombres = _limpiar(item.get("nombres"))
+                apellidos = _limpiar(item.get("apellidos"))
+                if not nombres or not apellidos:
+                    raise ValueError("Cada autor requiere 'nombres' y 'apellidos'")
+                autores.append((nombres, apellidos))
+            else:
+                autores.extend(_parse_autores(str(item)))
+        return autores
+
+    for parte in str(valor).split(";"):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if "," not in parte:
+            raise ValueError(f"Autor '{parte}' debe tener el formato 'Apellidos, Nombres'")
+        apellidos, nombres = [p.strip() for p in parte.split(",", 1)]
+        if not nombres or not apellidos:
+            raise ValueError(f"Autor '{parte}' debe tener el formato 'Apellidos, Nombres'")
+        autores.append((nombres, apellidos))
+    return autores
+
+
+def decodificar_lineas(stream: BinaryIO, encoding: str = "utf-8-sig") -> Iterator[str]:
+    """
+    Decodifica un archivo binario línea por línea. Un byte inválido lanza
+    UnicodeDecodeError en su propia línea, después de entregar las anteriores
+    (TextIOWrapper decodifica por bloques y fallaría antes de llegar a ellas).
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for raw in stream:
+        yield decoder.decode(raw)
+    resto = decoder.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+def iter_csv(stream: Iterable[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Itera (nro_línea, fila) de un CSV sin cargar el archivo completo en memoria.
+    El número es la línea física donde termina la fila (las líneas vacías cuentan).
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_jsonl(stream: Iterable[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Itera (nro_línea, objeto) de un archivo JSON-lines (líneas vacías se ignoran)"""
+    for nro_linea, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            # Se reporta como error de fila sin detener la importación
+            yield nro_linea, {"__error__": f"JSON inválido: {e.msg}"}
+            continue
+        yield nro_linea, obj if isinstance(obj, dict) else {"__error__": "Cada línea debe ser un objeto JSON"}
+
+
+def iter_rows(stream: Iterable[str], formato: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    formato = (formato or "").lower()
+    if formato == "csv":
+        return iter_csv(stream)
+    if formato in ("jsonl", "ndjson", "json"):
+        return iter_jsonl(stream)
+    raise ValueError(f"Formato no soportado: {formato}. Use 'csv' o 'jsonl'")
+
+
+def detectar_formato(filename: Optional[str]) -> str:
+    nombre = (filename or "").lower()
+    if nombre.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+class LibraryImportService:
+    """
+    Importador por lotes del catálogo. Mantiene los mapas de dedup para toda la
+    importación, de modo que un autor repetido en miles de filas se resuelve
+    con una sola consulta inicial.
+    """
+
+    def __init__(self, db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.generos: Dict[str, int] = {}
+        self.editoriales: Dict[str, int] = {}
+        self.autores: Dict[Tuple[str, str], int] = {}
+        self.isbns_vistos: set = set()
+        self.reporte = {
+            "total_filas": 0,
+            "libros_creados": 0,
+            "generos_creados": 0,
+            "editoriales_creadas": 0,
+            "autores_creados": 0,
+            "errores": [],
+            # ISBN confirmados en la base, para saber qué quedó importado si se interrumpe
+            "isbns_creados": [],
+            "error_fatal": None
+        }
+
+    # ==================== Mapas de dedup ====================
+
+    def _cargar_mapas(self) -> None:
+        for id_, nombre in self.db.query(GeneroLiterario.id, GeneroLiterario.nombre):
+            self.generos.setdefault(_clave(nombre), id_)
+        for id_, nombre in self.db.query(Editorial.id, Editorial.nombre):
+            self.editoriales.setdefault(_clave(nombre), id_)
+        for id_, nombres, apellidos in self.db.query(Autor.id, Autor.nombres, Autor.apellidos):
+            self.autores.setdefault((_clave(nombres), _clave(apellidos)), id_)
+
+    def _resolver_catalogos(self, filas: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Crea en bloque los géneros, editoriales y autores que falten para el lote.
+        Devuelve cuántos se crearon, para sumarlos al reporte tras el commit.
+        """
+        nuevos_generos: Dict[str, GeneroLiterario] = {}
+        nuevas_editoriales: Dict[str, Editorial] = {}
+        nuevos_autores: Dict[Tuple[str, str], Autor] = {}
+
+        for fila in filas:
+            clave = _clave(fila["genero"])
+            if clave not in self.generos and clave not in nuevos_generos:
+                nuevos_generos[clave] = GeneroLiterario(nombre=fila["genero"])
+
+            clave = _clave(fila["editorial"])
+            if clave not in self.editoriales and clave not in nuevas_editoriales:
+                nuevas_editoriales[clave] = Editorial(nombre=fila["editorial"], pais=fila["editorial_pais"])
+
+            for nombres, apellidos in fila["autores"]:
+                clave = (_clave(nombres), _clave(apellidos))
+                if clave not in self.autores and clave not in nuevos_autores:
+                    nuevos_autores[clave] = Autor(nombres=nombres, apellidos=apellidos)
+
+        creados = {
+            "generos_creados": len(nuevos_generos),
+            "editoriales_creadas": len(nuevas_editoriales),
+            "autores_creados": len(nuevos_autores)
+        }
+        if not (nuevos_generos or nuevas_editoriales or nuevos_autores):
+            return creados
+
+        self.db.add_all(list(nuevos_generos.values()))
+        self.db.add_all(list(nuevas_editoriales.values()))
+        self.db.add_all(list(nuevos_autores.values()))
+        self.db.flush()
+
+        for clave, obj in nuevos_generos.items():
+            self.generos[clave] = obj.id
+        for clave, obj in nuevas_editoriales.items():
+            self.editoriales[clave] = obj.id
+        for clave, obj in nuevos_autores.items():
+            self.autores[clave] = obj.id
+
+        # Invalida las listas cacheadas; si el savepoint falla se revierte junto con los datos
+        namespaces = [ns for ns, nuevos in (
+            (reference_cache.GENEROS, nuevos_generos),
+            (reference_cache.EDITORIALES, nuevas_editoriales),
+            (reference_cache.AUTORES, nuevos_autores),
+        ) if nuevos]
+        reference_cache.bump_version(self.db, *namespaces)
+
+        return creados
+
+    # ==================== Validación ====================
+
+    def _validar(self, nro_fila: int, raw: Dict[str, Any]) -> Dict[str, Any]:
+        if "__error__" in raw:
+            raise ValueError(raw["__error__"])
+
+        isbn = _limpiar(raw.get("isbn"))
+        titulo = _limpiar(raw.get("titulo"))
+        genero = _limpiar(raw.get("genero"))
+        editorial = _limpiar(raw.get("editorial"))
+
+        faltantes = [c for c, v in (("isbn", isbn), ("titulo", titulo), ("genero", genero), ("editorial", editorial)) if not v]
+        if faltantes:
+            raise ValueError(f"Campos obligatorios vacíos: {', '.join(faltantes)}")
+        if len(isbn) > 20:
+            raise ValueError("ISBN demasiado largo (máx. 20 caracteres)")
+        if isbn in self.isbns_vistos:
+            raise ValueError(f"ISBN {isbn} duplicado en el archivo")
+
+        cantidad_total = _entero(raw.get("cantidad_total"), "cantidad_total") or 1
+        if cantidad_total < 1:
+            raise ValueError("'cantidad_total' debe ser mayor a 0")
+
+        return {
+            "nro_fila": nro_fila,
+            "isbn": isbn,
+            "titulo": titulo,
+            "subtitulo": _limpiar(raw.get("subtitulo")),
+            "genero": genero,
+            "editorial": editorial,
+            "editorial_pais": _limpiar(raw.get("editorial_pais")),
+            "autores": _parse_autores(raw.get("autores")),
+            "anio_publicacion": _entero(raw.get("anio_publicacion"), "anio_publicacion"),
+            "numero_paginas": _entero(raw.get("numero_paginas"), "numero_paginas"),
+            "idioma": _limpiar(raw.get("idioma")) or "Español",
+            "cantidad_total": cantidad_total,
+            "ubicacion_fisica": _limpiar(raw.get("ubicacion_fisica")),
+            "descripcion": _limpiar(raw.get("descripcion")),
+        }
+
+    def _error(self, nro_fila: int, isbn: Optional[str], mensaje: str) -> None:
+        self.reporte["errores"].append({"fila": nro_fila, "isbn": isbn, "error": mensaje})
+
+    # ==================== Inserción por lotes ====================
+
+    def _libro_values(self, fila: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "isbn": fila["isbn"],
+            "titulo": fila["titulo"],
+            "subtitulo": fila["subtitulo"],
+            "genero_id": self.generos[_clave(fila["genero"])],
+            "editorial_id": self.editoriales[_clave(fila["editorial"])],
+            "anio_publicacion": fila["anio_publicacion"],
+            "numero_paginas": fila["numero_paginas"],
+            "idioma": fila["idioma"],
+            "cantidad_total": fila["cantidad_total"],
+            "cantidad_disponible": fila["cantidad_total"],
+            "ubicacion_fisica": fila["ubicacion_fisica"],
+            "descripcion": fila["descripcion"],
+            "estado": "DISPONIBLE",
+        }
+
+    def _insertar_libros(self, filas: List[Dict[str, Any]]) -> None:
+        """INSERT múltiple de libros + autores; devuelve vía RETURNING los ids por ISBN"""
+        result = self.db.execute(
+            insert(Libro).returning(Libro.id, Libro.isbn),
+            [self._libro_values(f) for f in filas]
+        )
+        ids_por_isbn = {isbn: id_ for id_, isbn in result}
+
+        libro_autores = []
+        for fila in filas:
+            libro_id = ids_por_isbn[fila["isbn"]]
+            for orden, (nombres, apellidos) in enumerate(fila["autores"], start=1):
+                libro_autores.append({
+                    "libro_id": libro_id,
+                    "autor_id": self.autores[(_clave(nombres), _clave(apellidos))],
+                    "orden": orden
+                })
+        if libro_autores:
+            self.db.execute(insert(LibroAutor), libro_autores)
+
+    def _procesar_lote(self, lote: List[Dict[str, Any]]) -> None:
+        if not lote:
+            return
+
+        # ISBN ya registrados en la base (una consulta por lote)
+        existentes = {
+            isbn for (isbn,) in self.db.query(Libro.isbn).filter(
+                Libro.isbn.in_([f["isbn"] for f in lote])
+            )
+        }
+        filas = []
+        for fila in lote:
+            if fila["isbn"] in existentes:
+                self._error(fila["nro_fila"], fila["isbn"], "El ISBN ya existe en el catálogo")
+            else:
+                filas.append(fila)
+        if not filas:
+            return
+
+        try:
+            with self.db.begin_nested():
+                creados = self._resolver_catalogos(filas)
+                self._insertar_libros(filas)
+            self.db.commit()
+            self._sumar(creados, filas)
+            return
+        except SQLAlchemyError as e:
+            logger.warning(f"Batch insert failed, retrying row by row: {e}")
+            self._reiniciar_mapas()
+
+        # Reintento fila por fila para aislar la fila problemática
+        for fila in filas:
+            try:
+                with self.db.begin_nested():
+                    creados = self._resolver_catalogos([fila])
+                    self._insertar_libros([fila])
+                self.db.commit()
+                self._sumar(creados, [fila])
+            except SQLAlchemyError as e:
+                # Los ids creados dentro del savepoint fallido ya no son válidos
+                self._reiniciar_mapas()
+                self._error(fila["nro_fila"], fila["isbn"], f"Error de base de datos: {getattr(e, 'orig', e)}")
+
+    def _sumar(self, creados: Dict[str, int], filas: List[Dict[str, Any]]) -> None:
+        for campo, cantidad in creados.items():
+            self.reporte[campo] += cantidad
+        self.reporte["libros_creados"] += len(filas)
+        self.reporte["isbns_creados"].extend(f["isbn"] for f in filas)
+
+    def _reiniciar_mapas(self) -> None:
+        self.generos.clear()
+        self.editoriales.clear()
+        self.autores.clear()
+        self._cargar_mapas()
+
+    # ==================== API pública ====================
+
+    def importar(self, filas: Iterable[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Importa un iterable de (nro_línea, fila). Las filas se consumen en
+        streaming y se insertan en lotes de `batch_size`.
+
+        Si el archivo deja de poder leerse (p. ej. bytes que no son UTF-8 a mitad
+        del stream), se insertan las filas válidas ya leídas y se devuelve el
+        reporte parcial con `error_fatal`; los lotes anteriores ya están confirmados.
+
+        Returns:
+            Reporte con totales creados, ISBN importados y la lista de errores por fila
+        """
+        self._cargar_mapas()
+        lote: List[Dict[str, Any]] = []
+        filas = iter(filas)
+        ultima_linea = 0
+
+        while True:
+            try:
+                nro_fila, raw = next(filas)
+            except StopIteration:
+                break
+            except UnicodeDecodeError as e:
+                self.reporte["error_fatal"] = f"Archivo ilegible después de la línea {ultima_linea}: {e}"
+                logger.warning(f"Library import stopped: {e}")
+                break
+
+            ultima_linea = nro_fila
+            self.reporte["total_filas"] += 1
+            try:
+                fila = self._validar(nro_fila, raw)
+            except ValueError as e:
+                self._error(nro_fila, _limpiar(raw.get("isbn")), str(e))
+                continue
+
+            self.isbns_vistos.add(fila["isbn"])
+            lote.append(fila)
+            if len(lote) >= self.batch_size:
+                self._procesar_lote(lote)
+                lote = []
+
+        self._procesar_lote(lote)
+        self.reporte["errores"].sort(key=lambda e: e["fila"])
+
+        logger.info(
+            f"Library import finished: {self.reporte['libros_creados']}/{self.reporte['total_filas']} books, "
+            f"{len(self.reporte['errores'])} errors"
+        )
+        return self.reporte
+
+
+def importar_catalogo(
+    db: Session,
+    stream: Iterable[str],
+    formato: str = "csv",
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, Any]:
+    """Importa el catálogo desde líneas de texto (CSV o JSON-lines), ver decodificar_lineas"""
+    return LibraryImportService(db, batch_size=batch_size).importar(iter_rows(stream, formato))
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, text, func, case, tuple_
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from typing import List, Optional
@@ -8,6 +8,7 @@ from app.models.models import (
     GeneroLiterario, Editorial, Autor, Libro, LibroAutor,
     Prestamo, Reserva, MultaPrestamo, ModuloLibro
 )
+from app.services import reference_cache
 from app.schemas.library import (
     GeneroLiterarioCreate, GeneroLiterarioUpdate,
     EditorialCreate, EditorialUpdate,
@@ -27,6 +28,7 @@ class LibraryService:
     def create_genero(db: Session, genero_in: GeneroLiterarioCreate):
         db_genero = GeneroLiterario(**genero_in.model_dump())
         db.add(db_genero)
+        reference_cache.bump_version(db, reference_cache.GENEROS)
         db.commit()
         db.refresh(db_genero)
         return db_genero
@@ -41,6 +43,7 @@ class LibraryService:
         for field, value in update_data.items():
             setattr(db_genero, field, value)
             
+        reference_cache.bump_version(db, reference_cache.GENEROS)
         db.commit()
         db.refresh(db_genero)
         return db_genero
@@ -50,6 +53,7 @@ class LibraryService:
         db_genero = db.query(GeneroLiterario).filter(GeneroLiterario.id == genero_id).first()
         if db_genero:
             db_genero.activo = False
+            reference_cache.bump_version(db, reference_cache.GENEROS)
             db.commit()
             return True
         return False
@@ -63,6 +67,7 @@ class LibraryService:
     def create_editorial(db: Session, editorial_in: EditorialCreate):
         db_editorial = Editorial(**editorial_in.model_dump())
         db.add(db_editorial)
+        reference_cache.bump_version(db, reference_cache.EDITORIALES)
         db.commit()
         db.refresh(db_editorial)
         return db_editorial
@@ -77,6 +82,7 @@ class LibraryService:
         for field, value in update_data.items():
             setattr(db_editorial, field, value)
             
+        reference_cache.bump_version(db, reference_cache.EDITORIALES, reference_cache.MODULO_LIBROS)
         db.commit()
         db.refresh(db_editorial)
         return db_editorial
@@ -86,6 +92,7 @@ class LibraryService:
         db_editorial = db.query(Editorial).filter(Editorial.id == editorial_id).first()
         if db_editorial:
             db_editorial.activo = False
+            reference_cache.bump_version(db, reference_cache.EDITORIALES)
             db.commit()
             return True
         return False
@@ -99,6 +106,7 @@ class LibraryService:
     def create_autor(db: Session, autor_in: AutorCreate):
         db_autor = Autor(**autor_in.model_dump())
         db.add(db_autor)
+        reference_cache.bump_version(db, reference_cache.AUTORES)
         db.commit()
         db.refresh(db_autor)
         return db_autor
@@ -113,6 +121,7 @@ class LibraryService:
         for field, value in update_data.items():
             setattr(db_autor, field, value)
             
+        reference_cache.bump_version(db, reference_cache.AUTORES)
         db.commit()
         db.refresh(db_autor)
         return db_autor
@@ -122,6 +131,7 @@ class LibraryService:
         db_autor = db.query(Autor).filter(Autor.id == autor_id).first()
         if db_autor:
             db_autor.activo = False
+            reference_cache.bump_version(db, reference_cache.AUTORES)
             db.commit()
             return True
         return False
@@ -212,6 +222,7 @@ class LibraryService:
         for field, value in update_data.items():
             setattr(db_libro, field, value)
             
+        reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
         db.commit()
         db.refresh(db_libro)
         return db_libro
@@ -220,20 +231,113 @@ class LibraryService:
     def delete_libro(db: Session, libro_id: int):
         db_libro = db.query(Libro).filter(Libro.id == libro_id).first()
     # --- Préstamos ---
+    @staticmethod
+    def _filtrar_prestatario(query, usuario_id: Optional[int] = None,
+                             estudiante_id: Optional[int] = None,
+                             profesor_id: Optional[int] = None):
+        """Apply borrower filters (usuario, estudiante or profesor)"""
+        if usuario_id:
+            query = query.filter(Prestamo.usuario_id == usuario_id)
+        if estudiante_id:
+            query = query.filter(Prestamo.estudiante_id == estudiante_id)
+        if profesor_id:
+            query = query.filter(Prestamo.profesor_id == profesor_id)
+        return query
+
     @staticmethod
     def get_prestamos(db: Session, skip: int = 0, limit: int = 100, 
                      estado: Optional[str] = None, 
-                     usuario_id: Optional[int] = None): # estudiante o profesor id
+                     usuario_id: Optional[int] = None,
+                     estudiante_id: Optional[int] = None,
+                     profesor_id: Optional[int] = None):
+        query = db.query(Prestamo).options(
+            joinedload(Prestamo.libro),
+            joinedload(Prestamo.estudiante),
+            joinedload(Prestamo.profesor),
+            joinedload(Prestamo.usuario)
+        )
+        if estado:
+            query = query.filter(Prestamo.estado == estado)
+        query = LibraryService._filtrar_prestatario(query, usuario_id, estudiante_id, profesor_id)
+        return query.order_by(Prestamo.fecha_prestamo.desc(), Prestamo.id.desc()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def _decode_cursor(cursor: str):
+        """Cursor format: '<fecha_prestamo ISO>_<id>'"""
+        try:
+            fecha_str, id_str = cursor.split("_", 1)
+            return date.fromisoformat(fecha_str), int(id_str)
+        except (ValueError, AttributeError):
+            raise ValueError("Cursor de paginación inválido")
+
+    @staticmethod
+    def get_historial_prestatario(db: Session, usuario_id: Optional[int] = None,
+                                  estudiante_id: Optional[int] = None,
+                                  profesor_id: Optional[int] = None,
+                                  estado: Optional[str] = None,
+                                  cursor: Optional[str] = None,
+                                  limit: int = 50):
+        """
+        Historial de préstamos de un prestatario con paginación keyset
+        (fecha_prestamo DESC, id DESC) y un resumen compacto en la misma llamada:
+        préstamos activos, atrasados y total de multas.
+        """
+        if not (usuario_id or estudiante_id or profesor_id):
+            raise ValueError("Debe especificar un usuario, estudiante o profesor")
+
         query = db.query(Prestamo).options(
             joinedload(Prestamo.libro),
             joinedload(Prestamo.estudiante),
             joinedload(Prestamo.profesor),
             joinedload(Prestamo.usuario)
         )
+        query = LibraryService._filtrar_prestatario(query, usuario_id, estudiante_id, profesor_id)
         if estado:
             query = query.filter(Prestamo.estado == estado)
-        # TODO: Filter by user efficiently
-        return query.order_by(Prestamo.fecha_prestamo.desc()).offset(skip).limit(limit).all()
+        if cursor:
+            fecha_cursor, id_cursor = LibraryService._decode_cursor(cursor)
+            query = query.filter(
+                tuple_(Prestamo.fecha_prestamo, Prestamo.id) < tuple_(fecha_cursor, id_cursor)
+            )
+
+        # Pedimos una fila extra para saber si hay más páginas
+        items = query.order_by(
+            Prestamo.fecha_prestamo.desc(), Prestamo.id.desc()
+        ).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            ultimo = items[-1]
+            next_cursor = f"{ultimo.fecha_prestamo.isoformat()}_{ultimo.id}"
+
+        # Resumen en una sola consulta agregada (sobre todo el historial, no solo la página)
+        today = date.today()
+        activo = Prestamo.estado == "ACTIVO"
+        resumen_query = db.query(
+            func.count(case((activo, 1))).label("activos"),
+            func.count(case((and_(activo, Prestamo.fecha_devolucion_esperada < today), 1))).label("atrasados"),
+            func.count(Prestamo.id).label("total"),
+            func.coalesce(func.sum(Prestamo.monto_multa), 0).label("total_multas"),
+            func.coalesce(
+                func.sum(case((Prestamo.multa_pagada == False, Prestamo.monto_multa), else_=0)), 0
+            ).label("multas_pendientes")
+        )
+        resumen = LibraryService._filtrar_prestatario(
+            resumen_query, usuario_id, estudiante_id, profesor_id
+        ).one()
+
+        return {
+            "items": items,
+            "next_cursor": next_cursor,
+            "resumen": {
+                "activos": resumen.activos,
+                "atrasados": resumen.atrasados,
+                "total": resumen.total,
+                "total_multas": resumen.total_multas,
+                "multas_pendientes": resumen.multas_pendientes
+            }
+        }
 
     @staticmethod
     def create_prestamo(db: Session, prestamo_in: PrestamoCreate, usuario_registro_id: int):
@@ -439,6 +543,7 @@ class LibraryService:
         
         # Update loan
         prestamo.fecha_devolucion = fecha_devolucion
+        prestamo.fecha_devolucion_real = fecha_devolucion
         prestamo.estado = "DEVUELTO"
         if observaciones:
             prestamo.observaciones = observaciones
@@ -503,6 +608,92 @@ class LibraryService:
             )
         ).all()
     
+    @staticmethod
+    def get_prestamos_calendario_resumen(db: Session, fecha_inicio: date, fecha_fin: date,
+                                         tipo_prestamo: Optional[str] = None):
+        """
+        Resumen diario para la vista de calendario: conteo de préstamos
+        entregados, por vencer, devueltos y atrasados por tipo de préstamo.
+        Se calcula en la base de datos con generate_series + GROUP BY, sin
+        cargar filas completas de Prestamo.
+        """
+        sql = text("""
+            WITH dias AS (
+                SELECT CAST(generate_series(CAST(:inicio AS date), CAST(:fin AS date), interval '1 day') AS date) AS dia
+            ),
+            eventos AS (
+                SELECT fecha_prestamo AS dia, COALESCE(tipo_prestamo, 'PERSONAL') AS tipo,
+                       1 AS prestados, 0 AS vencen, 0 AS devueltos, 0 AS atrasados
+                FROM prestamos
+                WHERE fecha_prestamo BETWEEN :inicio AND :fin
+                UNION ALL
+                SELECT fecha_devolucion_esperada, COALESCE(tipo_prestamo, 'PERSONAL'),
+                       0, 1, 0,
+                       CASE WHEN estado <> 'DEVUELTO' AND fecha_devolucion_esperada < CURRENT_DATE
+                            THEN 1 ELSE 0 END
+                FROM prestamos
+                WHERE fecha_devolucion_esperada BETWEEN :inicio AND :fin
+                UNION ALL
+                SELECT fecha_devolucion_real, COALESCE(tipo_prestamo, 'PERSONAL'),
+                       0, 0, 1, 0
+                FROM prestamos
+                WHERE fecha_devolucion_real BETWEEN :inicio AND :fin
+            )
+            SELECT d.dia, e.tipo,
+                   COALESCE(SUM(e.prestados), 0) AS prestados,
+                   COALESCE(SUM(e.vencen), 0) AS vencen,
+                   COALESCE(SUM(e.devueltos), 0) AS devueltos,
+                   COALESCE(SUM(e.atrasados), 0) AS atrasados
+            FROM dias d
+            LEFT JOIN eventos e ON e.dia = d.dia
+                AND (CAST(:tipo AS varchar) IS NULL OR e.tipo = :tipo)
+            GROUP BY d.dia, e.tipo
+            ORDER BY d.dia, e.tipo
+        """)
+        rows = db.execute(sql, {
+            "inicio": fecha_inicio,
+            "fin": fecha_fin,
+            "tipo": tipo_prestamo
+        }).mappings().all()
+
+        # Agrupar por día: totales + desglose por tipo_prestamo
+        campos = ("prestados", "vencen", "devueltos", "atrasados")
+        dias = {}
+        for row in rows:
+            dia = dias.setdefault(row["dia"], {
+                "fecha": row["dia"],
+                "total": {campo: 0 for campo in campos},
+                "por_tipo": {}
+            })
+            if row["tipo"] is None:
+                continue
+            conteo = {campo: int(row[campo]) for campo in campos}
+            dia["por_tipo"][row["tipo"]] = conteo
+            for campo in campos:
+                dia["total"][campo] += conteo[campo]
+
+        return list(dias.values())
+
+    @staticmethod
+    def get_prestamos_dia(db: Session, fecha: date, tipo_prestamo: Optional[str] = None):
+        """Get loan details for a single calendar day (lazy detail for the calendar view)"""
+        query = db.query(Prestamo).options(
+            joinedload(Prestamo.libro),
+            joinedload(Prestamo.estudiante),
+            joinedload(Prestamo.profesor),
+            joinedload(Prestamo.usuario)
+        ).filter(
+            or_(
+                Prestamo.fecha_prestamo == fecha,
+                Prestamo.fecha_devolucion_esperada == fecha,
+                Prestamo.fecha_devolucion_real == fecha
+            )
+        )
+        if tipo_prestamo:
+            # Igual que el resumen: los préstamos sin tipo cuentan como PERSONAL
+            query = query.filter(func.coalesce(Prestamo.tipo_prestamo, 'PERSONAL') == tipo_prestamo)
+        return query.order_by(Prestamo.id).all()
+    
     # ==================== MULTAS ====================
     
     @staticmethod
@@ -680,6 +871,7 @@ class LibraryService:
         )
         
         db.add(db_modulo_libro)
+        reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
         db.commit()
         db.refresh(db_modulo_libro)
         return db_modulo_libro
@@ -705,6 +897,7 @@ class LibraryService:
             raise ValueError("Asignación no encontrada")
         
         db.delete(modulo_libro)
+        reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
         db.commit()
         return True
 
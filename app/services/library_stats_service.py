@@ -0,0 +1,204 @@
+"""
+Estadísticas de circulación de la biblioteca.
+
+Las consultas leen únicamente de las vistas materializadas creadas en
+migrations/create_library_stats_views.sql. Las vistas se refrescan con
+REFRESH MATERIALIZED VIEW CONCURRENTLY (las lecturas no se bloquean) desde:
+  - el refresco periódico que arranca la aplicación (LIBRARY_STATS_REFRESH_MINUTES)
+  - el script refresh_library_stats.py (cron)
+  - POST /biblioteca/estadisticas/refrescar
+"""
+
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+STATS_VIEWS = (
+    "mv_biblioteca_circulacion_libro",
+    "mv_biblioteca_circulacion_modulo",
+    "mv_biblioteca_multas_mensual",
+)
+
+# 0 desactiva el refresco periódico dentro de la aplicación
+REFRESH_MINUTES = int(os.getenv("LIBRARY_STATS_REFRESH_MINUTES", "15"))
+
+# Clave del advisory lock: con varios workers solo uno refresca a la vez
+_REFRESH_LOCK_KEY = 72_190_029
+
+ORDEN_TOP_TITULOS = {
+    "total": "total_prestamos",
+    "recientes": "prestamos_90_dias",
+    "por_copia": "prestamos_por_copia",
+    "reservas": "total_reservas",
+}
+
+
+class LibraryStatsService:
+
+    @staticmethod
+    def refresh_views(db: Session, concurrently: bool = True) -> bool:
+        """
+        Refresca todas las vistas de estadísticas. Devuelve False si otro
+        proceso ya está refrescando (no espera por él).
+        """
+        locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                            {"key": _REFRESH_LOCK_KEY}).scalar()
+        if not locked:
+            db.rollback()
+            return False
+
+        modo = "CONCURRENTLY " if concurrently else ""
+        for view in STATS_VIEWS:
+            db.execute(text(f"REFRESH MATERIALIZED VIEW {modo}{view}"))
+        db.commit()
+        return True
+
+    @staticmethod
+    def get_ultima_actualizacion(db: Session):
+        return db.execute(text(
+            "SELECT MIN(actualizado_en) FROM mv_biblioteca_circulacion_libro"
+        )).scalar()
+
+    @staticmethod
+    def get_top_titulos(db: Session, orden: str = "total", limit: int = 10):
+        """Títulos más prestados según el criterio de `orden` (ver ORDEN_TOP_TITULOS)."""
+        columna = ORDEN_TOP_TITULOS[orden]
+        rows = db.execute(text(f"""
+            SELECT libro_id, titulo, isbn, cantidad_total, total_prestamos,
+                   prestamos_activos, prestamos_30_dias, prestamos_90_dias,
+                   total_reservas, prestamos_por_copia, ultimo_prestamo
+            FROM mv_biblioteca_circulacion_libro
+            WHERE total_prestamos > 0 OR total_reservas > 0
+            ORDER BY {columna} DESC, libro_id
+            LIMIT :limit
+        """), {"limit": limit}).mappings().all()
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    def get_circulacion_modulos(db: Session, modulo_id: Optional[int] = None,
+                                tipo_asignacion: Optional[str] = None,
+                                solo_activos: bool = True):
+        """
+        Circulación académica por asignación ModuloLibro, agrupada por módulo.
+        Cada módulo incluye el total de préstamos y el detalle por libro asignado.
+        """
+        filtros = []
+        params = {}
+        if modulo_id is not None:
+            filtros.append("modulo_id = :modulo_id")
+            params["modulo_id"] = modulo_id
+        if tipo_asignacion:
+            filtros.append("tipo_asignacion = :tipo_asignacion")
+            params["tipo_asignacion"] = tipo_asignacion
+        if solo_activos:
+            filtros.append("activo")
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+        rows = db.execute(text(f"""
+            SELECT modulo_id, modulo_nombre, libro_id, titulo, tipo_asignacion, activo,
+                   prestamos_academicos, prestamos_activos, prestamos_90_dias
+            FROM mv_biblioteca_circulacion_modulo
+            {where}
+            ORDER BY modulo_nombre, modulo_id, prestamos_academicos DESC, libro_id
+        """), params).mappings().all()
+
+        modulos = {}
+        for r in rows:
+            modulo = modulos.setdefault(r["modulo_id"], {
+                "modulo_id": r["modulo_id"],
+                "modulo_nombre": r["modulo_nombre"],
+                "total_prestamos": 0,
+                "libros_sin_prestamos": 0,
+                "libros": [],
+            })
+            modulo["total_prestamos"] += r["prestamos_academicos"]
+            if not r["prestamos_academicos"]:
+                modulo["libros_sin_prestamos"] += 1
+            modulo["libros"].append({
+                "libro_id": r["libro_id"],
+                "titulo": r["titulo"],
+                "tipo_asignacion": r["tipo_asignacion"],
+                "activo": r["activo"],
+                "prestamos_academicos": r["prestamos_academicos"],
+                "prestamos_activos": r["prestamos_activos"],
+                "prestamos_90_dias": r["prestamos_90_dias"],
+            })
+        return list(modulos.values())
+
+    @staticmethod
+    def get_tasa_cobro_multas(db: Session, desde: Optional[date] = None,
+                              hasta: Optional[date] = None):
+        """Multas generadas vs. cobradas por mes, con la tasa de cobro total del periodo."""
+        filtros = []
+        params = {}
+        if desde:
+            filtros.append("mes >= CAST(date_trunc('month', CAST(:desde AS date)) AS date)")
+            params["desde"] = desde
+        if hasta:
+            filtros.append("mes <= :hasta")
+            params["hasta"] = hasta
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+        rows = db.execute(text(f"""
+            SELECT mes, multas_generadas, multas_pagadas, monto_generado, monto_cobrado
+            FROM mv_biblioteca_multas_mensual
+            {where}
+            ORDER BY mes
+        """), params).mappings().all()
+
+        meses = []
+        monto_generado = 0
+        monto_cobrado = 0
+        multas_generadas = 0
+        multas_pagadas = 0
+        for r in rows:
+            mes = dict(r)
+            mes["tasa_cobro"] = _tasa(r["monto_cobrado"], r["monto_generado"])
+            meses.append(mes)
+            monto_generado += r["monto_generado"]
+            monto_cobrado += r["monto_cobrado"]
+            multas_generadas += r["multas_generadas"]
+            multas_pagadas += r["multas_pagadas"]
+
+        return {
+            "multas_generadas": multas_generadas,
+            "multas_pagadas": multas_pagadas,
+            "monto_generado": monto_generado,
+            "monto_cobrado": monto_cobrado,
+            "tasa_cobro": _tasa(monto_cobrado, monto_generado),
+            "meses": meses,
+        }
+
+
+def _tasa(cobrado, generado) -> float:
+    return round(float(cobrado) / float(generado), 4) if generado else 0.0
+
+
+def refresh_stats_views() -> bool:
+    """Refresca las vistas con una sesión propia (para hilos y scripts)."""
+    db = SessionLocal()
+    try:
+        return LibraryStatsService.refresh_views(db)
+    finally:
+        db.close()
+
+
+async def run_periodic_refresh(interval_minutes: int = REFRESH_MINUTES):
+    """Tarea de fondo: refresca las vistas cada `interval_minutes` minutos."""
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            refreshed = await asyncio.to_thread(refresh_stats_views)
+            if not refreshed:
+                logger.info("Refresco de estadísticas omitido: otro proceso lo está ejecutando")
+        except Exception as e:
+            logger.error(f"Error refrescando estadísticas de biblioteca: {e}")
@@ -0,0 +1,301 @@
+"""
+Servicio de Medios (Range, ETag y peticiones condicionales)
+===========================================================
+
+Sirve archivos de audio para reproductores que hacen seeking:
+
+  - Range: bytes=a-b       -> 206 Partial Content con Content-Range
+  - Range con varios rangos -> 206 multipart/byteranges
+  - rango imposible         -> 416 con Content-Range: bytes */<tamaño>
+  - If-None-Match           -> 304 si el ETag coincide
+  - If-Range                -> el rango solo se respeta si el ETag (o la fecha) coincide
+
+El ETag es fuerte y sale del SHA-256 del contenido: para blobs viene en la
+propia ruta; para archivos antiguos se calcula una vez y queda en caché.
+
+LessonMediaCache guarda lección -> metadatos del archivo para que cada
+petición de seeking no consulte la base de datos. Se invalida al cambiar el
+audio de la lección y, como respaldo entre procesos, cada entrada expira a
+los AUDIO_STREAM_META_TTL segundos o si el archivo cambia de tamaño/mtime.
+"""
+
+import os
+import re
+import time
+import uuid
+import logging
+import mimetypes
+import threading
+import asyncio
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.services.alignment_cache import hash_file
+from app.services.audio_storage_service import audio_storage_service
+
+logger = logging.getLogger(__name__)
+
+META_TTL = float(os.getenv("AUDIO_STREAM_META_TTL", "300"))
+MAX_AGE = int(os.getenv("AUDIO_STREAM_MAX_AGE", "0"))
+# Más rangos que esto en una petición se responde con el archivo completo
+MAX_RANGES = int(os.getenv("AUDIO_STREAM_MAX_RANGES", "16"))
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+@dataclass
+class MediaFile:
+    path: str
+    size: int
+    mime_type: str
+    sha256: str
+    mtime: float
+    filename: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime, usegmt=True)
+
+
+def load_media_file(relative_path: str, filename: str) -> MediaFile:
+    """Metadatos de un archivo de audio (calcula el hash si no es un blob)."""
+    info = audio_storage_service.get_file_info(relative_path)
+    sha256 = info["sha256"] or hash_file(info["path"])
+    return MediaFile(
+        path=info["path"],
+        size=info["size"],
+        mime_type=info["mime_type"] or mimetypes.guess_type(info["path"])[0] or "audio/mpeg",
+        sha256=sha256,
+        mtime=os.path.getmtime(info["path"]),
+        filename=filename
+    )
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Interpreta un encabezado Range ("bytes=0-99,200-,-50").
+
+    Returns:
+        Lista de rangos (inicio, fin inclusivo) satisfacibles, [] si ninguno lo
+        es (416), o None si el encabezado no es válido y debe ignorarse.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        match = _RANGE_RE.match(part)
+        if not match:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            # Sufijo: los últimos N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = int(last) if last else size - 1
+        ranges.append((start, min(end, size - 1)))
+
+    return ranges
+
+
+def _coalesce(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Ordena los rangos y une los solapados o contiguos."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    # If-None-Match usa comparación débil: W/"x" coincide con "x"
+    return any(c == etag or c == f"W/{etag}" for c in candidates)
+
+
+def _if_range_matches(header: str, media: MediaFile) -> bool:
+    """If-Range: ETag fuerte exacto, o fecha igual a Last-Modified."""
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return header == media.etag
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(media.mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+async def _read_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def media_response(request: Request, media: MediaFile) -> Response:
+    """Respuesta 200/206/304/416 para `media` según los encabezados de la petición."""
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": media.etag,
+        "Last-Modified": media.last_modified,
+        "Cache-Control": f"public, max-age={MAX_AGE}, must-revalidate",
+        "Content-Disposition": f'inline; filename="{media.filename}"',
+    }
+    head_only = request.method == "HEAD"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, media.etag):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if not if_range or _if_range_matches(if_range, media):
+            ranges = parse_range_header(range_header, media.size)
+
+    if ranges is not None and not ranges:
+        headers["Content-Range"] = f"bytes */{media.size}"
+        return Response(status_code=416, headers=headers)
+
+    if ranges:
+        ranges = _coalesce(ranges)
+        if len(ranges) > MAX_RANGES:
+            ranges = None
+
+    # Archivo completo
+    if not ranges:
+        headers["Content-Length"] = str(media.size)
+        if head_only:
+            return Response(status_code=200, headers=headers, media_type=media.mime_type)
+        return StreamingResponse(
+            _read_range(media.path, 0, media.size - 1),
+            status_code=200, headers=headers, media_type=media.mime_type
+        )
+
+    # Un solo rango
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{media.size}"
+        headers["Content-Length"] = str(end - start + 1)
+        if head_only:
+            return Response(status_code=206, headers=headers, media_type=media.mime_type)
+        return StreamingResponse(
+            _read_range(media.path, start, end),
+            status_code=206, headers=headers, media_type=media.mime_type
+        )
+
+    # Varios rangos: multipart/byteranges
+    boundary = uuid.uuid4().hex
+    parts = []
+    for start, end in ranges:
+        part_header = (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media.mime_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{media.size}\r\n\r\n"
+        ).encode("ascii")
+        parts.append((part_header, start, end))
+    closing = f"\r\n--{boundary}--\r\n".encode("ascii")
+
+    length = sum(len(h) + (end - start + 1) for h, start, end in parts)
+    length += 2 * (len(parts) - 1) + len(closing)
+    headers["Content-Length"] = str(length)
+    content_type = f"multipart/byteranges; boundary={boundary}"
+
+    if head_only:
+        return Response(status_code=206, headers=headers, media_type=content_type)
+
+    async def body() -> AsyncIterator[bytes]:
+        for i, (part_header, start, end) in enumerate(parts):
+            if i:
+                yield b"\r\n"
+            yield part_header
+            async for chunk in _read_range(media.path, start, end):
+                yield chunk
+        yield closing
+
+    return StreamingResponse(body(), status_code=206, headers=headers, media_type=content_type)
+
+
+class LessonMediaCache:
+    """lección -> MediaFile, en memoria, con TTL."""
+
+    def __init__(self, ttl: float = META_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, MediaFile]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, lesson_id: int) -> None:
+        with self._lock:
+            self._entries.pop(lesson_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, lesson_id: int) -> Optional[MediaFile]:
+        with self._lock:
+            entry = self._entries.get(lesson_id)
+        if not entry:
+            return None
+        loaded_at, media = entry
+        if time.monotonic() - loaded_at > self.ttl:
+            return None
+        try:
+            st = os.stat(media.path)
+        except OSError:
+            return None
+        if st.st_size != media.size or st.st_mtime != media.mtime:
+            return None
+        return media
+
+    async def get(self, lesson_id: int, loader: Callable[[int], MediaFile]) -> MediaFile:
+        """
+        Devuelve los metadatos de la lección; en un fallo llama a `loader`
+        (síncrono, en un hilo), que puede lanzar LookupError si no hay audio.
+        """
+        media = self._lookup(lesson_id)
+        if media:
+            self.hits += 1
+            return media
+
+        self.misses += 1
+        media = await asyncio.to_thread(loader, lesson_id)
+        with self._lock:
+            self._entries[lesson_id] = (time.monotonic(), media)
+        return media
+
+
+# Instancia global de la caché de metadatos
+lesson_media_cache = LessonMediaCache()
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session, joinedload
 from app.models.models import Modulo
 from app.schemas.modulo import ModuloCreate, ModuloUpdate
+from app.services import reference_cache
 
 def get_modulo(db: Session, modulo_id: int):
     return db.query(Modulo).options(joinedload(Modulo.nivel)).filter(Modulo.id == modulo_id).first()
@@ -30,6 +31,8 @@ def update_modulo(db: Session, modulo_id: int, modulo: ModuloUpdate):
         setattr(db_modulo, key, value)
     
     db.add(db_modulo)
+    # Las listas módulo-libro incluyen el nombre y código del módulo
+    reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
     db.commit()
     db.refresh(db_modulo)
     return db_modulo
@@ -38,5 +41,6 @@ def delete_modulo(db: Session, modulo_id: int):
     db_modulo = get_modulo(db, modulo_id)
     if db_modulo:
         db.delete(db_modulo)
+        reference_cache.bump_version(db, reference_cache.MODULO_LIBROS)
         db.commit()
     return db_modulo
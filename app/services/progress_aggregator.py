@@ -0,0 +1,241 @@
+"""
+Agregador de Progreso de Reproducción
+=====================================
+
+La app Android envía la posición de reproducción cada pocos segundos. En lugar
+de escribir cada ping, se combinan en memoria por (estudiante, lección) y se
+escriben cada AUDIO_PROGRESS_FLUSH_SECONDS con un único
+INSERT ... ON CONFLICT DO UPDATE para todo el lote.
+
+La combinación conserva exactamente lo que habría dado aplicar los pings uno
+por uno con update_student_progress():
+
+  - total_time_listened_ms suma solo los avances (posición > posición anterior).
+    Para eso cada entrada guarda la primera y la última posición del lote y la
+    suma de avances entre pings; el avance desde la posición guardada en la base
+    hasta la primera del lote se calcula en el propio UPDATE.
+  - completed pasa a True (y times_completed suma 1) solo en la transición desde
+    False, aunque varios pings del lote digan completed.
+
+Con AUDIO_PROGRESS_FLUSH_SECONDS=0 cada ping se escribe al recibirlo.
+Cada proceso de la API tiene su propio agregador; al apagarse escribe lo pendiente.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.getenv("AUDIO_PROGRESS_FLUSH_SECONDS", "5"))
+# Con más entradas pendientes que esto se escribe sin esperar al intervalo
+MAX_PENDING = int(os.getenv("AUDIO_PROGRESS_MAX_PENDING", "5000"))
+
+Key = Tuple[int, int]  # (estudiante_id, audio_lesson_id)
+
+_UPSERT_SQL = text("""
+    WITH batch AS (
+        SELECT * FROM unnest(
+            CAST(:estudiante_ids AS integer[]),
+            CAST(:lesson_ids AS integer[]),
+            CAST(:first_positions AS integer[]),
+            CAST(:last_positions AS integer[]),
+            CAST(:listened AS integer[]),
+            CAST(:completed AS boolean[])
+        ) AS b(estudiante_id, audio_lesson_id, first_position, last_position, listened, completed)
+    )
+    INSERT INTO student_audio_progress (
+        estudiante_id, audio_lesson_id, last_position_ms, total_time_listened_ms,
+        times_completed, completed, created_at, updated_at
+    )
+    SELECT estudiante_id, audio_lesson_id, last_position, listened,
+           CASE WHEN completed THEN 1 ELSE 0 END, completed, :now, :now
+    FROM batch
+    ON CONFLICT (estudiante_id, audio_lesson_id) DO UPDATE SET
+        total_time_listened_ms = COALESCE(student_audio_progress.total_time_listened_ms, 0)
+            + GREATEST(
+                (SELECT b.first_position FROM batch b
+                 WHERE b.estudiante_id = EXCLUDED.estudiante_id
+                   AND b.audio_lesson_id = EXCLUDED.audio_lesson_id)
+                - COALESCE(student_audio_progress.last_position_ms, 0),
+                0
+            )
+            + EXCLUDED.total_time_listened_ms,
+        last_position_ms = EXCLUDED.last_position_ms,
+        times_completed = COALESCE(student_audio_progress.times_completed, 0)
+            + CASE WHEN EXCLUDED.completed AND NOT COALESCE(student_audio_progress.completed, FALSE)
+                   THEN 1 ELSE 0 END,
+        completed = COALESCE(student_audio_progress.completed, FALSE) OR EXCLUDED.completed,
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+@dataclass
+class PendingProgress:
+    """Pings combinados de un (estudiante, lección) desde la última escritura."""
+    first_position_ms: int
+    last_position_ms: int
+    listened_ms: int = 0
+    completed: bool = False
+    pings: int = 1
+
+    def add_ping(self, position_ms: int, completed: bool) -> None:
+        if position_ms > self.last_position_ms:
+            self.listened_ms += position_ms - self.last_position_ms
+        self.last_position_ms = position_ms
+        self.completed = self.completed or completed
+        self.pings += 1
+
+    def merge_newer(self, newer: "PendingProgress") -> None:
+        """Agrega `newer` (pings posteriores) a esta entrada."""
+        self.listened_ms += max(newer.first_position_ms - self.last_position_ms, 0) + newer.listened_ms
+        self.last_position_ms = newer.last_position_ms
+        self.completed = self.completed or newer.completed
+        self.pings += newer.pings
+
+    def apply_to(
+        self,
+        last_position_ms: int,
+        total_time_listened_ms: int,
+        times_completed: int,
+        completed: bool
+    ) -> Tuple[int, int, int, bool]:
+        """Valores de la fila guardada después de escribir esta entrada."""
+        listened = total_time_listened_ms + max(self.first_position_ms - last_position_ms, 0) + self.listened_ms
+        if self.completed and not completed:
+            times_completed += 1
+        return self.last_position_ms, listened, times_completed, completed or self.completed
+
+
+class ProgressAggregator:
+
+    def __init__(self, flush_seconds: float = FLUSH_SECONDS, max_pending: int = MAX_PENDING):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[Key, PendingProgress] = {}
+        self._lock = threading.Lock()
+        # Serializa las escrituras para que un lote no adelante a otro anterior
+        self._flush_lock = threading.Lock()
+        self._stopping: Optional[asyncio.Event] = None
+        self.stats = {"pings": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0, "last_flush_ms": 0.0}
+
+    # ==================== Ingreso ====================
+
+    def record(self, estudiante_id: int, lesson_id: int, position_ms: int, completed: bool = False) -> None:
+        """Registra un ping. No consulta la base de datos (salvo en modo sin buffer)."""
+        key = (estudiante_id, lesson_id)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry:
+                entry.add_ping(position_ms, completed)
+            else:
+                self._pending[key] = PendingProgress(position_ms, position_ms, completed=completed)
+            self.stats["pings"] += 1
+            overflow = len(self._pending) >= self.max_pending
+
+        if self.flush_seconds <= 0 or overflow:
+            self.flush()
+
+    def pending_for(self, estudiante_id: int, lesson_id: int) -> Optional[PendingProgress]:
+        with self._lock:
+            entry = self._pending.get((estudiante_id, lesson_id))
+            return PendingProgress(**entry.__dict__) if entry else None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # ==================== Escritura ====================
+
+    def _take(self, keys: Optional[Iterable[Key]] = None) -> Dict[Key, PendingProgress]:
+        with self._lock:
+            if keys is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {k: self._pending.pop(k) for k in keys if k in self._pending}
+        return batch
+
+    def _restore(self, batch: Dict[Key, PendingProgress]) -> None:
+        """Devuelve un lote que no se pudo escribir, delante de los pings nuevos."""
+        with self._lock:
+            for key, older in batch.items():
+                newer = self._pending.get(key)
+                if newer:
+                    older.merge_newer(newer)
+                self._pending[key] = older
+
+    def flush(self, db: Optional[Session] = None, keys: Optional[Iterable[Key]] = None) -> int:
+        """
+        Escribe lo pendiente (o solo `keys`) en un único INSERT ... ON CONFLICT.
+        Si falla, el lote vuelve a quedar pendiente y se relanza el error.
+
+        Returns:
+            Número de filas escritas
+        """
+        with self._flush_lock:
+            batch = self._take(keys)
+            if not batch:
+                return 0
+
+            own_session = db is None
+            db = db or SessionLocal()
+            started = time.perf_counter()
+            try:
+                # Orden fijo de claves: evita deadlocks entre procesos que escriben a la vez
+                items: List[Tuple[Key, PendingProgress]] = sorted(batch.items())
+                db.execute(_UPSERT_SQL, {
+                    "estudiante_ids": [k[0] for k, _ in items],
+                    "lesson_ids": [k[1] for k, _ in items],
+                    "first_positions": [p.first_position_ms for _, p in items],
+                    "last_positions": [p.last_position_ms for _, p in items],
+                    "listened": [p.listened_ms for _, p in items],
+                    "completed": [p.completed for _, p in items],
+                    "now": datetime.utcnow()
+                })
+                db.commit()
+            except Exception:
+                db.rollback()
+                self._restore(batch)
+                self.stats["flush_errors"] += 1
+                raise
+            finally:
+                if own_session:
+                    db.close()
+
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return len(batch)
+
+    # ==================== Tarea de fondo ====================
+
+    async def run(self) -> None:
+        """Escribe lo pendiente cada flush_seconds hasta stop(); al salir escribe el resto."""
+        self._stopping = asyncio.Event()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Error writing audio progress ({self.pending_count()} pending): {e}")
+
+    def stop(self) -> None:
+        if self._stopping:
+            self._stopping.set()
+
+
+# Instancia global del agregador
+progress_aggregator = ProgressAggregator()
@@ -0,0 +1,268 @@
+"""
+Pronunciation Scoring Engine
+============================
+
+Scores a recording by aligning word sequences with a word-level edit
+distance (weighted Levenshtein, with a Needleman-Wunsch backtrace):
+
+    expected words  vs  words the aligner placed in the audio
+    expected words  vs  words Whisper transcribed
+
+Each expected word gets one status:
+  - match:         found in order by the aligner or in the transcription
+  - substitution:  the student said another word in its place (`spoken`)
+  - deletion:      not said at all
+Extra transcribed words are reported as insertions.
+
+Costs follow NIST sclite (substitution 4, insertion/deletion 3): a
+substitution is still cheaper than deleting and inserting, but a path that
+keeps one more word matched wins over two substitutions, so "morning good"
+against "good morning" keeps one word instead of none.
+
+Unlike a membership test, the alignment respects word order and counts a
+repeated word once per occurrence. Common prefixes and suffixes are matched
+before the O(n*m) table is built, so the table only spans the stretch
+between the first and the last error (a few ms for a 150-word paragraph).
+
+Micro-benchmark: python benchmark_pronunciation_scoring.py
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+MATCH = "match"
+SUBSTITUTION = "substitution"
+DELETION = "deletion"
+INSERTION = "insertion"
+
+SUBSTITUTION_COST = 4
+INSERTION_COST = 3
+DELETION_COST = 3
+
+# Confidence given to words confirmed only by the transcription
+TRANSCRIPTION_CONFIDENCE = 0.8
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Backtrace moves
+_DIAGONAL, _UP, _LEFT = 0, 1, 2
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase, without punctuation and with single spaces."""
+    if not text:
+        return ""
+    text = _PUNCTUATION_RE.sub("", text.lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    normalized = normalize_text(text)
+    return normalized.split(" ") if normalized else []
+
+
+@dataclass(frozen=True)
+class EditOp:
+    """One step of an alignment; the index is None on the side without a word"""
+    op: str
+    ref_index: Optional[int]
+    hyp_index: Optional[int]
+
+
+def align_words(reference: Sequence[str], hypothesis: Sequence[str]) -> List[EditOp]:
+    """
+    Minimum-cost alignment of two token sequences (sclite weights).
+
+    Ties prefer a diagonal step (match/substitution), then a deletion, so
+    the result is deterministic.
+    """
+    n, m = len(reference), len(hypothesis)
+
+    prefix = 0
+    while prefix < n and prefix < m and reference[prefix] == hypothesis[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < n - prefix and suffix < m - prefix
+           and reference[n - 1 - suffix] == hypothesis[m - 1 - suffix]):
+        suffix += 1
+
+    ops = [EditOp(MATCH, i, i) for i in range(prefix)]
+    ops.extend(_align_core(
+        reference[prefix:n - suffix], hypothesis[prefix:m - suffix], prefix, prefix
+    ))
+    ops.extend(EditOp(MATCH, n - suffix + k, m - suffix + k) for k in range(suffix))
+    return ops
+
+
+def _align_core(ref: Sequence[str], hyp: Sequence[str], ref_offset: int, hyp_offset: int) -> List[EditOp]:
+    rows, cols = len(ref), len(hyp)
+    if not rows:
+        return [EditOp(INSERTION, None, hyp_offset + j) for j in range(cols)]
+    if not cols:
+        return [EditOp(DELETION, ref_offset + i, None) for i in range(rows)]
+
+    previous = [j * INSERTION_COST for j in range(cols + 1)]
+    back = [bytearray([_LEFT]) * (cols + 1)]
+    for i in range(1, rows + 1):
+        current = [i * DELETION_COST] + [0] * cols
+        moves = bytearray(cols + 1)
+        moves[0] = _UP
+        word = ref[i - 1]
+        for j in range(1, cols + 1):
+            diagonal = previous[j - 1] if word == hyp[j - 1] else previous[j - 1] + SUBSTITUTION_COST
+            up = previous[j] + DELETION_COST
+            left = current[j - 1] + INSERTION_COST
+            if diagonal <= up and diagonal <= left:
+                current[j] = diagonal
+            elif up <= left:
+                current[j] = up
+                moves[j] = _UP
+            else:
+                current[j] = left
+                moves[j] = _LEFT
+        back.append(moves)
+        previous = current
+
+    ops: List[EditOp] = []
+    i, j = rows, cols
+    while i or j:
+        move = back[i][j] if i and j else (_UP if i else _LEFT)
+        if move == _DIAGONAL:
+            i -= 1
+            j -= 1
+            op = MATCH if ref[i] == hyp[j] else SUBSTITUTION
+            ops.append(EditOp(op, ref_offset + i, hyp_offset + j))
+        elif move == _UP:
+            i -= 1
+            ops.append(EditOp(DELETION, ref_offset + i, None))
+        else:
+            j -= 1
+            ops.append(EditOp(INSERTION, None, hyp_offset + j))
+    ops.reverse()
+    return ops
+
+
+_OP_COSTS = {MATCH: 0, SUBSTITUTION: SUBSTITUTION_COST, INSERTION: INSERTION_COST, DELETION: DELETION_COST}
+
+
+def edit_distance(ops: Sequence[EditOp]) -> int:
+    """Number of word errors (substitutions + insertions + deletions)."""
+    return sum(1 for o in ops if o.op != MATCH)
+
+
+def alignment_cost(ops: Sequence[EditOp]) -> int:
+    return sum(_OP_COSTS[o.op] for o in ops)
+
+
+@dataclass
+class ScoringResult:
+    score: float
+    word_evaluations: List[Dict[str, Any]]
+    missed_words: List[str]
+    substitutions: int = 0
+    deletions: int = 0
+    insertions: int = 0
+    inserted_words: List[str] = field(default_factory=list)
+
+
+def _heard_by_aligner(word: Dict[str, Any]) -> bool:
+    # Raw Gentle words carry a case; the Whisper aligner flags words it
+    # recognized verbatim (misheard ones keep times and a halved confidence);
+    # processed Gentle output only has a confidence
+    if "case" in word:
+        return word["case"] == "success"
+    if "matched" in word:
+        return bool(word["matched"])
+    return float(word.get("confidence") or 0) > 0
+
+
+def score_pronunciation(
+    expected_text: str,
+    aligned_words: Sequence[Dict[str, Any]],
+    transcription: str
+) -> ScoringResult:
+    """
+    Score `expected_text` against the aligner output and the transcription.
+
+    A word counts as pronounced if the aligner placed it in the audio (its
+    confidence and times are used) or, failing that, if the transcription
+    has it at the same point of the sentence.
+    """
+    expected = tokenize(expected_text)
+    transcribed = tokenize(transcription)
+    if not expected:
+        return ScoringResult(100.0, [], [], insertions=len(transcribed), inserted_words=transcribed)
+
+    # Words the aligner actually heard, with their position in aligned_words
+    heard_tokens: List[str] = []
+    heard_index: List[int] = []
+    for k, word in enumerate(aligned_words):
+        token = normalize_text(word.get("word", "")).replace(" ", "")
+        if token and _heard_by_aligner(word):
+            heard_tokens.append(token)
+            heard_index.append(k)
+
+    by_aligner: Dict[int, Dict[str, Any]] = {}
+    for op in align_words(expected, heard_tokens):
+        if op.op == MATCH:
+            by_aligner[op.ref_index] = aligned_words[heard_index[op.hyp_index]]
+
+    by_transcription: Dict[int, EditOp] = {}
+    inserted_words: List[str] = []
+    for op in align_words(expected, transcribed):
+        if op.op == INSERTION:
+            inserted_words.append(transcribed[op.hyp_index])
+        else:
+            by_transcription[op.ref_index] = op
+
+    word_evaluations = []
+    missed_words = []
+    substitutions = deletions = 0
+    for i, word in enumerate(expected):
+        aligned = by_aligner.get(i)
+        spoken = by_transcription.get(i)
+
+        if aligned or spoken.op == MATCH:
+            word_evaluations.append({
+                "word": word,
+                "matched": True,
+                "status": MATCH,
+                "spoken": word,
+                "confidence": aligned.get("confidence", 0.9) if aligned else TRANSCRIPTION_CONFIDENCE,
+                "start_ms": aligned.get("start") if aligned else None,
+                "end_ms": aligned.get("end") if aligned else None
+            })
+            continue
+
+        missed_words.append(word)
+        if spoken.op == SUBSTITUTION:
+            substitutions += 1
+            word_evaluations.append({
+                "word": word,
+                "matched": False,
+                "status": SUBSTITUTION,
+                "spoken": transcribed[spoken.hyp_index],
+                "confidence": 0.0
+            })
+        else:
+            deletions += 1
+            word_evaluations.append({
+                "word": word,
+                "matched": False,
+                "status": DELETION,
+                "spoken": None,
+                "confidence": 0.0
+            })
+
+    matched = len(expected) - len(missed_words)
+    return ScoringResult(
+        score=matched / len(expected) * 100,
+        word_evaluations=word_evaluations,
+        missed_words=missed_words,
+        substitutions=substitutions,
+        deletions=deletions,
+        insertions=len(inserted_words),
+        inserted_words=inserted_words
+    )
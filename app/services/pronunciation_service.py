@@ -6,23 +6,62 @@ Combines Whisper (STT) and Gentle (alignment) to evaluate
 student pronunciation against expected dialogue text.
 
 Flow:
-1. Transcribe student audio with Whisper
-2. Align audio with expected text using Gentle
-3. Calculate score based on aligned words
-4. Generate feedback
+0. Decode the upload once to 16 kHz mono, trim silence and reject empty or
+   too-long recordings (audio_preprocessing)
+1. Transcribe the decoded samples with Whisper and, at the same time, align
+   the WAV of the same samples with the expected text (Gentle or the
+   configured aligner)
+2. Calculate score by aligning the expected words with the aligner output
+   and the transcription (word-level edit distance, pronunciation_scoring)
+3. Generate feedback
+
+Each stage has its own time budget (EVAL_TRANSCRIBE_TIMEOUT,
+EVAL_ALIGN_TIMEOUT). If alignment runs over its budget it is abandoned and
+the score comes from the transcription alone; result.stages and
+result.timings_ms report what happened for monitoring. If neither stage
+produced a result there is nothing to score and PronunciationEvaluationError
+is raised instead of reporting 0%.
 """
 
 import os
 import json
+import time
+import asyncio
 import logging
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from .whisper_service import whisper_service
-from .gentle_service import gentle_service
+from .whisper_pool import WhisperPoolBusy
+from .whisper_batcher import whisper_batcher
+from .audio_preprocessing import preprocess_audio
+from .aligner_service import get_aligner
+from .pronunciation_scoring import ScoringResult, normalize_text, score_pronunciation
 
 logger = logging.getLogger(__name__)
 
+# Per-stage time budgets (seconds), counted from the start of the evaluation
+EVAL_TRANSCRIBE_TIMEOUT = float(os.getenv("EVAL_TRANSCRIBE_TIMEOUT", "30"))
+EVAL_ALIGN_TIMEOUT = float(os.getenv("EVAL_ALIGN_TIMEOUT", "15"))
+
+# Stage outcomes reported in PronunciationResult.stages
+STAGE_OK = "ok"
+STAGE_TIMEOUT = "timeout"
+STAGE_FAILED = "failed"
+
+
+class PronunciationEvaluationError(RuntimeError):
+    """Neither transcription nor alignment produced a result (server side, not the student's fault)"""
+
+    def __init__(self, stages: Dict[str, str]):
+        super().__init__(
+            "Evaluation unavailable: " + ", ".join(f"{name} {status}" for name, status in stages.items())
+        )
+        self.stages = stages
+
+    @property
+    def timed_out(self) -> bool:
+        return STAGE_TIMEOUT in self.stages.values()
+
 
 @dataclass
 class WordEvaluation:
@@ -47,6 +86,18 @@ class PronunciationResult:
     word_evaluations: List[Dict]
     feedback: str
     alignment_data: Optional[Dict] = None
+    # Preprocessed (trimmed 16 kHz WAV) recording the word times refer to
+    audio_path: Optional[str] = None
+    audio_duration_ms: int = 0
+    # Word-level edit operations against the expected text
+    substitutions: int = 0
+    deletions: int = 0
+    insertions: int = 0
+    inserted_words: List[str] = field(default_factory=list)
+    # Outcome per stage ("transcription", "alignment"): ok, timeout or failed
+    stages: Dict[str, str] = field(default_factory=dict)
+    # Wall time per stage plus preprocessing, scoring and total, in milliseconds
+    timings_ms: Dict[str, float] = field(default_factory=dict)
 
 
 class PronunciationService:
@@ -63,9 +114,39 @@ class PronunciationService:
     - Confidence scores for each word
     """
     
-    def __init__(self):
-        self.whisper = whisper_service
-        self.gentle = gentle_service
+    def __init__(
+        self,
+        transcribe_timeout: float = EVAL_TRANSCRIBE_TIMEOUT,
+        align_timeout: float = EVAL_ALIGN_TIMEOUT
+    ):
+        # Inference runs in the Whisper pool, off the event loop; concurrent
+        # evaluations are transcribed together in micro-batches
+        self.whisper = whisper_batcher
+        self.aligner = get_aligner()
+        self.transcribe_timeout = transcribe_timeout
+        self.align_timeout = align_timeout
+    
+    @staticmethod
+    async def _run_stage(name: str, coro, timeout: float) -> tuple:
+        """
+        Await one stage within its budget.
+        
+        Returns:
+            (result or None, stage status, elapsed ms)
+        """
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coro, timeout=timeout)
+            status = STAGE_OK
+        except WhisperPoolBusy:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Evaluation stage '{name}' exceeded its {timeout:g}s budget")
+            result, status = None, STAGE_TIMEOUT
+        except Exception as e:
+            logger.warning(f"Evaluation stage '{name}' failed: {e}")
+            result, status = None, STAGE_FAILED
+        return result, status, round((time.perf_counter() - started) * 1000, 1)
     
     async def evaluate(
         self,
@@ -76,49 +157,73 @@ class PronunciationService:
         Evaluate pronunciation of student audio against expected text.
         
         Args:
-            audio_path: Path to student's recorded audio
+            audio_path: Path to student's recorded audio (any format); the
+                trimmed WAV is written next to it (result.audio_path)
             expected_text: The text the student was supposed to say
             
         Returns:
             PronunciationResult with score, feedback, and word-level details
+        
+        Raises:
+            AudioPreprocessingError: If the recording is undecodable, empty or too long
+            WhisperPoolBusy: If the transcription queue is full
+            PronunciationEvaluationError: If both transcription and alignment
+                timed out or failed
         """
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"Audio file not found: {audio_path}")
         
         logger.info(f"Evaluating pronunciation for: {expected_text[:50]}...")
+        started = time.perf_counter()
+        
+        # Step 0: Decode once; both stages below share the same samples
+        prepared = await asyncio.to_thread(preprocess_audio, audio_path)
+        preprocessing_ms = round((time.perf_counter() - started) * 1000, 1)
         
-        # Step 1: Transcribe with Whisper (what the student actually said)
+        # Step 1: Transcribe with Whisper (what the student actually said) and
+        # align with the configured aligner (audio vs expected text) concurrently
+        transcription_task = asyncio.create_task(self._run_stage(
+            "transcription", self.whisper.transcribe(prepared.samples), self.transcribe_timeout
+        ))
+        alignment_task = asyncio.create_task(self._run_stage(
+            "alignment",
+            self.aligner.align(prepared.path, expected_text, samples=prepared.samples),
+            self.align_timeout
+        ))
         try:
-            transcription_result = self.whisper.transcribe(audio_path)
-            transcription = transcription_result.get("text", "")
-        except Exception as e:
-            logger.error(f"Whisper transcription failed: {e}")
-            transcription = ""
+            (transcription_result, transcription_status, transcription_ms), \
+                (alignment_data, alignment_status, alignment_ms) = await asyncio.gather(
+                    transcription_task, alignment_task
+                )
+        except BaseException:
+            # Queue full (503) or request cancelled: don't leave the other stage running
+            transcription_task.cancel()
+            alignment_task.cancel()
+            raise
         
-        # Step 2: Align with Gentle (compare audio to expected text)
-        alignment_data = None
-        aligned_words = []
+        stages = {"transcription": transcription_status, "alignment": alignment_status}
+        if transcription_status != STAGE_OK and alignment_status != STAGE_OK:
+            # Scoring would see no speech at all and report 0%
+            logger.error(f"Pronunciation evaluation unavailable: {stages}")
+            if os.path.exists(prepared.path):
+                os.remove(prepared.path)
+            raise PronunciationEvaluationError(stages)
         
-        try:
-            alignment_data = await self.gentle.align_audio_with_transcript(
-                audio_path,
-                expected_text
-            )
-            aligned_words = alignment_data.get("words", [])
-        except Exception as e:
-            logger.warning(f"Gentle alignment failed, using simple comparison: {e}")
+        transcription = (transcription_result or {}).get("text", "")
+        aligned_words = (alignment_data or {}).get("words", [])
+        if alignment_status != STAGE_OK:
+            logger.warning(f"Alignment {alignment_status}, scoring from the transcription only")
         
-        # Step 3: Calculate score
-        score, word_evaluations, missed_words = self._calculate_score(
-            expected_text,
-            aligned_words,
-            transcription
-        )
+        # Step 2: Calculate score
+        scoring_started = time.perf_counter()
+        scoring = self._calculate_score(expected_text, aligned_words, transcription)
+        score, word_evaluations, missed_words = scoring.score, scoring.word_evaluations, scoring.missed_words
+        scoring_ms = round((time.perf_counter() - scoring_started) * 1000, 1)
         
-        # Step 4: Generate feedback
+        # Step 3: Generate feedback
         feedback = self._generate_feedback(score, missed_words, word_evaluations)
         
-        # Step 5: Build result
+        # Step 4: Build result
         result = PronunciationResult(
             score=round(score, 1),
             transcription=transcription,
@@ -128,7 +233,21 @@ class PronunciationService:
             missed_words=missed_words,
             word_evaluations=word_evaluations,
             feedback=feedback,
-            alignment_data=alignment_data
+            alignment_data=alignment_data,
+            audio_path=prepared.path,
+            audio_duration_ms=prepared.duration_ms,
+            substitutions=scoring.substitutions,
+            deletions=scoring.deletions,
+            insertions=scoring.insertions,
+            inserted_words=scoring.inserted_words,
+            stages=stages,
+            timings_ms={
+                "preprocessing": preprocessing_ms,
+                "transcription": transcription_ms,
+                "alignment": alignment_ms,
+                "scoring": scoring_ms,
+                "total": round((time.perf_counter() - started) * 1000, 1)
+            }
         )
         
         logger.info(f"Pronunciation evaluation complete: {result.score}% ({result.matched_words}/{result.word_count} words)")
@@ -140,104 +259,12 @@ class PronunciationService:
         expected_text: str,
         aligned_words: List[Dict],
         transcription: str
-    ) -> tuple:
+    ) -> ScoringResult:
         """
-        Calculate pronunciation score based on alignment results.
-        
-        Returns:
-            (score, word_evaluations, missed_words)
+        Calculate pronunciation score by aligning the expected words with the
+        aligner output and the transcription (see pronunciation_scoring).
         """
-        expected_words = self._normalize_text(expected_text).split()
-        
-        if not expected_words:
-            return 100.0, [], []
-        
-        word_evaluations = []
-        missed_words = []
-        matched_count = 0
-        
-        if aligned_words:
-            # Use Gentle alignment results
-            aligned_word_texts = [
-                self._normalize_text(w.get("word", "")) 
-                for w in aligned_words 
-                if w.get("case") == "success"
-            ]
-            
-            for expected_word in expected_words:
-                normalized_expected = self._normalize_text(expected_word)
-                
-            # Prepare transcribed words for fallback lookup
-            transcribed_words = set(self._normalize_text(transcription).split())
-            
-            for expected_word in expected_words:
-                normalized_expected = self._normalize_text(expected_word)
-                
-                # Check 1: Is it in Gentle's aligned words? (High Precision)
-                matched_alignment = normalized_expected in aligned_word_texts
-                
-                # Check 2: Is it in Whisper's raw transcription? (Recall)
-                # Only check if alignment failed
-                matched_transcription = False
-                if not matched_alignment:
-                     matched_transcription = normalized_expected in transcribed_words
-                
-                matched = matched_alignment or matched_transcription
-                
-                # Find alignment data for this word if available
-                word_data = next(
-                    (w for w in aligned_words 
-                     if self._normalize_text(w.get("word", "")) == normalized_expected),
-                    None
-                )
-                
-                if matched:
-                    matched_count += 1
-                    confidence = 0.8 # Default for transcription match
-                    if matched_alignment and word_data:
-                        confidence = word_data.get("confidence", 0.9)
-                        
-                    word_evaluations.append({
-                        "word": expected_word,
-                        "matched": True,
-                        "confidence": confidence,
-                        "start_ms": word_data.get("start") if word_data else None,
-                        "end_ms": word_data.get("end") if word_data else None
-                    })
-                else:
-                    missed_words.append(expected_word)
-                    word_evaluations.append({
-                        "word": expected_word,
-                        "matched": False,
-                        "confidence": 0.0
-                    })
-        else:
-            # Fallback: Simple word matching with transcription
-            transcribed_words = self._normalize_text(transcription).split()
-            
-            for expected_word in expected_words:
-                normalized = self._normalize_text(expected_word)
-                matched = normalized in transcribed_words
-                
-                if matched:
-                    matched_count += 1
-                    word_evaluations.append({
-                        "word": expected_word,
-                        "matched": True,
-                        "confidence": 0.8
-                    })
-                else:
-                    missed_words.append(expected_word)
-                    word_evaluations.append({
-                        "word": expected_word,
-                        "matched": False,
-                        "confidence": 0.0
-                    })
-        
-        # Calculate score percentage
-        score = (matched_count / len(expected_words)) * 100 if expected_words else 100.0
-        
-        return score, word_evaluations, missed_words
+        return score_pronunciation(expected_text, aligned_words, transcription)
     
     def _generate_feedback(
         self,
@@ -266,13 +293,7 @@ class PronunciationService:
     
     def _normalize_text(self, text: str) -> str:
         """Normalize text for comparison"""
-        import re
-        if not text:
-            return ""
-        text = text.lower().strip()
-        text = re.sub(r'[^\w\s]', '', text)
-        text = re.sub(r'\s+', ' ', text)
-        return text
+        return normalize_text(text)
     
     def evaluate_sync(
         self,
@@ -0,0 +1,123 @@
+"""
+Caché versionada para datos de referencia (géneros, editoriales, autores y
+asociaciones módulo-libro).
+
+Cada espacio de nombres tiene un número de versión en la tabla
+cache_versiones (migrations/create_cache_versiones.sql). Las escrituras llaman
+a bump_version() antes de su db.commit(), de modo que la versión cambia en la
+misma transacción que los datos y es visible para todos los workers.
+
+Las lecturas solo consultan la versión (una fila por clave primaria):
+  - si el cliente envía If-None-Match con el ETag vigente -> 304 sin cuerpo
+  - si el cuerpo de esa versión ya está serializado en memoria -> se reutiliza
+  - en otro caso se ejecuta la consulta y se guarda el JSON resultante
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+GENEROS = "generos"
+EDITORIALES = "editoriales"
+AUTORES = "autores"
+MODULO_LIBROS = "modulo_libros"
+
+MAX_AGE = int(os.getenv("REFERENCE_CACHE_MAX_AGE", "60"))
+MAX_ENTRIES = int(os.getenv("REFERENCE_CACHE_MAX_ENTRIES", "256"))
+
+_bodies: "OrderedDict[tuple, bytes]" = OrderedDict()
+_lock = threading.Lock()
+_adapters: dict = {}
+
+
+def bump_version(db: Session, *namespaces: str) -> None:
+    """Incrementa la versión de los espacios indicados (sin hacer commit)."""
+    for namespace in namespaces:
+        db.execute(text("""
+            INSERT INTO cache_versiones (nombre, version, updated_at)
+            VALUES (:nombre, 1, NOW())
+            ON CONFLICT (nombre) DO UPDATE
+            SET version = cache_versiones.version + 1, updated_at = NOW()
+        """), {"nombre": namespace})
+
+
+def get_version(db: Session, namespace: str) -> int:
+    version = db.execute(
+        text("SELECT version FROM cache_versiones WHERE nombre = :nombre"),
+        {"nombre": namespace}
+    ).scalar()
+    return version or 0
+
+
+def _adapter(schema):
+    adapter = _adapters.get(schema)
+    if adapter is None:
+        adapter = _adapters[schema] = TypeAdapter(schema)
+    return adapter
+
+
+def _get_body(key: tuple) -> Optional[bytes]:
+    with _lock:
+        body = _bodies.get(key)
+        if body is not None:
+            _bodies.move_to_end(key)
+        return body
+
+
+def _put_body(key: tuple, body: bytes) -> None:
+    with _lock:
+        _bodies[key] = body
+        _bodies.move_to_end(key)
+        while len(_bodies) > MAX_ENTRIES:
+            _bodies.popitem(last=False)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [value.strip() for value in header.split(",")]
+
+
+def cached_response(request: Request, db: Session, namespace: str, schema: Any,
+                    loader: Callable[[], Any], **params) -> Response:
+    """
+    Respuesta JSON de `loader()` serializada con `schema`, con ETag y
+    Cache-Control privado (los endpoints requieren autenticación, así que
+    los proxies compartidos no deben guardarla). `params` son los parámetros de la consulta que forman
+    parte de la clave (paginación, filtros, ids).
+    """
+    version = get_version(db, namespace)
+    key_params = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    digest = hashlib.sha1(key_params.encode()).hexdigest()[:12]
+    etag = f'"{namespace}-{version}-{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={MAX_AGE}, must-revalidate",
+    }
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (namespace, version, key_params)
+    body = _get_body(key)
+    if body is None:
+        body = _adapter(schema).dump_json(loader())
+        _put_body(key, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def clear() -> None:
+    """Vacía los cuerpos en memoria (las versiones en la base de datos se mantienen)."""
+    with _lock:
+        _bodies.clear()
@@ -0,0 +1,153 @@
+"""
+Codificación Compacta de Timestamps
+===================================
+
+Formato alternativo a timestamps_json para clientes móviles. En lugar de un
+objeto por palabra se envía un arreglo posicional:
+
+    [version, duration_ms, tabla, indices, inicios, duraciones, confianzas]
+
+  - tabla:      palabras distintas (con sus saltos de línea), en orden de aparición
+  - indices:    posición en la tabla de cada palabra del texto
+  - inicios:    delta del inicio respecto a la palabra anterior (la primera es absoluta)
+  - duraciones: end - start de cada palabra
+  - confianzas: confianza * 100 redondeada (enteros 0-100)
+
+Todos los números son enteros pequeños, así que el JSON resultante es varias
+veces menor y comprime mejor. La versión gzip se calcula al guardar los
+timestamps (columna audio_lessons.timestamps_compact) y se sirve tal cual.
+
+Tipos de contenido (negociados por Accept):
+  - application/json                              -> formato actual (default)
+  - application/vnd.audio-timestamps.packed+json  -> arreglo compacto
+  - application/x-msgpack                         -> arreglo compacto en MessagePack
+"""
+
+import gzip
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+MEDIA_TYPE_JSON = "application/json"
+MEDIA_TYPE_PACKED = "application/vnd.audio-timestamps.packed+json"
+MEDIA_TYPE_MSGPACK = "application/x-msgpack"
+
+
+def pack(data: Dict[str, Any]) -> List[Any]:
+    """Convierte {"words": [...], "duration_ms"} al arreglo compacto."""
+    table: List[str] = []
+    positions: Dict[str, int] = {}
+    indices: List[int] = []
+    starts: List[int] = []
+    lengths: List[int] = []
+    confidences: List[int] = []
+
+    previous_start = 0
+    for w in data.get("words", []):
+        word = w.get("word", "")
+        if word not in positions:
+            positions[word] = len(table)
+            table.append(word)
+        indices.append(positions[word])
+
+        start = int(w.get("start", 0))
+        end = int(w.get("end", start))
+        starts.append(start - previous_start)
+        lengths.append(end - start)
+        confidences.append(int(round(float(w.get("confidence", 0)) * 100)))
+        previous_start = start
+
+    return [FORMAT_VERSION, int(data.get("duration_ms", 0)), table, indices, starts, lengths, confidences]
+
+
+def unpack(packed: List[Any]) -> Dict[str, Any]:
+    """Inverso de pack(); la confianza vuelve con dos decimales."""
+    version, duration_ms, table, indices, starts, lengths, confidences = packed
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported timestamps format version: {version}")
+
+    words = []
+    start = 0
+    for idx, delta, length, confidence in zip(indices, starts, lengths, confidences):
+        start += delta
+        words.append({
+            "word": table[idx],
+            "start": start,
+            "end": start + length,
+            "confidence": confidence / 100
+        })
+    return {"words": words, "duration_ms": duration_ms}
+
+
+def dumps_packed(data: Dict[str, Any]) -> bytes:
+    return json.dumps(pack(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compress(data: Dict[str, Any]) -> bytes:
+    """Arreglo compacto en JSON, comprimido con gzip (lo que se guarda en la base)."""
+    return gzip.compress(dumps_packed(data), compresslevel=9, mtime=0)
+
+
+def packed_from_compact(compact: bytes) -> List[Any]:
+    return json.loads(gzip.decompress(compact))
+
+
+def to_msgpack(packed: List[Any]) -> Optional[bytes]:
+    """MessagePack del arreglo compacto, o None si msgpack no está instalado."""
+    try:
+        import msgpack
+    except ImportError:
+        logger.warning("msgpack not installed. Run: pip install msgpack")
+        return None
+    return msgpack.packb(packed, use_bin_type=True)
+
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Elige el formato según el encabezado Accept. Solo se usa un formato
+    compacto si el cliente lo pide explícitamente (y con q > 0); si no, JSON.
+    """
+    if not accept:
+        return MEDIA_TYPE_JSON
+
+    best, best_q = MEDIA_TYPE_JSON, 0.0
+    for item in accept.split(","):
+        media_type, _, params = item.strip().partition(";")
+        media_type = media_type.strip().lower()
+        if media_type not in (MEDIA_TYPE_PACKED, MEDIA_TYPE_MSGPACK):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type == MEDIA_TYPE_MSGPACK and not msgpack_available():
+            continue
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
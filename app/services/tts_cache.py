@@ -0,0 +1,331 @@
+"""
+Caché de Audio TTS
+==================
+
+Un solo caché, direccionado por contenido, para todo el audio sintetizado
+(líneas de diálogo y generate_audio). La clave es:
+
+    SHA-256(versión, voz, velocidad, texto normalizado)
+
+así que una frase repetida en varios diálogos se sintetiza una sola vez, y
+cambiar el texto o la voz de una línea produce otra clave: nunca se sirve un
+audio viejo por tener la misma ruta. Cada entrada son dos archivos:
+
+    <dir>/ab/<clave>.mp3    audio
+    <dir>/ab/<clave>.json   voz, velocidad, texto y límites de palabra (alignment_json)
+
+Invalidación:
+  - TTS_CACHE_VERSION forma parte de la clave: subirla descarta todo el caché
+    (p. ej. si Microsoft cambia las voces)
+  - invalidate(voz, velocidad, texto) borra una entrada (generate-audio?force=true)
+  - entradas incompletas o corruptas (mp3 vacío, json ilegible) cuentan como
+    fallo y se borran
+
+El tamaño total está acotado (TTS_CACHE_MAX_MB) y se expulsan primero las
+entradas usadas hace más tiempo (LRU por mtime), como en alignment_cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = os.getenv("TTS_CACHE_VERSION", "1")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Forma Unicode y espacios; mayúsculas y puntuación se conservan (cambian la entonación)."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(voice: str, rate: str, text: str) -> str:
+    content = f"{CACHE_VERSION}\n{voice}\n{rate}\n{normalize_text(text)}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Caché en disco de audio TTS, acotado por tamaño, con métricas de aciertos."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("TTS_CACHE_DIR", "uploads/cache/tts"))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.getenv("TTS_CACHE_MAX_MB", "500")) * 1024 * 1024)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        # Una sola síntesis por clave aunque varias líneas pidan la misma frase a la vez
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def audio_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.mp3"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _entries(self) -> List[Path]:
+        if not self.cache_dir.exists():
+            return []
+        return [p for p in self.cache_dir.glob("*/*.mp3") if p.is_file()]
+
+    def _entry_size(self, audio_path: Path) -> int:
+        size = 0
+        for p in (audio_path, audio_path.with_suffix(".json")):
+            try:
+                size += p.stat().st_size
+            except OSError:
+                pass
+        return size
+
+    def _ensure_size(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(self._entry_size(p) for p in self._entries())
+        return self._total_bytes
+
+    # ==================== Lectura ====================
+
+    def get(self, voice: str, rate: str, text: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Returns:
+            (ruta del mp3, límites de palabra) o None si no está en caché
+        """
+        key = make_key(voice, rate, text)
+        audio_path = self.audio_path(key)
+        try:
+            if audio_path.stat().st_size == 0:
+                raise ValueError("empty audio")
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(audio_path)  # marca de uso para el LRU
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding broken TTS cache entry {key[:12]}: {e}")
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return str(audio_path), meta.get("boundaries", [])
+
+    # ==================== Escritura ====================
+
+    async def get_or_create(
+        self,
+        voice: str,
+        rate: str,
+        text: str,
+        synthesize: Callable[[str], Awaitable[List[Dict[str, Any]]]]
+    ) -> Tuple[str, List[Dict[str, Any]], bool]:
+        """
+        Devuelve el audio de (voz, velocidad, texto), sintetizándolo si falta.
+
+        Args:
+            synthesize: corrutina que escribe el mp3 en la ruta recibida y
+                devuelve los límites de palabra
+
+        Returns:
+            (ruta del mp3, límites de palabra, True si vino del caché)
+        """
+        cached = self.get(voice, rate, text)
+        if cached:
+            return cached[0], cached[1], True
+
+        key = make_key(voice, rate, text)
+        pending = self._inflight.get(key)
+        if pending:
+            try:
+                path, boundaries = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # Se canceló la síntesis de otra petición (p. ej. por timeout): intentar aquí
+                return await self.get_or_create(voice, rate, text, synthesize)
+            with self._lock:
+                # La petición que esperaba contó un fallo; en realidad fue un acierto
+                self.misses -= 1
+                self.hits += 1
+            return path, boundaries, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._create(key, voice, rate, text, synthesize)
+            future.set_result(result)
+            return result[0], result[1], False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el aviso "exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _create(
+        self,
+        key: str,
+        voice: str,
+        rate: str,
+        text: str,
+        synthesize: Callable[[str], Awaitable[List[Dict[str, Any]]]]
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        audio_path = self.audio_path(key)
+        audio_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = audio_path.with_name(f".{key}.{uuid.uuid4().hex}.part")
+        try:
+            boundaries = await synthesize(str(tmp_path))
+            if not tmp_path.exists() or tmp_path.stat().st_size == 0:
+                raise RuntimeError("TTS produced no audio")
+            self.store(key, tmp_path, voice, rate, text, boundaries)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return str(audio_path), boundaries
+
+    def store(
+        self,
+        key: str,
+        audio_file: Path,
+        voice: str,
+        rate: str,
+        text: str,
+        boundaries: List[Dict[str, Any]]
+    ) -> None:
+        """Mueve `audio_file` al caché junto con sus metadatos."""
+        audio_path = self.audio_path(key)
+        meta_path = self._meta_path(key)
+        meta = json.dumps({
+            "voice": voice,
+            "rate": rate,
+            "text": normalize_text(text),
+            "boundaries": boundaries
+        }, ensure_ascii=False).encode("utf-8")
+
+        previous = self._entry_size(audio_path)
+        tmp_meta = meta_path.with_name(f".{key}.{uuid.uuid4().hex}.json.part")
+        with open(tmp_meta, "wb") as f:
+            f.write(meta)
+        # Primero los metadatos: un mp3 sin json se trata como entrada rota
+        os.replace(tmp_meta, meta_path)
+        os.replace(audio_file, audio_path)
+
+        with self._lock:
+            self.stores += 1
+            self._total_bytes = self._ensure_size() + self._entry_size(audio_path) - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=audio_path)
+
+    def update_boundaries(self, voice: str, rate: str, text: str, boundaries: List[Dict[str, Any]]) -> None:
+        """Guarda límites de palabra obtenidos después (p. ej. alineando con Gentle)."""
+        key = make_key(voice, rate, text)
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["boundaries"] = boundaries
+            tmp_meta = meta_path.with_name(f".{key}.{uuid.uuid4().hex}.json.part")
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, meta_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not update TTS cache entry {key[:12]}: {e}")
+
+    # ==================== Invalidación y expulsión ====================
+
+    def _remove(self, key: str) -> int:
+        audio_path = self.audio_path(key)
+        freed = self._entry_size(audio_path)
+        for p in (audio_path, self._meta_path(key)):
+            p.unlink(missing_ok=True)
+        return freed
+
+    def invalidate(self, voice: str, rate: str, text: str) -> bool:
+        """Borra la entrada de (voz, velocidad, texto). Devuelve True si existía."""
+        key = make_key(voice, rate, text)
+        existed = self.audio_path(key).exists()
+        freed = self._remove(key)
+        with self._lock:
+            if existed:
+                self.invalidations += 1
+            if self._total_bytes is not None:
+                self._total_bytes = max(self._total_bytes - freed, 0)
+        return existed
+
+    def clear(self) -> int:
+        """Borra todo el caché. Devuelve el número de entradas borradas."""
+        removed = 0
+        with self._lock:
+            for p in self._entries():
+                p.unlink(missing_ok=True)
+                p.with_suffix(".json").unlink(missing_ok=True)
+                removed += 1
+            self._total_bytes = 0
+            self.invalidations += removed
+        return removed
+
+    def _evict(self, keep: Optional[Path] = None) -> None:
+        """Elimina las entradas menos usadas hasta quedar al 90% del límite."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self._entries():
+            try:
+                entries.append((p.stat().st_mtime, self._entry_size(p), p))
+            except OSError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            if p == keep:
+                continue
+            try:
+                p.unlink()
+                p.with_suffix(".json").unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries()),
+                "size_bytes": self._ensure_size(),
+                "max_bytes": self.max_bytes
+            }
+
+
+# Instancia global del caché
+tts_cache = TTSCache()
@@ -5,6 +5,15 @@ Text-to-Speech Service using Edge TTS (Free)
 Uses Microsoft Edge's TTS service via edge-tts library.
 Completely free, high quality voices, multiple languages.
 
+Dialogue lines get their word timings (alignment_json) from the WordBoundary
+events Edge TTS sends while streaming the audio; Gentle is only used when the
+stream carries no boundaries.
+
+All synthesized audio goes through the content-addressed TTS cache
+(app/services/tts_cache.py), keyed by voice, rate and normalized text: a
+phrase shared by several dialogues is synthesized once, and editing a line's
+text or voice can never return the old audio.
+
 Installation:
     pip install edge-tts
 
@@ -16,15 +25,24 @@ Available American English voices:
 """
 
 import os
+import time
+import json
 import asyncio
 import logging
-import hashlib
-import re
-from typing import Optional
+from dataclasses import dataclass
+from typing import List, Optional
 from pathlib import Path
 
+import aiofiles
+
+from app.services.tts_cache import tts_cache, make_key
+
 logger = logging.getLogger(__name__)
 
+# Batch generation of dialogue lines
+DIALOGUE_TTS_CONCURRENCY = int(os.getenv("DIALOGUE_TTS_CONCURRENCY", "4"))
+DIALOGUE_TTS_LINE_TIMEOUT = float(os.getenv("DIALOGUE_TTS_LINE_TIMEOUT", "60"))
+
 # Voice mapping
 VOICES = {
     ("male", "en-US"): "en-US-GuyNeural",
@@ -33,10 +51,46 @@ VOICES = {
     ("female", "en-GB"): "en-GB-SoniaNeural",
 }
 
-# Default paths
+# Speaking rate used for dialogue lines
+DIALOGUE_RATE = "+0%"
+
+# Where a line's word boundaries came from (DialogueLineAudioResult.alignment)
+ALIGNMENT_CAPTURED = "captured"  # streamed by Edge TTS
+ALIGNMENT_ALIGNED = "aligned"    # Gentle fallback
+ALIGNMENT_NONE = "none"          # no word highlighting
+
+# Legacy output directory (md5 files and dialogue_{id}/line_{id}.mp3),
+# superseded by the TTS cache; `audio_storage.py tts-cache --purge-legacy` cleans it
 DIALOGUE_AUDIO_DIR = "uploads/dialogues/tts"
 
 
+@dataclass
+class DialogueLineAudioRequest:
+    """One line to synthesize in a batch"""
+    line_id: int
+    text: str
+    gender: str
+    accent: str
+
+
+@dataclass
+class DialogueLineAudioResult:
+    """Outcome of one line in a batch (audio_path is None on failure)"""
+    line_id: int
+    signature: str
+    audio_path: Optional[str] = None
+    alignment_json: Optional[str] = None
+    error: Optional[str] = None
+    timed_out: bool = False
+    cached: bool = False
+    alignment: str = ALIGNMENT_NONE
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.audio_path is not None
+
+
 class TTSService:
     """
     Text-to-Speech service using Edge TTS (free).
@@ -46,31 +100,20 @@ class TTSService:
         audio_path = await service.generate_audio("Hello, how are you?", "female", "en-US")
     """
     
-    def __init__(self, output_dir: str = DIALOGUE_AUDIO_DIR):
+    def __init__(self, cache=tts_cache):
         """
         Initialize TTS service.
         
         Args:
-            output_dir: Directory to store generated audio files
+            cache: TTSCache where generated audio files are stored
         """
-        self.output_dir = output_dir
-        self._ensure_output_dir()
-    
-    def _ensure_output_dir(self):
-        """Create output directory if it doesn't exist"""
-        os.makedirs(self.output_dir, exist_ok=True)
+        self.cache = cache
     
     def _get_voice(self, gender: str, accent: str) -> str:
         """Get voice name from gender and accent"""
         key = (gender.lower(), accent)
         return VOICES.get(key, VOICES[("female", "en-US")])
     
-    def _get_cache_filename(self, text: str, voice: str) -> str:
-        """Generate cache filename based on text and voice"""
-        content = f"{voice}:{text}"
-        hash_value = hashlib.md5(content.encode()).hexdigest()[:12]
-        return f"{hash_value}.mp3"
-    
     async def generate_audio(
         self,
         text: str,
@@ -87,34 +130,17 @@ class TTSService:
             gender: Voice gender ("male" or "female")
             accent: Voice accent ("en-US" or "en-GB")
             rate: Speaking rate adjustment (e.g., "+10%", "-10%")
-            use_cache: Use cached audio if available
+            use_cache: Use cached audio if available (False synthesizes again
+                and replaces the cache entry)
             
         Returns:
-            Path to generated audio file (relative to uploads/)
+            Path to the audio file in the TTS cache
         """
-        try:
-            import edge_tts
-        except ImportError:
-            raise ImportError("edge-tts is required. Install with: pip install edge-tts")
-        
         voice = self._get_voice(gender, accent)
-        filename = self._get_cache_filename(text, voice)
-        output_path = os.path.join(self.output_dir, filename)
-        
-        # Check cache
-        if use_cache and os.path.exists(output_path):
-            logger.debug(f"Using cached TTS audio: {filename}")
-            return output_path
-        
-        logger.info(f"Generating TTS audio with voice '{voice}': {text[:50]}...")
         
         try:
-            communicate = edge_tts.Communicate(text, voice, rate=rate)
-            await communicate.save(output_path)
-            
-            logger.info(f"TTS audio generated: {output_path}")
+            output_path, _, _ = await self._cached_audio(text, voice, rate, refresh=not use_cache)
             return output_path
-            
         except Exception as e:
             logger.error(f"TTS generation error: {e}")
             raise
@@ -132,14 +158,121 @@ class TTSService:
         """
         return asyncio.run(self.generate_audio(text, gender, accent, rate, use_cache))
     
+    @staticmethod
+    def _communicate(text: str, voice: str, rate: str = "+0%"):
+        """edge_tts.Communicate reporting word boundaries (edge-tts 7 defaults to sentences)"""
+        import edge_tts
+        try:
+            return edge_tts.Communicate(text, voice, rate=rate, boundary="WordBoundary")
+        except TypeError:
+            # edge-tts < 7 has no `boundary` option and always sends WordBoundary
+            return edge_tts.Communicate(text, voice, rate=rate)
+    
+    async def _cached_audio(
+        self,
+        text: str,
+        voice: str,
+        rate: str = "+0%",
+        refresh: bool = False,
+        align_fallback: bool = False
+    ) -> tuple:
+        """
+        Audio for (voice, rate, text) from the TTS cache, synthesizing it on a miss.
+        
+        Args:
+            refresh: Drop the cached entry first and synthesize again
+            align_fallback: Align with Gentle when Edge TTS sends no word boundaries
+            
+        Returns:
+            (audio path, word boundaries, True if served from the cache)
+        """
+        try:
+            import edge_tts  # noqa: F401
+        except ImportError:
+            raise ImportError("edge-tts is required. Install with: pip install edge-tts")
+        
+        if refresh:
+            self.cache.invalidate(voice, rate, text)
+        
+        async def synthesize(output_path: str) -> list:
+            logger.info(f"Generating TTS audio with voice '{voice}': {text[:50]}...")
+            # Single pass: write the audio and collect the word boundaries
+            # Edge TTS reports while synthesizing
+            boundaries = await self._stream_to_file(text, voice, output_path, rate)
+            if boundaries:
+                logger.info(f"Captured {len(boundaries)} word boundaries from Edge TTS")
+            elif align_fallback:
+                boundaries = await self._align_with_gentle(output_path, text)
+            return boundaries
+        
+        return await self.cache.get_or_create(voice, rate, text, synthesize)
+    
+    @staticmethod
+    async def _align_with_gentle(audio_path: str, text: str) -> list:
+        """Word boundaries for `audio_path` from Gentle (empty list if it fails)"""
+        from app.services.aligner_service import get_aligner
+        
+        alignment_data = []
+        try:
+            # Gentle provides word-level timestamps
+            gentle_result = await get_aligner().align(audio_path, text)
+            
+            # Convert Gentle format to our WordBoundary format
+            for word_data in gentle_result.get("words", []):
+                alignment_data.append({
+                    "type": "WordBoundary",
+                    "offset": word_data["start"] * 10000,  # Convert ms to 100-nanosecond units
+                    "duration": (word_data["end"] - word_data["start"]) * 10000,
+                    "text": word_data["word"].strip(),
+                    "source": "gentle"
+                })
+            
+            logger.info(f"Aligned {len(alignment_data)} words using Gentle")
+            
+        except Exception as e:
+            logger.warning(f"Gentle alignment failed: {e}. Audio will play without word highlighting.")
+        return alignment_data
+    
+    async def _stream_to_file(self, text: str, voice: str, output_path: str, rate: str = "+0%") -> list:
+        """
+        Stream the synthesized audio to `output_path` and return the word
+        boundaries in alignment_json format (offset/duration in 100-ns units).
+        """
+        boundaries = []
+        async with aiofiles.open(output_path, "wb") as f:
+            async for chunk in self._communicate(text, voice, rate).stream():
+                if chunk["type"] == "audio":
+                    await f.write(chunk["data"])
+                elif chunk["type"] == "WordBoundary":
+                    boundaries.append({
+                        "type": "WordBoundary",
+                        "offset": chunk["offset"],
+                        "duration": chunk["duration"],
+                        "text": chunk["text"]
+                    })
+        return boundaries
+    
+    @staticmethod
+    def alignment_source(boundaries: list) -> str:
+        """captured, aligned or none, from the boundaries stored for a line"""
+        if not boundaries:
+            return ALIGNMENT_NONE
+        return ALIGNMENT_ALIGNED if boundaries[0].get("source") == "gentle" else ALIGNMENT_CAPTURED
+    
+    def line_signature(self, text: str, gender: str, accent: str) -> str:
+        """Identifies the audio a line should have: its TTS cache key, which
+        changes when the text or voice changes"""
+        return make_key(self._get_voice(gender, accent), DIALOGUE_RATE, text)
+    
     async def generate_dialogue_audio(
         self,
         dialogue_id: int,
         line_id: int,
         text: str,
         gender: str,
-        accent: str
-    ) -> str:
+        accent: str,
+        overwrite: bool = False
+    ) -> tuple:
         """
         Generate audio for a specific dialogue line.
         
@@ -149,63 +282,82 @@ class TTSService:
             text: Text to speak
             gender: Voice gender
             accent: Voice accent
+            overwrite: Synthesize again even if the TTS cache has this text and voice
             
         Returns:
-            Relative path to audio file
+            (path to the audio file in the TTS cache, alignment_json)
         """
-        # Use dialogue-specific subdirectory
-        dialogue_dir = os.path.join(self.output_dir, f"dialogue_{dialogue_id}")
-        os.makedirs(dialogue_dir, exist_ok=True)
-        
-        filename = f"line_{line_id}.mp3"
-        output_path = os.path.join(dialogue_dir, filename)
-        
-        # Check if already exists
-        if os.path.exists(output_path):
-            logger.debug(f"Dialogue audio already exists: {output_path}")
-            return output_path, None
-        
+        output_path, alignment_data, _ = await self._dialogue_line_audio(text, gender, accent, overwrite)
+        logger.info(
+            f"Dialogue {dialogue_id} line {line_id}: {output_path} "
+            f"with {len(alignment_data)} words aligned"
+        )
+        return output_path, json.dumps(alignment_data)
+    
+    async def _dialogue_line_audio(self, text: str, gender: str, accent: str, overwrite: bool = False) -> tuple:
+        voice = self._get_voice(gender, accent)
         try:
-            import edge_tts
-            import json
-            from app.services.gentle_service import gentle_service
-            
-            voice = self._get_voice(gender, accent)
-            communicate = edge_tts.Communicate(text, voice)
-            
-            # Generate audio file
-            await communicate.save(output_path)
-            
-            # Use Gentle to align the text with the generated audio
-            alignment_data = []
-            try:
-                # Gentle provides word-level timestamps
-                gentle_result = await gentle_service.align_audio_with_transcript(output_path, text)
-                
-                # Convert Gentle format to our WordBoundary format
-                for word_data in gentle_result.get("words", []):
-                    alignment_data.append({
-                        "type": "WordBoundary",
-                        "offset": word_data["start"] * 10000,  # Convert ms to 100-nanosecond units
-                        "duration": (word_data["end"] - word_data["start"]) * 10000,
-                        "text": word_data["word"].strip()
-                    })
-                
-                logger.info(f"Aligned {len(alignment_data)} words using Gentle")
-                
-            except Exception as e:
-                print(f"GENTLE ERROR: {e}")
-                import traceback
-                traceback.print_exc()
-                logger.warning(f"Gentle alignment failed: {e}. Audio will play without word highlighting.")
-
-            logger.info(f"Generated dialogue audio: {output_path} with {len(alignment_data)} words aligned")
-            return output_path, json.dumps(alignment_data)
-            
+            return await self._cached_audio(
+                text, voice, DIALOGUE_RATE, refresh=overwrite, align_fallback=True
+            )
         except Exception as e:
             logger.error(f"Error generating dialogue audio: {e}")
             raise
     
+    async def generate_dialogue_batch(
+        self,
+        dialogue_id: int,
+        lines: List[DialogueLineAudioRequest],
+        concurrency: int = DIALOGUE_TTS_CONCURRENCY,
+        line_timeout: float = DIALOGUE_TTS_LINE_TIMEOUT,
+        overwrite: bool = False
+    ) -> List[DialogueLineAudioResult]:
+        """
+        Synthesize several dialogue lines in parallel.
+        
+        At most `concurrency` lines are synthesized/aligned at once and each
+        line gets `line_timeout` seconds. A failing or slow line does not stop
+        the others: its result carries the error instead of an audio path.
+        Lines already in the TTS cache (same text and voice, possibly from
+        another dialogue) are not synthesized again unless `overwrite`.
+        
+        Returns:
+            One result per requested line, in the same order
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run(request: DialogueLineAudioRequest) -> DialogueLineAudioResult:
+            result = DialogueLineAudioResult(
+                line_id=request.line_id,
+                signature=self.line_signature(request.text, request.gender, request.accent)
+            )
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result.audio_path, alignment_data, result.cached = await asyncio.wait_for(
+                        self._dialogue_line_audio(
+                            request.text, request.gender, request.accent, overwrite
+                        ),
+                        timeout=line_timeout
+                    )
+                    result.alignment_json = json.dumps(alignment_data)
+                    result.alignment = self.alignment_source(alignment_data)
+                except asyncio.TimeoutError:
+                    result.timed_out = True
+                    result.error = f"Timed out after {line_timeout:.0f}s"
+                except Exception as e:
+                    result.error = str(e) or type(e).__name__
+                result.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            
+            if result.error:
+                logger.error(
+                    f"Dialogue {dialogue_id}: failed to generate audio for line "
+                    f"{request.line_id}: {result.error}"
+                )
+            return result
+        
+        return list(await asyncio.gather(*(run(line) for line in lines)))
+    
     @staticmethod
     def list_available_voices() -> dict:
         """Return available voice options"""
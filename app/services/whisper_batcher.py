@@ -0,0 +1,266 @@
+"""
+Micro-lotes de Transcripción con Whisper
+========================================
+
+En clase, decenas de estudiantes envían grabaciones cortas a
+/dialogues/{id}/evaluate casi a la vez. Transcribirlas una por una deja al
+modelo procesando un audio de 3 segundos por llamada. Este planificador
+junta las peticiones que llegan dentro de WHISPER_BATCH_MAX_WAIT_MS (o hasta
+WHISPER_BATCH_MAX_SIZE) y las transcribe en una sola llamada al
+BatchedInferencePipeline de faster-whisper, dentro del pool de Whisper:
+
+    result = await whisper_batcher.transcribe(audio_path)
+    result = await whisper_batcher.transcribe(prepared.samples)  # ya decodificado
+
+Cómo se arma el lote: cada grabación se decodifica a 16 kHz (salvo que ya
+llegue decodificada por audio_preprocessing), se concatenan
+todas en un solo arreglo y se pasa clip_timestamps con el tramo de cada una.
+El pipeline codifica los tramos como un lote (uno por fila) y devuelve
+segmentos con tiempos absolutos; cada segmento se asigna a su grabación por
+el desplazamiento de su tramo y los tiempos se vuelven relativos a ella.
+
+Las grabaciones de más de 30 s (una ventana de Whisper) o casi vacías se
+transcriben por separado con el modelo normal, en el mismo worker. Un error
+en una grabación no afecta a las demás del lote.
+
+Requiere faster-whisper 1.2.x: en 1.1 clip_timestamps va en muestras y el
+seek de los segmentos se calcula de otra forma (ver requirements.txt).
+
+Con WHISPER_BATCH_MAX_SIZE=1 se envía cada petición directamente al pool.
+Benchmark: python benchmark_whisper_batching.py
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple, Union
+
+from app.services.whisper_pool import WhisperPool, WhisperPoolBusy, whisper_pool, worker_model
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_SIZE = int(os.getenv("WHISPER_BATCH_MAX_SIZE", "8"))
+# Espera máxima del primer audio de un lote antes de enviarlo incompleto
+BATCH_MAX_WAIT_MS = float(os.getenv("WHISPER_BATCH_MAX_WAIT_MS", "25"))
+BATCH_BEAM_SIZE = int(os.getenv("WHISPER_BATCH_BEAM_SIZE", "5"))
+
+SAMPLING_RATE = 16000
+# Una ventana de Whisper: los tramos más largos se truncarían en el lote
+MAX_BATCHED_SECONDS = 30.0
+# Tramos más cortos que un frame podrían compartir seek con el siguiente
+MIN_BATCHED_SECONDS = 0.1
+
+
+# ==================== Lado del worker ====================
+
+def _run_batch(
+    audios: List[Any],
+    language: str,
+    word_timestamps: bool,
+    beam_size: int
+) -> Tuple[List[Any], float, float]:
+    """
+    Transcribe varios audios (rutas o muestras de 16 kHz) en un solo lote del pipeline.
+
+    Returns:
+        (un resultado o excepción por audio, inicio, fin)
+    """
+    import numpy as np
+    from faster_whisper import BatchedInferencePipeline
+    from faster_whisper.audio import decode_audio
+    from app.services.whisper_service import format_segments, transcribe_with_model
+
+    started = time.time()
+    model = worker_model()
+    results: List[Any] = [None] * len(audios)
+
+    clips: List[Tuple[int, Any]] = []
+    for i, audio in enumerate(audios):
+        try:
+            samples = decode_audio(audio, sampling_rate=SAMPLING_RATE) if isinstance(audio, str) else audio
+            if MIN_BATCHED_SECONDS * SAMPLING_RATE <= len(samples) <= MAX_BATCHED_SECONDS * SAMPLING_RATE:
+                clips.append((i, samples))
+                continue
+            results[i] = transcribe_with_model(model, samples, language, word_timestamps)
+        except Exception as e:
+            results[i] = e
+
+    if clips:
+        offsets = []
+        position = 0
+        for _, samples in clips:
+            offsets.append(position)
+            position += len(samples)
+
+        try:
+            pipeline = BatchedInferencePipeline(model)
+            segments, info = pipeline.transcribe(
+                np.concatenate([samples for _, samples in clips]),
+                language=language,
+                word_timestamps=word_timestamps,
+                beam_size=beam_size,
+                batch_size=len(clips),
+                vad_filter=False,
+                clip_timestamps=[
+                    {"start": offset / SAMPLING_RATE, "end": (offset + len(samples)) / SAMPLING_RATE}
+                    for offset, (_, samples) in zip(offsets, clips)
+                ]
+            )
+
+            # El pipeline marca cada segmento con el seek (frames) del inicio de su tramo,
+            # calculado a partir de la misma conversión segundos -> muestras
+            fps = model.frames_per_second
+            by_seek: Dict[int, int] = {}
+            for k, offset in enumerate(offsets):
+                start_sample = int(offset / SAMPLING_RATE * SAMPLING_RATE)
+                by_seek[int(start_sample / SAMPLING_RATE * fps)] = k
+
+            clip_segments: List[list] = [[] for _ in clips]
+            for segment in segments:
+                clip_segments[by_seek[segment.seek]].append(segment)
+
+            for k, (i, samples) in enumerate(clips):
+                results[i] = format_segments(
+                    clip_segments[k],
+                    info.language,
+                    len(samples) / SAMPLING_RATE,
+                    word_timestamps,
+                    offset=offsets[k] / SAMPLING_RATE
+                )
+        except Exception as e:
+            for i, _ in clips:
+                results[i] = e
+
+    return results, started, time.time()
+
+
+# ==================== Planificador ====================
+
+@dataclass
+class _PendingRequest:
+    audio: Any
+    future: asyncio.Future
+
+
+class WhisperBatcher:
+
+    def __init__(
+        self,
+        pool: WhisperPool = whisper_pool,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        beam_size: int = BATCH_BEAM_SIZE
+    ):
+        self.pool = pool
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.beam_size = beam_size
+
+        # Lotes abiertos por (idioma, word_timestamps): solo se juntan peticiones compatibles
+        self._pending: Dict[Tuple[str, bool], List[_PendingRequest]] = {}
+        self._timers: Dict[Tuple[str, bool], asyncio.TimerHandle] = {}
+        self._outstanding = 0
+
+        self.requests = 0
+        self.batches = 0
+        self.flush_reasons: Counter = Counter()
+        self.batch_sizes: Counter = Counter()
+
+    @property
+    def capacity(self) -> int:
+        """Peticiones admitidas a la vez: cada lugar del pool atiende un lote completo."""
+        return self.pool.capacity * self.max_batch_size
+
+    async def transcribe(
+        self,
+        audio: Union[str, Any],
+        language: str = "en",
+        word_timestamps: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Igual que WhisperPool.transcribe, pero agrupando peticiones concurrentes.
+
+        Raises:
+            FileNotFoundError: si el audio no existe
+            WhisperPoolBusy: si la cola está llena
+        """
+        if self.max_batch_size == 1:
+            return await self.pool.transcribe(audio, language, word_timestamps)
+
+        if isinstance(audio, str) and not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+
+        if self._outstanding >= self.capacity:
+            self.pool.rejected += 1
+            raise WhisperPoolBusy()
+
+        loop = asyncio.get_running_loop()
+        key = (language, word_timestamps)
+        request = _PendingRequest(audio, loop.create_future())
+        batch = self._pending.setdefault(key, [])
+        batch.append(request)
+        self._outstanding += 1
+        self.requests += 1
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key, "full")
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait_ms / 1000, self._flush, key, "timeout")
+
+        # _outstanding baja cuando el lote termina, no cuando se cancela esta espera:
+        # la transcripción ya enviada sigue ocupando el pool
+        return await request.future
+
+    def _flush(self, key: Tuple[str, bool], reason: str) -> None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        pending = self._pending.pop(key, [])
+        # Las peticiones canceladas (cliente desconectado) no se transcriben
+        batch = [r for r in pending if not r.future.done()]
+        self._outstanding -= len(pending) - len(batch)
+        if not batch:
+            return
+
+        self.batches += 1
+        self.flush_reasons[reason] += 1
+        self.batch_sizes[len(batch)] += 1
+        asyncio.get_running_loop().create_task(self._run(key, batch))
+
+    async def _run(self, key: Tuple[str, bool], batch: List[_PendingRequest]) -> None:
+        language, word_timestamps = key
+        try:
+            results = await self.pool.submit(
+                _run_batch, [r.audio for r in batch], language, word_timestamps, self.beam_size
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self._outstanding -= len(batch)
+
+        for request, result in zip(batch, results):
+            if request.future.done():
+                continue
+            if isinstance(result, BaseException):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "outstanding": self._outstanding,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "flush_reasons": dict(self.flush_reasons)
+        }
+
+
+# Instancia global del planificador
+whisper_batcher = WhisperBatcher()
@@ -0,0 +1,271 @@
+"""
+Pool de Ejecución de Whisper
+============================
+
+La inferencia de faster-whisper (CTranslate2) bloquea varios segundos. Si se
+llama desde una corrutina detiene el event loop y todas las peticiones del
+worker de la API. Este pool la ejecuta fuera del loop:
+
+    result = await whisper_pool.transcribe(audio_path)
+
+Modos (WHISPER_POOL_MODE):
+  - thread:  hilos del mismo proceso (default). CTranslate2 libera el GIL
+             durante la inferencia, así que los hilos corren en paralelo.
+  - process: procesos separados (spawn). Aísla memoria y fallos del modelo,
+             a costa de más RAM y de copiar los resultados entre procesos.
+
+Cada worker carga su propio modelo una sola vez (initializer) y lo reutiliza.
+La cola está acotada: con WHISPER_POOL_WORKERS transcribiendo y
+WHISPER_POOL_MAX_QUEUE esperando, las nuevas peticiones fallan de inmediato con
+WhisperPoolBusy (el endpoint responde 503 con Retry-After) en lugar de
+acumular esperas de minutos.
+
+Métricas en stats(): profundidad de la cola, espera en cola y latencia de
+inferencia (promedio, p50, p95 de las últimas WHISPER_POOL_LATENCY_WINDOW).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures.thread import BrokenThreadPool
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+POOL_MODE = os.getenv("WHISPER_POOL_MODE", "thread").lower()
+POOL_WORKERS = int(os.getenv("WHISPER_POOL_WORKERS", "1"))
+# Peticiones que pueden esperar detrás de las que se están transcribiendo
+POOL_MAX_QUEUE = int(os.getenv("WHISPER_POOL_MAX_QUEUE", "16"))
+POOL_MODEL = os.getenv("WHISPER_POOL_MODEL", "base")
+# Hilos de CPU por modelo (0 = default de CTranslate2)
+POOL_CPU_THREADS = int(os.getenv("WHISPER_POOL_CPU_THREADS", "0"))
+LATENCY_WINDOW = int(os.getenv("WHISPER_POOL_LATENCY_WINDOW", "200"))
+
+
+class WhisperPoolBusy(Exception):
+    """La cola de transcripción está llena"""
+
+    def __init__(self, retry_after: int = 5):
+        super().__init__("Transcription queue is full, try again later")
+        self.retry_after = retry_after
+
+
+# ==================== Lado del worker ====================
+
+_worker_state = threading.local()
+
+
+def _init_worker(model_size: str, cpu_threads: int) -> None:
+    """Carga el modelo del worker (una vez por hilo o proceso)."""
+    from app.services.whisper_service import load_whisper_model
+    _worker_state.model = load_whisper_model(model_size, cpu_threads=cpu_threads)
+
+
+def worker_model():
+    """Modelo cargado por el worker actual (solo dentro de funciones enviadas con submit)."""
+    return _worker_state.model
+
+
+def _run_transcription(
+    audio: Any,
+    language: str,
+    word_timestamps: bool
+) -> Tuple[Dict[str, Any], float, float]:
+    """
+    Returns:
+        (resultado, inicio, fin) con tiempos de reloj para medir la espera en cola
+    """
+    from app.services.whisper_service import transcribe_with_model
+
+    started = time.time()
+    result = transcribe_with_model(worker_model(), audio, language, word_timestamps)
+    return result, started, time.time()
+
+
+def _percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+# ==================== Pool ====================
+
+class WhisperPool:
+
+    def __init__(
+        self,
+        mode: str = POOL_MODE,
+        workers: int = POOL_WORKERS,
+        max_queue: int = POOL_MAX_QUEUE,
+        model_size: str = POOL_MODEL,
+        cpu_threads: int = POOL_CPU_THREADS
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown WHISPER_POOL_MODE: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.model_size = model_size
+        self.cpu_threads = cpu_threads
+
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue_wait_ms = deque(maxlen=LATENCY_WINDOW)
+        self._inference_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                initargs = (self.model_size, self.cpu_threads)
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        # fork copiaría los hilos de CTranslate2 del proceso padre
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=initargs
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="whisper",
+                        initializer=_init_worker,
+                        initargs=initargs
+                    )
+                logger.info(
+                    f"Whisper pool started: {self.workers} {self.mode} worker(s), "
+                    f"model '{self.model_size}', queue limit {self.max_queue}"
+                )
+            return self._executor
+
+    @property
+    def capacity(self) -> int:
+        """Peticiones admitidas a la vez (transcribiendo + en cola)."""
+        return self.workers + self.max_queue
+
+    async def transcribe(
+        self,
+        audio: Union[str, Any],
+        language: str = "en",
+        word_timestamps: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Transcribe en un worker del pool (mismo formato que WhisperService.transcribe).
+        `audio` es una ruta o las muestras ya decodificadas (16 kHz, float32).
+
+        Raises:
+            FileNotFoundError: si el audio no existe
+            WhisperPoolBusy: si la cola está llena
+        """
+        if isinstance(audio, str) and not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+        return await self.submit(_run_transcription, audio, language, word_timestamps)
+
+    async def submit(self, fn: Callable[..., Tuple[Any, float, float]], *args) -> Any:
+        """
+        Ejecuta `fn(*args)` en un worker. `fn` debe ser una función de módulo
+        (picklable en modo process) que use el modelo del worker y devuelva
+        (resultado, inicio, fin) con tiempos de time.time().
+
+        Raises:
+            WhisperPoolBusy: si la cola está llena
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise WhisperPoolBusy()
+            self._in_flight += 1
+            self.submitted += 1
+
+        submitted_at = time.time()
+        try:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._release_slot()
+                raise
+            # El lugar se libera cuando el trabajo termina (o se cancela antes de
+            # empezar), no cuando se cancela quien espera (EVAL_TRANSCRIBE_TIMEOUT,
+            # cliente desconectado): el worker sigue ocupado con él
+            future.add_done_callback(self._release_slot)
+            result, started, finished = await asyncio.wrap_future(future)
+        except (BrokenThreadPool, BrokenProcessPool) as e:
+            # Un worker no pudo cargar el modelo o murió: se recrea en la próxima petición
+            self._discard_executor()
+            with self._lock:
+                self.failed += 1
+            raise RuntimeError(f"Whisper worker unavailable: {e}")
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+
+        with self._lock:
+            self.completed += 1
+            self._queue_wait_ms.append(max(started - submitted_at, 0.0) * 1000)
+            self._inference_ms.append((finished - started) * 1000)
+        return result
+
+    def _release_slot(self, _future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _discard_executor(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        """Crea los workers por adelantado (el modelo se carga en cada uno)."""
+        self._get_executor()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queue_wait = list(self._queue_wait_ms)
+            inference = list(self._inference_ms)
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "model": self.model_size,
+                "started": self._executor is not None,
+                "in_flight": self._in_flight,
+                "queue_depth": max(self._in_flight - self.workers, 0),
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "queue_wait_ms": {
+                    "avg": round(sum(queue_wait) / len(queue_wait), 1) if queue_wait else 0.0,
+                    "p95": round(_percentile(queue_wait, 0.95), 1)
+                },
+                "inference_ms": {
+                    "avg": round(sum(inference) / len(inference), 1) if inference else 0.0,
+                    "p50": round(_percentile(inference, 0.5), 1),
+                    "p95": round(_percentile(inference, 0.95), 1)
+                }
+            }
+
+
+# Instancia global del pool
+whisper_pool = WhisperPool()
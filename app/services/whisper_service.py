@@ -18,7 +18,7 @@ Models available (trade-off speed/accuracy):
 
 import os
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Union
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -28,6 +28,46 @@ _model = None
 _model_size = None
 
 
+def load_whisper_model(model_size: str = "small", cpu_threads: int = 0):
+    """
+    Load a new Whisper model instance (GPU if available, int8 on CPU).
+    
+    Args:
+        model_size: Model to load
+        cpu_threads: CTranslate2 threads per model (0 = library default)
+    """
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        logger.error("faster-whisper not installed. Run: pip install faster-whisper")
+        raise ImportError("faster-whisper is required. Install with: pip install faster-whisper")
+    
+    logger.info(f"Loading Whisper model '{model_size}'...")
+    
+    # Check for GPU availability
+    device = "cpu"
+    compute_type = "int8"  # Optimized for CPU
+    
+    try:
+        import torch
+        if torch.cuda.is_available():
+            device = "cuda"
+            compute_type = "float16"
+            logger.info("Using GPU for Whisper transcription")
+    except ImportError:
+        pass
+    
+    model = WhisperModel(
+        model_size,
+        device=device,
+        compute_type=compute_type,
+        cpu_threads=cpu_threads
+    )
+    
+    logger.info(f"Whisper model '{model_size}' loaded successfully on {device}")
+    return model
+
+
 def get_whisper_model(model_size: str = "small"):
     """
     Get or initialize the Whisper model (singleton pattern).
@@ -36,40 +76,73 @@ def get_whisper_model(model_size: str = "small"):
     global _model, _model_size
     
     if _model is None or _model_size != model_size:
-        try:
-            from faster_whisper import WhisperModel
-            
-            logger.info(f"Loading Whisper model '{model_size}'...")
-            
-            # Check for GPU availability
-            device = "cpu"
-            compute_type = "int8"  # Optimized for CPU
-            
-            try:
-                import torch
-                if torch.cuda.is_available():
-                    device = "cuda"
-                    compute_type = "float16"
-                    logger.info("Using GPU for Whisper transcription")
-            except ImportError:
-                pass
-            
-            _model = WhisperModel(
-                model_size,
-                device=device,
-                compute_type=compute_type
-            )
-            _model_size = model_size
-            
-            logger.info(f"Whisper model '{model_size}' loaded successfully on {device}")
-            
-        except ImportError:
-            logger.error("faster-whisper not installed. Run: pip install faster-whisper")
-            raise ImportError("faster-whisper is required. Install with: pip install faster-whisper")
+        _model = load_whisper_model(model_size)
+        _model_size = model_size
     
     return _model
 
 
+def transcribe_with_model(
+    model,
+    audio: Union[str, Any],
+    language: str = "en",
+    word_timestamps: bool = True
+) -> Dict[str, Any]:
+    """
+    Transcribe `audio` (a file path or 16 kHz float32 samples already
+    decoded by audio_preprocessing) with an already loaded model.
+    
+    Returns:
+        Dictionary with text, words (ms), language and duration_ms
+        (see WhisperService.transcribe)
+    """
+    segments, info = model.transcribe(
+        audio,
+        language=language,
+        word_timestamps=word_timestamps,
+        beam_size=5,
+        vad_filter=True  # Filter out silence
+    )
+    return format_segments(segments, info.language, info.duration, word_timestamps)
+
+
+def format_segments(
+    segments,
+    language: str,
+    duration: float,
+    word_timestamps: bool = True,
+    offset: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Build the transcription result from faster-whisper segments.
+    
+    Args:
+        offset: Seconds subtracted from every word time (segments of a clip
+            that was transcribed inside a longer, batched audio)
+    """
+    words = []
+    full_text = []
+    
+    for segment in segments:
+        full_text.append(segment.text.strip())
+        
+        if word_timestamps and segment.words:
+            for word in segment.words:
+                words.append({
+                    "word": word.word.strip(),
+                    "start": max(int((word.start - offset) * 1000), 0),  # Convert to ms
+                    "end": max(int((word.end - offset) * 1000), 0),
+                    "confidence": round(word.probability, 3) if hasattr(word, 'probability') else 0.9
+                })
+    
+    return {
+        "text": " ".join(full_text),
+        "words": words if word_timestamps else [],
+        "language": language,
+        "duration_ms": int(duration * 1000)
+    }
+
+
 class WhisperService:
     """
     Speech-to-text service using faster-whisper (local, free).
@@ -124,37 +197,9 @@ class WhisperService:
         logger.info(f"Transcribing audio: {audio_path}")
         
         try:
-            segments, info = self.model.transcribe(
-                audio_path,
-                language=language,
-                word_timestamps=word_timestamps,
-                beam_size=5,
-                vad_filter=True  # Filter out silence
-            )
-            
-            words = []
-            full_text = []
-            
-            for segment in segments:
-                full_text.append(segment.text.strip())
-                
-                if word_timestamps and segment.words:
-                    for word in segment.words:
-                        words.append({
-                            "word": word.word.strip(),
-                            "start": int(word.start * 1000),  # Convert to ms
-                            "end": int(word.end * 1000),
-                            "confidence": round(word.probability, 3) if hasattr(word, 'probability') else 0.9
-                        })
-            
-            result = {
-                "text": " ".join(full_text),
-                "words": words if word_timestamps else [],
-                "language": info.language,
-                "duration_ms": int(info.duration * 1000)
-            }
+            result = transcribe_with_model(self.model, audio_path, language, word_timestamps)
             
-            logger.info(f"Transcription complete: {len(result['text'])} chars, {len(words)} words")
+            logger.info(f"Transcription complete: {len(result['text'])} chars, {len(result['words'])} words")
             return result
             
         except Exception as e:
@@ -0,0 +1,107 @@
+"""
+Mantenimiento del almacenamiento de audio direccionado por contenido.
+
+Uso:
+    python audio_storage.py du                   # reporte de uso de disco
+    python audio_storage.py gc --dry-run         # qué se borraría
+    python audio_storage.py gc                   # borrar blobs sin referencias
+    python audio_storage.py gc --grace-minutes 0
+    python audio_storage.py migrar               # mover audios antiguos a blobs/
+    python audio_storage.py tts-cache            # estadísticas del caché TTS
+    python audio_storage.py tts-cache --purge-legacy [--dry-run]
+    python audio_storage.py tts-cache --clear
+"""
+
+import argparse
+import json
+import sys
+
+from app.db.session import SessionLocal
+from app.services.audio_blob_service import audio_blob_service, GC_GRACE_MINUTES
+from app.services.tts_cache import tts_cache
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def print_usage(report: dict) -> None:
+    print(f"Blobs:              {report['blobs']['files']} archivos, {_mb(report['blobs']['bytes'])}")
+    print(f"  referenciados:    {_mb(report['referenced_bytes'])}")
+    print(f"  sin referencia:   {report['unreferenced']['files']} archivos, {_mb(report['unreferenced']['bytes'])}")
+    print(f"Referencias:        {report['references'] or '-'}")
+    print(f"Sin deduplicar:     {_mb(report['logical_bytes'])} (ahorro {_mb(report['dedup_saved_bytes'])})")
+    print("Directorios:")
+    for name, usage in report["directories"].items():
+        print(f"  {name:18s} {usage['files']:6d} archivos  {_mb(usage['bytes'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento del almacenamiento de audio")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    du = sub.add_parser("du", help="Reporte de uso de disco")
+    du.add_argument("--json", action="store_true", help="Salida en JSON")
+
+    gc = sub.add_parser("gc", help="Borrar blobs sin referencias (mark-and-sweep)")
+    gc.add_argument("--dry-run", action="store_true", help="Solo informar, no borrar")
+    gc.add_argument("--grace-minutes", type=int, default=GC_GRACE_MINUTES,
+                    help="No borrar blobs modificados hace menos de N minutos")
+
+    migrar = sub.add_parser("migrar", help="Mover audios con nombre antiguo al almacenamiento por contenido")
+    migrar.add_argument("--dry-run", action="store_true", help="Solo informar, no mover")
+
+    tts = sub.add_parser("tts-cache", help="Caché de audio TTS")
+    tts.add_argument("--clear", action="store_true", help="Vaciar el caché")
+    tts.add_argument("--purge-legacy", action="store_true",
+                     help="Borrar los audios TTS del esquema anterior que ya no se usan")
+    tts.add_argument("--dry-run", action="store_true", help="Solo informar, no borrar")
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.comando == "du":
+            report = audio_blob_service.disk_usage(db)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                print_usage(report)
+
+        elif args.comando == "gc":
+            result = audio_blob_service.collect_garbage(
+                db, dry_run=args.dry_run, grace_minutes=args.grace_minutes
+            )
+            if result is None:
+                print("Otra recolección está en curso; no se hizo nada.")
+                sys.exit(0)
+            accion = "Se borrarían" if args.dry_run else "Borrados"
+            print(f"Blobs vivos: {result['live_blobs']}")
+            print(f"Referencias colgantes: {result['dangling_refs']}")
+            print(f"{accion}: {result['deleted_files']} archivos ({_mb(result['freed_bytes'])}), "
+                  f"{result['deleted_rows']} filas")
+            if result["kept_recent"]:
+                print(f"Respetados por período de gracia: {result['kept_recent']}")
+
+        elif args.comando == "migrar":
+            result = audio_blob_service.migrate_legacy_files(db, dry_run=args.dry_run)
+            print(f"Lecciones: {result['lessons']}, líneas de diálogo: {result['dialogue_lines']}, "
+                  f"archivos no encontrados: {result['missing']}")
+
+        elif args.comando == "tts-cache":
+            if args.purge_legacy:
+                result = audio_blob_service.purge_legacy_tts(db, dry_run=args.dry_run)
+                accion = "Se borrarían" if args.dry_run else "Borrados"
+                print(f"{accion}: {result['deleted_files']} archivos antiguos ({_mb(result['freed_bytes'])}), "
+                      f"en uso: {result['kept_in_use']}")
+            if args.clear and not args.dry_run:
+                print(f"Entradas borradas del caché: {tts_cache.clear()}")
+            stats = tts_cache.stats()
+            print(f"Caché TTS: {stats['entries']} entradas, {_mb(stats['size_bytes'])} "
+                  f"de {_mb(stats['max_bytes'])}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Worker de procesamiento de audio (alineación con Gentle).
+
+Consume la cola audio_processing_jobs; se pueden ejecutar varios workers
+en paralelo (en una o varias máquinas) sin que tomen el mismo trabajo.
+
+Uso:
+    python audio_worker.py
+    python audio_worker.py --concurrency 4 --poll-interval 1
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from app.services.audio_job_queue import AudioWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de la cola de procesamiento de audio")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("AUDIO_WORKER_CONCURRENCY", "2")),
+                        help="Trabajos simultáneos (default: AUDIO_WORKER_CONCURRENCY o 2)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Segundos de espera cuando la cola está vacía")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    worker = AudioWorker(concurrency=args.concurrency, poll_interval=args.poll_interval)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark de alineadores (Gentle vs faster-whisper) sobre los audios de muestra.
+
+Para cada audio mide tiempo de alineación, factor de tiempo real, palabras
+alineadas y, si corren ambos backends, la diferencia media de inicio por
+palabra entre ellos. El caché de alineaciones se desactiva durante la medición.
+
+El transcript esperado se toma, en este orden:
+  1. de la lección cuyo audio_url termina en el nombre del archivo (--from-db)
+  2. de la transcripción de Whisper del propio audio
+
+Uso:
+    python benchmark_aligners.py
+    python benchmark_aligners.py --backends whisper --from-db
+    python benchmark_aligners.py --files test_maria.mp3 memo.mpeg
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import statistics
+import time
+
+from app.services.alignment_cache import alignment_cache
+from app.services.aligner_service import get_aligner
+
+DEFAULT_FILES = ["test_maria.mp3", "memo.mpeg"] + sorted(glob.glob("uploads/audio/lessons/*.mp3"))
+
+
+def transcript_from_db(audio_path: str):
+    from app.db.session import SessionLocal
+    from app.models.models import AudioLesson
+
+    db = SessionLocal()
+    try:
+        lesson = db.query(AudioLesson).filter(
+            AudioLesson.audio_url.like(f"%{os.path.basename(audio_path)}")
+        ).first()
+        return lesson.transcript_text if lesson else None
+    finally:
+        db.close()
+
+
+def transcript_from_whisper(audio_path: str) -> str:
+    from app.services.whisper_service import whisper_service
+    return whisper_service.transcribe(audio_path, word_timestamps=False)["text"]
+
+
+async def run(files, backends, from_db):
+    alignment_cache.enabled = False
+
+    for audio_path in files:
+        if not os.path.exists(audio_path):
+            print(f"- {audio_path}: no existe, se omite")
+            continue
+
+        transcript = transcript_from_db(audio_path) if from_db else None
+        if not transcript:
+            transcript = await asyncio.to_thread(transcript_from_whisper, audio_path)
+
+        print(f"\n{audio_path} ({os.path.getsize(audio_path) / 1024:.0f} KB, {len(transcript.split())} palabras)")
+
+        results = {}
+        for name in backends:
+            aligner = get_aligner(name)
+            started = time.perf_counter()
+            try:
+                result = await aligner.align(audio_path, transcript)
+            except Exception as e:
+                print(f"  {name:8s} ERROR: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            results[name] = result
+
+            rtf = (result["duration_ms"] / 1000) / elapsed if elapsed else 0
+            print(
+                f"  {name:8s} {elapsed:7.2f}s  x{rtf:5.1f} tiempo real  "
+                f"{result['aligned_words']}/{result['total_words']} alineadas"
+            )
+
+        if len(results) > 1:
+            a, b = list(results.values())[:2]
+            deltas = [abs(wa["start"] - wb["start"]) for wa, wb in zip(a["words"], b["words"])]
+            if deltas:
+                print(
+                    f"  diferencia de inicio: media {statistics.mean(deltas):.0f}ms, "
+                    f"mediana {statistics.median(deltas):.0f}ms"
+                )
+
+    for name in backends:
+        await get_aligner(name).close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de alineación")
+    parser.add_argument("--backends", nargs="+", default=["gentle", "whisper"],
+                        help="Backends a comparar (default: gentle whisper)")
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES,
+                        help="Audios a alinear (default: muestras del repositorio)")
+    parser.add_argument("--from-db", action="store_true",
+                        help="Usar el transcript de la lección que tiene ese audio")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.files, args.backends, args.from_db))
+
+
+if __name__ == "__main__":
+    main()
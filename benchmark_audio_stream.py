@@ -0,0 +1,86 @@
+"""
+Benchmark de throughput del streaming de lecciones de audio.
+
+Simula reproductores contra un servidor en marcha:
+  - full:  descarga completa del archivo
+  - seek:  rangos aleatorios (como el seeking del reproductor de Android)
+  - multi: peticiones con varios rangos (multipart/byteranges)
+  - etag:  revalidación con If-None-Match (debe responder 304)
+
+Uso:
+    python benchmark_audio_stream.py --url http://localhost:8000/api/v1/audio-lessons/1/stream
+    python benchmark_audio_stream.py --url ... --mode seek --concurrency 32 --requests 2000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import aiohttp
+
+
+async def run(url: str, mode: str, concurrency: int, total: int, range_size: int) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.head(url) as response:
+            response.raise_for_status()
+            size = int(response.headers["Content-Length"])
+            etag = response.headers.get("ETag")
+
+        def request_headers() -> dict:
+            if mode == "seek":
+                start = random.randrange(0, max(size - range_size, 1))
+                return {"Range": f"bytes={start}-{start + range_size - 1}"}
+            if mode == "multi":
+                starts = sorted(random.sample(range(0, max(size - range_size, 4)), 3))
+                return {"Range": "bytes=" + ",".join(f"{s}-{s + range_size // 4}" for s in starts)}
+            if mode == "etag":
+                return {"If-None-Match": etag}
+            return {}
+
+        latencies = []
+        statuses = {}
+        transferred = 0
+        queue = asyncio.Queue()
+        for _ in range(total):
+            queue.put_nowait(None)
+
+        async def client():
+            nonlocal transferred
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                async with session.get(url, headers=request_headers()) as response:
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        transferred += len(chunk)
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"modo={mode} archivo={size / 1024:.0f} KB concurrencia={concurrency} peticiones={total}")
+    print(f"  estados:     {statuses}")
+    print(f"  peticiones/s {total / elapsed:10.1f}")
+    print(f"  MB/s         {transferred / elapsed / (1024 * 1024):10.1f}")
+    print(f"  latencia     p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del endpoint /audio-lessons/{id}/stream")
+    parser.add_argument("--url", required=True, help="URL completa del endpoint de streaming")
+    parser.add_argument("--mode", choices=["full", "seek", "multi", "etag"], default="seek")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--range-size", type=int, default=64 * 1024, help="Bytes por rango (seek/multi)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.mode, args.concurrency, args.requests, args.range_size))
+
+
+if __name__ == "__main__":
+    main()
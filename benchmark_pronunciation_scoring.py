@@ -0,0 +1,68 @@
+"""
+Micro-benchmark del motor de calificación de pronunciación.
+
+Mide el tiempo de score_pronunciation() para líneas de distinto largo con
+una transcripción casi correcta (caso típico) y con una muy distinta (peor
+caso de la alineación O(n*m)).
+
+Uso:
+    python benchmark_pronunciation_scoring.py
+    python benchmark_pronunciation_scoring.py --lengths 10 50 200 --repeat 200
+"""
+
+import argparse
+import random
+import time
+
+from app.services.pronunciation_scoring import score_pronunciation
+
+VOCABULARY = (
+    "the a to and of in is you that it he was for on are as with his they at be this "
+    "have from or one had by word but not what all were we when your can said there use"
+).split()
+
+
+def make_case(length, error_rate, rng):
+    expected = [rng.choice(VOCABULARY) for _ in range(length)]
+    spoken = []
+    for word in expected:
+        roll = rng.random()
+        if roll < error_rate / 3:
+            continue  # omitida
+        if roll < 2 * error_rate / 3:
+            spoken.append(rng.choice(VOCABULARY))  # sustituida
+        else:
+            spoken.append(word)
+        if rng.random() < error_rate / 3:
+            spoken.append(rng.choice(VOCABULARY))  # insertada
+    aligned = [
+        {"word": w, "start": i * 300, "end": i * 300 + 250, "confidence": 0.9 if rng.random() > error_rate else 0.0}
+        for i, w in enumerate(expected)
+    ]
+    return " ".join(expected), aligned, " ".join(spoken)
+
+
+def bench(case, repeat):
+    expected, aligned, spoken = case
+    started = time.perf_counter()
+    for _ in range(repeat):
+        score_pronunciation(expected, aligned, spoken)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de calificación de pronunciación")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[8, 25, 60, 150, 300])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'palabras':>8s}  {'10% errores':>12s}  {'60% errores':>12s}")
+    for length in args.lengths:
+        typical = bench(make_case(length, 0.1, rng), args.repeat)
+        worst = bench(make_case(length, 0.6, rng), args.repeat)
+        print(f"{length:8d}  {typical:9.3f} ms  {worst:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark de transcripción individual vs micro-lotes de Whisper.
+
+Simula una clase enviando grabaciones cortas a /evaluate a la vez: corta los
+audios de muestra en clips de --clip-seconds (test_maria.mp3 ya es corto),
+lanza --requests transcripciones concurrentes y mide throughput y latencia:
+
+  - individual: cada petición es una llamada al pool (WHISPER_BATCH_MAX_SIZE=1)
+  - lotes:      las peticiones pasan por el planificador de micro-lotes
+
+También compara los textos de ambos modos (los lotes no usan fallback de
+temperatura, así que pueden diferir en audios difíciles).
+
+Uso:
+    python benchmark_whisper_batching.py
+    python benchmark_whisper_batching.py --requests 48 --batch-size 16 --max-wait-ms 50
+    python benchmark_whisper_batching.py --files test_maria.mp3 memo.mpeg --clip-seconds 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import wave
+
+from app.services.whisper_batcher import SAMPLING_RATE, WhisperBatcher
+from app.services.whisper_pool import WhisperPool
+
+DEFAULT_FILES = ["test_maria.mp3", "memo.mpeg"]
+
+
+def make_clips(files, clip_seconds, out_dir):
+    """Corta cada audio en clips WAV de clip_seconds (16 kHz mono)."""
+    import numpy as np
+    from faster_whisper.audio import decode_audio
+
+    clips = []
+    step = int(clip_seconds * SAMPLING_RATE)
+    for audio_path in files:
+        if not os.path.exists(audio_path):
+            print(f"- {audio_path}: no existe, se omite")
+            continue
+        samples = decode_audio(audio_path, sampling_rate=SAMPLING_RATE)
+        for n, start in enumerate(range(0, len(samples), step)):
+            piece = samples[start:start + step]
+            if len(piece) < SAMPLING_RATE // 2:
+                continue
+            path = os.path.join(out_dir, f"{os.path.basename(audio_path)}.{n:03d}.wav")
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(SAMPLING_RATE)
+                f.writeframes((np.clip(piece, -1, 1) * 32767).astype("<i2").tobytes())
+            clips.append(path)
+    return clips
+
+
+async def run_mode(batcher, paths):
+    latencies = []
+
+    async def one(path):
+        started = time.perf_counter()
+        result = await batcher.transcribe(path)
+        latencies.append(time.perf_counter() - started)
+        return result["text"]
+
+    started = time.perf_counter()
+    texts = await asyncio.gather(*(one(p) for p in paths))
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, texts
+
+
+def report(name, elapsed, latencies, count):
+    latencies = sorted(latencies)
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(
+        f"  {name:10s} {elapsed:7.2f}s  {count / elapsed:6.2f} peticiones/s  "
+        f"latencia p50 {statistics.median(latencies):5.2f}s  p95 {p95:5.2f}s"
+    )
+
+
+async def main(args):
+    pool = WhisperPool(workers=args.workers, max_queue=args.requests, model_size=args.model)
+    pool.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = make_clips(args.files, args.clip_seconds, tmp)
+        if not clips:
+            print("No hay audios para medir")
+            return
+        paths = [clips[i % len(clips)] for i in range(args.requests)]
+        print(
+            f"{len(clips)} clips de hasta {args.clip_seconds}s, {args.requests} peticiones concurrentes, "
+            f"modelo '{args.model}', {args.workers} worker(s)"
+        )
+
+        # Calentamiento: carga del modelo fuera de la medición
+        await pool.transcribe(clips[0])
+
+        single = WhisperBatcher(pool=pool, max_batch_size=1)
+        batched = WhisperBatcher(pool=pool, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms)
+
+        single_elapsed, single_lat, single_texts = await run_mode(single, paths)
+        report("individual", single_elapsed, single_lat, len(paths))
+
+        batched_elapsed, batched_lat, batched_texts = await run_mode(batched, paths)
+        report("lotes", batched_elapsed, batched_lat, len(paths))
+
+        stats = batched.stats()
+        print(f"  lotes: {stats['batches']} (tamaño medio {stats['avg_batch_size']}), {stats['flush_reasons']}")
+        print(f"  mejora de throughput: x{single_elapsed / batched_elapsed:.2f}")
+
+        same = sum(
+            1 for a, b in zip(single_texts, batched_texts)
+            if a.strip().lower() == b.strip().lower()
+        )
+        print(f"  transcripciones idénticas: {same}/{len(paths)}")
+
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de micro-lotes de Whisper")
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES)
+    parser.add_argument("--clip-seconds", type=float, default=5.0)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=25)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--model", default="base")
+    asyncio.run(main(parser.parse_args()))
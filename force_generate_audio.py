@@ -13,6 +13,7 @@ from app.models.models import Dialogue
 # I'll just use the service directly.
 
 from app.services.tts_service import tts_service
+from app.services.audio_storage_service import audio_storage_service
 
 async def generate_all():
     db = SessionLocal()
@@ -35,8 +36,11 @@ async def generate_all():
                     accent=dialogue.voice_accent
                 )
                 
+                # The TTS cache can evict the file: store a copy as a blob
+                blob_path, _, _ = audio_storage_service.ingest_file(audio_path, move=False)
+                
                 # Update DB
-                line.audio_url = audio_path
+                line.audio_url = audio_storage_service.get_public_path(blob_path)
                 line.alignment_json = alignment_json
                 db.add(line)
                 print(f"    -> Generated: {audio_path} (aligned)")
@@ -0,0 +1,60 @@
+"""
+Importación masiva del catálogo de biblioteca desde la línea de comandos.
+
+Uso:
+    python import_library_catalog.py catalogo.csv
+    python import_library_catalog.py donaciones.jsonl --batch-size 1000
+    python import_library_catalog.py catalogo.txt --formato csv --errores errores.json
+"""
+
+import argparse
+import json
+import sys
+
+from app.db.session import SessionLocal
+from app.services.library_import_service import (
+    importar_catalogo, decodificar_lineas, detectar_formato, DEFAULT_BATCH_SIZE
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importar libros, autores y editoriales en lote")
+    parser.add_argument("archivo", help="Archivo CSV o JSON-lines")
+    parser.add_argument("--formato", choices=["csv", "jsonl"], help="Formato (por defecto según la extensión)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Filas por lote")
+    parser.add_argument("--errores", help="Guardar el detalle de errores en este archivo JSON")
+    args = parser.parse_args()
+
+    formato = args.formato or detectar_formato(args.archivo)
+
+    db = SessionLocal()
+    try:
+        with open(args.archivo, "rb") as f:
+            reporte = importar_catalogo(db, decodificar_lineas(f), formato=formato, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(f"Filas procesadas:     {reporte['total_filas']}")
+    print(f"Libros creados:       {reporte['libros_creados']}")
+    print(f"Géneros creados:      {reporte['generos_creados']}")
+    print(f"Editoriales creadas:  {reporte['editoriales_creadas']}")
+    print(f"Autores creados:      {reporte['autores_creados']}")
+    print(f"Errores:              {len(reporte['errores'])}")
+    if reporte["error_fatal"]:
+        print(f"  ✗ Importación interrumpida: {reporte['error_fatal']}")
+
+    for error in reporte["errores"][:20]:
+        print(f"  ✗ Fila {error['fila']} ({error['isbn'] or '-'}): {error['error']}")
+    if len(reporte["errores"]) > 20:
+        print(f"  ... {len(reporte['errores']) - 20} errores más")
+
+    if args.errores:
+        with open(args.errores, "w", encoding="utf-8") as f:
+            json.dump(reporte["errores"], f, ensure_ascii=False, indent=2)
+        print(f"Detalle de errores guardado en {args.errores}")
+
+    sys.exit(1 if reporte["error_fatal"] or (reporte["errores"] and not reporte["libros_creados"]) else 0)
+
+
+if __name__ == "__main__":
+    main()
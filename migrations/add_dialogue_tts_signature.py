@@ -0,0 +1,53 @@
+"""
+Migración: Firma TTS de las líneas de diálogo
+=============================================
+
+Agrega dialogue_lines.tts_signature (SHA-256 de voz + texto con que se generó
+el audio de la línea). POST /dialogues/{id}/generate-audio la usa para no volver
+a sintetizar las líneas que no cambiaron. Las líneas existentes quedan con NULL
+y se regeneran una vez en la próxima generación.
+
+Ejecutar: python migrations/add_dialogue_tts_signature.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.db.session import engine
+from app.core.config import settings
+
+
+def run_migration():
+    """Agrega la columna tts_signature a dialogue_lines."""
+
+    print("=" * 60)
+    print("MIGRACIÓN: Firma TTS de líneas de diálogo")
+    print("=" * 60)
+    print(f"Base de datos: {settings.DB_NAME}")
+    print()
+
+    sql_statements = [
+        "ALTER TABLE dialogue_lines ADD COLUMN IF NOT EXISTS tts_signature VARCHAR(64);",
+    ]
+
+    with engine.connect() as connection:
+        for i, sql in enumerate(sql_statements, 1):
+            try:
+                connection.execute(text(sql))
+                connection.commit()
+                print(f"✓ Statement {i}/{len(sql_statements)} ejecutado correctamente")
+            except Exception as e:
+                print(f"✗ Error en statement {i}: {e}")
+
+    print()
+    print("=" * 60)
+    print("✓ Migración completada")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,15 @@
+-- Migration: Índices compuestos para historial de préstamos por prestatario
+-- Description: Soportan el filtro por usuario/estudiante/profesor + estado y la
+-- paginación keyset (fecha_prestamo DESC, id DESC) de /biblioteca/prestamos/historial.
+
+CREATE INDEX IF NOT EXISTS idx_prestamos_usuario_estado_fecha
+    ON prestamos(usuario_id, estado, fecha_prestamo DESC, id DESC)
+    WHERE usuario_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_prestamos_estudiante_estado_fecha
+    ON prestamos(estudiante_id, estado, fecha_prestamo DESC, id DESC)
+    WHERE estudiante_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_prestamos_profesor_estado_fecha
+    ON prestamos(profesor_id, estado, fecha_prestamo DESC, id DESC)
+    WHERE profesor_id IS NOT NULL;
@@ -0,0 +1,15 @@
+-- Migration: Índices para la vista de calendario de préstamos
+-- Description: El resumen diario (generate_series + GROUP BY) filtra por rango
+-- sobre fecha_prestamo, fecha_devolucion_esperada y fecha_devolucion_real.
+-- idx_prestamos_fecha_devolucion (fecha_devolucion_esperada) ya existe en
+-- add_loan_system_features.sql.
+
+CREATE INDEX IF NOT EXISTS idx_prestamos_fecha_prestamo ON prestamos(fecha_prestamo);
+CREATE INDEX IF NOT EXISTS idx_prestamos_fecha_devolucion_real ON prestamos(fecha_devolucion_real)
+    WHERE fecha_devolucion_real IS NOT NULL;
+
+-- Préstamos devueltos con devolver_libro_v2 antes de este cambio no guardaban
+-- la fecha real de devolución; usar la última actualización como aproximación.
+UPDATE prestamos
+SET fecha_devolucion_real = CAST(updated_at AS DATE)
+WHERE estado = 'DEVUELTO' AND fecha_devolucion_real IS NULL;
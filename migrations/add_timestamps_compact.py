@@ -0,0 +1,72 @@
+"""
+Migración: Timestamps compactos
+===============================
+
+Agrega audio_lessons.timestamps_compact (BYTEA) con los timestamps en formato
+compacto ya comprimido con gzip (ver app/services/timestamps_codec.py) y lo
+calcula para las lecciones que ya tienen timestamps.
+
+Ejecutar: python migrations/add_timestamps_compact.py
+"""
+
+import sys
+import os
+import json
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.db.session import engine
+from app.core.config import settings
+from app.services.timestamps_codec import compress
+
+
+def run_migration():
+    """Agrega la columna y rellena las lecciones existentes."""
+
+    print("=" * 60)
+    print("MIGRACIÓN: Timestamps compactos")
+    print("=" * 60)
+    print(f"Base de datos: {settings.DB_NAME}")
+    print()
+
+    with engine.connect() as connection:
+        try:
+            connection.execute(text(
+                "ALTER TABLE audio_lessons ADD COLUMN IF NOT EXISTS timestamps_compact BYTEA"
+            ))
+            connection.commit()
+            print("✓ Columna timestamps_compact agregada")
+        except Exception as e:
+            print(f"✗ Error agregando la columna: {e}")
+            return
+
+        rows = connection.execute(text(
+            "SELECT id, timestamps_json FROM audio_lessons "
+            "WHERE timestamps_json IS NOT NULL AND timestamps_compact IS NULL"
+        )).all()
+
+        updated = 0
+        for lesson_id, timestamps_json in rows:
+            try:
+                compact = compress(json.loads(timestamps_json))
+            except Exception as e:
+                print(f"✗ Lección {lesson_id}: timestamps inválidos ({e})")
+                continue
+            connection.execute(
+                text("UPDATE audio_lessons SET timestamps_compact = :compact WHERE id = :id"),
+                {"compact": compact, "id": lesson_id}
+            )
+            updated += 1
+        connection.commit()
+        print(f"✓ {updated}/{len(rows)} lecciones con timestamps compactos")
+
+    print()
+    print("=" * 60)
+    print("✓ Migración completada")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_migration()
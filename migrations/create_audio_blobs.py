@@ -0,0 +1,83 @@
+"""
+Migración: Almacenamiento de audio direccionado por contenido
+=============================================================
+
+Crea las tablas audio_blobs y audio_blob_refs usadas por el almacenamiento
+deduplicado (uploads/audio/blobs/ab/cd/<sha256><ext>) y por el recolector de
+basura (python audio_storage.py gc).
+
+Ejecutar: python migrations/create_audio_blobs.py
+Luego, para mover los archivos existentes: python audio_storage.py migrar
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.db.session import engine
+from app.core.config import settings
+
+
+def run_migration():
+    """Ejecuta la migración para crear las tablas de blobs de audio."""
+
+    print("=" * 60)
+    print("MIGRACIÓN: Almacenamiento de audio direccionado por contenido")
+    print("=" * 60)
+    print(f"Base de datos: {settings.DB_NAME}")
+    print()
+
+    sql_statements = [
+        """
+        CREATE TABLE IF NOT EXISTS audio_blobs (
+            sha256 VARCHAR(64) PRIMARY KEY,
+            extension VARCHAR(10) NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            mime_type VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS audio_blob_refs (
+            id SERIAL PRIMARY KEY,
+            owner_type VARCHAR(20) NOT NULL,
+            owner_id INTEGER NOT NULL,
+            sha256 VARCHAR(64) NOT NULL REFERENCES audio_blobs(sha256),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT uq_audio_blob_refs_owner UNIQUE (owner_type, owner_id)
+        );
+        """,
+
+        """
+        CREATE INDEX IF NOT EXISTS ix_audio_blob_refs_sha256
+        ON audio_blob_refs(sha256);
+        """,
+
+        """
+        COMMENT ON TABLE audio_blob_refs IS
+        'Lección o línea de diálogo -> blob de audio; los blobs sin referencias los borra audio_storage.py gc';
+        """,
+    ]
+
+    with engine.connect() as connection:
+        for i, sql in enumerate(sql_statements, 1):
+            try:
+                connection.execute(text(sql))
+                connection.commit()
+                print(f"✓ Statement {i}/{len(sql_statements)} ejecutado correctamente")
+            except Exception as e:
+                print(f"✗ Error en statement {i}: {e}")
+
+    print()
+    print("=" * 60)
+    print("✓ Migración completada")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,101 @@
+"""
+Migración: Cola de procesamiento de audio
+=========================================
+
+Crea la tabla audio_processing_jobs usada por la cola de alineación con
+Gentle (app/services/audio_job_queue.py) y el worker audio_worker.py.
+
+Ejecutar: python migrations/create_audio_processing_jobs.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.db.session import engine
+from app.core.config import settings
+
+
+def run_migration():
+    """Ejecuta la migración para crear la cola de procesamiento."""
+
+    print("=" * 60)
+    print("MIGRACIÓN: Cola de procesamiento de audio")
+    print("=" * 60)
+    print(f"Base de datos: {settings.DB_NAME}")
+    print()
+
+    sql_statements = [
+        """
+        CREATE TABLE IF NOT EXISTS audio_processing_jobs (
+            id SERIAL PRIMARY KEY,
+            audio_lesson_id INTEGER NOT NULL REFERENCES audio_lessons(id) ON DELETE CASCADE,
+
+            -- Estado del trabajo
+            estado VARCHAR(20) NOT NULL DEFAULT 'PENDIENTE',
+            progress INTEGER NOT NULL DEFAULT 0,
+            force_reprocess BOOLEAN NOT NULL DEFAULT FALSE,
+
+            -- Reintentos
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_error TEXT,
+
+            -- Bloqueo del worker
+            locked_by VARCHAR(100),
+            locked_at TIMESTAMP,
+
+            -- Timestamps
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+
+        """
+        CREATE INDEX IF NOT EXISTS idx_audio_processing_jobs_lesson
+        ON audio_processing_jobs(audio_lesson_id, id DESC);
+        """,
+
+        # Índice parcial para que el worker encuentre trabajos listos sin recorrer el historial
+        """
+        CREATE INDEX IF NOT EXISTS idx_audio_processing_jobs_pendientes
+        ON audio_processing_jobs(run_after, id)
+        WHERE estado = 'PENDIENTE';
+        """,
+
+        # Un solo trabajo activo por lección
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_audio_processing_jobs_activo
+        ON audio_processing_jobs(audio_lesson_id)
+        WHERE estado IN ('PENDIENTE', 'PROCESANDO');
+        """,
+
+        """
+        COMMENT ON TABLE audio_processing_jobs IS
+        'Cola de alineación con Gentle: los workers la consumen con FOR UPDATE SKIP LOCKED';
+        """,
+    ]
+
+    with engine.connect() as connection:
+        for i, sql in enumerate(sql_statements, 1):
+            try:
+                connection.execute(text(sql))
+                connection.commit()
+                print(f"✓ Statement {i}/{len(sql_statements)} ejecutado correctamente")
+            except Exception as e:
+                print(f"✗ Error en statement {i}: {e}")
+
+    print()
+    print("=" * 60)
+    print("✓ Migración completada")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_migration()
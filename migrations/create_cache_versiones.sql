@@ -0,0 +1,14 @@
+-- Migration: Versiones de caché para datos de referencia
+-- Description: Un contador por espacio de nombres (generos, editoriales, autores,
+-- modulo_libros). Las escrituras lo incrementan en su misma transacción y las
+-- lecturas lo usan para construir el ETag (app/services/reference_cache.py).
+
+CREATE TABLE IF NOT EXISTS cache_versiones (
+    nombre VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO cache_versiones (nombre) VALUES
+    ('generos'), ('editoriales'), ('autores'), ('modulo_libros')
+ON CONFLICT (nombre) DO NOTHING;
@@ -0,0 +1,83 @@
+-- Migration: Vistas materializadas de estadísticas de biblioteca
+-- Description: Precalcula la circulación por título, por asignación módulo-libro
+-- y la tasa de cobro de multas. Los endpoints /biblioteca/estadisticas leen solo
+-- de estas vistas; nunca recorren prestamos/reservas/multas_prestamo en la petición.
+--
+-- Las vistas se refrescan con REFRESH MATERIALIZED VIEW CONCURRENTLY (requiere
+-- un índice UNIQUE en cada vista) desde LibraryStatsService, de forma periódica
+-- (LIBRARY_STATS_REFRESH_MINUTES) o con: python refresh_library_stats.py
+
+-- 1. Circulación por título
+DROP MATERIALIZED VIEW IF EXISTS mv_biblioteca_circulacion_libro;
+CREATE MATERIALIZED VIEW mv_biblioteca_circulacion_libro AS
+SELECT
+    l.id AS libro_id,
+    l.titulo,
+    l.isbn,
+    l.cantidad_total,
+    COALESCE(p.total_prestamos, 0) AS total_prestamos,
+    COALESCE(p.prestamos_activos, 0) AS prestamos_activos,
+    COALESCE(p.prestamos_30_dias, 0) AS prestamos_30_dias,
+    COALESCE(p.prestamos_90_dias, 0) AS prestamos_90_dias,
+    COALESCE(r.total_reservas, 0) AS total_reservas,
+    ROUND(COALESCE(p.total_prestamos, 0)::numeric / GREATEST(l.cantidad_total, 1), 2) AS prestamos_por_copia,
+    p.ultimo_prestamo,
+    NOW() AS actualizado_en
+FROM libros l
+LEFT JOIN (
+    SELECT
+        libro_id,
+        COUNT(*) AS total_prestamos,
+        COUNT(*) FILTER (WHERE estado = 'ACTIVO') AS prestamos_activos,
+        COUNT(*) FILTER (WHERE fecha_prestamo >= CURRENT_DATE - 30) AS prestamos_30_dias,
+        COUNT(*) FILTER (WHERE fecha_prestamo >= CURRENT_DATE - 90) AS prestamos_90_dias,
+        MAX(fecha_prestamo) AS ultimo_prestamo
+    FROM prestamos
+    GROUP BY libro_id
+) p ON p.libro_id = l.id
+LEFT JOIN (
+    SELECT libro_id, COUNT(*) AS total_reservas
+    FROM reservas
+    GROUP BY libro_id
+) r ON r.libro_id = l.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_circulacion_libro ON mv_biblioteca_circulacion_libro(libro_id);
+CREATE INDEX IF NOT EXISTS idx_mv_circulacion_libro_total ON mv_biblioteca_circulacion_libro(total_prestamos DESC);
+CREATE INDEX IF NOT EXISTS idx_mv_circulacion_libro_90 ON mv_biblioteca_circulacion_libro(prestamos_90_dias DESC);
+
+-- 2. Circulación por asignación módulo-libro
+DROP MATERIALIZED VIEW IF EXISTS mv_biblioteca_circulacion_modulo;
+CREATE MATERIALIZED VIEW mv_biblioteca_circulacion_modulo AS
+SELECT
+    ml.modulo_id,
+    m.nombre AS modulo_nombre,
+    ml.libro_id,
+    l.titulo,
+    ml.tipo_asignacion,
+    ml.activo,
+    COUNT(p.id) AS prestamos_academicos,
+    COUNT(p.id) FILTER (WHERE p.estado = 'ACTIVO') AS prestamos_activos,
+    COUNT(p.id) FILTER (WHERE p.fecha_prestamo >= CURRENT_DATE - 90) AS prestamos_90_dias,
+    NOW() AS actualizado_en
+FROM modulo_libros ml
+JOIN modulos m ON m.id = ml.modulo_id
+JOIN libros l ON l.id = ml.libro_id
+LEFT JOIN prestamos p ON p.libro_id = ml.libro_id AND p.modulo_id = ml.modulo_id
+GROUP BY ml.modulo_id, m.nombre, ml.libro_id, l.titulo, ml.tipo_asignacion, ml.activo;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_circulacion_modulo ON mv_biblioteca_circulacion_modulo(modulo_id, libro_id);
+
+-- 3. Multas por mes: generadas vs. cobradas
+DROP MATERIALIZED VIEW IF EXISTS mv_biblioteca_multas_mensual;
+CREATE MATERIALIZED VIEW mv_biblioteca_multas_mensual AS
+SELECT
+    CAST(date_trunc('month', created_at) AS date) AS mes,
+    COUNT(*) AS multas_generadas,
+    COUNT(*) FILTER (WHERE pagado) AS multas_pagadas,
+    COALESCE(SUM(monto_total), 0) AS monto_generado,
+    COALESCE(SUM(monto_total) FILTER (WHERE pagado), 0) AS monto_cobrado,
+    NOW() AS actualizado_en
+FROM multas_prestamo
+GROUP BY 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_multas_mensual ON mv_biblioteca_multas_mensual(mes);
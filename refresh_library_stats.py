@@ -0,0 +1,34 @@
+"""
+Refresca las vistas materializadas de estadísticas de biblioteca.
+
+Uso (por ejemplo desde cron, si LIBRARY_STATS_REFRESH_MINUTES=0):
+    python refresh_library_stats.py
+    python refresh_library_stats.py --completo   # primer llenado, bloquea lecturas
+"""
+
+import argparse
+import sys
+
+from app.db.session import SessionLocal
+from app.services.library_stats_service import LibraryStatsService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refrescar estadísticas de biblioteca")
+    parser.add_argument("--completo", action="store_true",
+                        help="REFRESH sin CONCURRENTLY (necesario si las vistas se crearon WITH NO DATA)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        refreshed = LibraryStatsService.refresh_views(db, concurrently=not args.completo)
+        if not refreshed:
+            print("Otro proceso está refrescando las estadísticas; no se hizo nada.")
+            sys.exit(0)
+        print(f"Estadísticas actualizadas: {LibraryStatsService.get_ultima_actualizacion(db)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.session import SessionLocal
+from app.models.models import AudioLesson, AudioProcessingJob
+from app.schemas.audio_lesson import AudioJobStatus, AudioLessonStatus
+from app.services.audio_job_queue import LOCK_TIMEOUT_SECONDS, audio_job_queue
+
+
+@pytest.fixture()
+def db():
+    db = SessionLocal()
+    yield db
+    db.close()
+
+
+@pytest.fixture()
+def locked_job(db):
+    """Un trabajo en PROCESANDO bloqueado por worker-a."""
+    lesson = AudioLesson(
+        titulo=f"Job queue test {uuid.uuid4().hex[:8]}",
+        transcript_text="hello world",
+        activo=True
+    )
+    db.add(lesson)
+    db.commit()
+
+    job = audio_job_queue.enqueue(db, lesson)
+    job.estado = AudioJobStatus.PROCESANDO.value
+    job.locked_by = "worker-a"
+    job.locked_at = datetime.utcnow()
+    job.attempts = 1
+    db.commit()
+
+    yield job
+
+    db.rollback()
+    db.query(AudioProcessingJob).filter(AudioProcessingJob.audio_lesson_id == lesson.id).delete()
+    db.query(AudioLesson).filter(AudioLesson.id == lesson.id).delete()
+    db.commit()
+
+
+def _expire_lock(db, job, attempts):
+    job.locked_at = datetime.utcnow() - timedelta(seconds=LOCK_TIMEOUT_SECONDS + 60)
+    job.attempts = attempts
+    db.commit()
+
+
+def test_heartbeat_renews_only_own_lock(db, locked_job):
+    _expire_lock(db, locked_job, attempts=1)
+
+    assert not audio_job_queue.heartbeat(db, locked_job.id, "worker-b")
+    assert audio_job_queue.heartbeat(db, locked_job.id, "worker-a")
+
+    assert audio_job_queue.release_stale(db) == 0
+    db.refresh(locked_job)
+    assert locked_job.estado == AudioJobStatus.PROCESANDO.value
+
+
+def test_stale_job_is_requeued_while_attempts_remain(db, locked_job):
+    _expire_lock(db, locked_job, attempts=1)
+
+    assert audio_job_queue.release_stale(db) == 1
+    db.refresh(locked_job)
+    assert locked_job.estado == AudioJobStatus.PENDIENTE.value
+    assert locked_job.locked_by is None
+
+
+def test_stale_job_without_attempts_left_ends_in_error(db, locked_job):
+    _expire_lock(db, locked_job, attempts=locked_job.max_attempts)
+
+    assert audio_job_queue.release_stale(db) == 1
+    db.refresh(locked_job)
+    assert locked_job.estado == AudioJobStatus.ERROR.value
+    lesson = db.query(AudioLesson).filter(AudioLesson.id == locked_job.audio_lesson_id).one()
+    assert lesson.estado == AudioLessonStatus.ERROR.value
+
+
+def test_previous_owner_cannot_complete_or_fail_reclaimed_job(db, locked_job):
+    locked_job.locked_by = "worker-b"
+    db.commit()
+
+    assert not audio_job_queue.complete(db, locked_job, "worker-a")
+    assert not audio_job_queue.fail(db, locked_job, "worker-a", "boom")
+    db.refresh(locked_job)
+    assert locked_job.estado == AudioJobStatus.PROCESANDO.value
+    assert locked_job.locked_by == "worker-b"
+
+    assert audio_job_queue.complete(db, locked_job, "worker-b")
+    db.refresh(locked_job)
+    assert locked_job.estado == AudioJobStatus.COMPLETADO.value
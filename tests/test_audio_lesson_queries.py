@@ -0,0 +1,136 @@
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from app.db.session import SessionLocal, engine
+from app.models.models import AudioLesson, Estudiante, Modulo, StudentAudioProgress
+from app.services.audio_lesson_service import audio_lesson_service
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque with."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _callback(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._callback)
+
+
+@pytest.fixture()
+def db():
+    db = SessionLocal()
+    yield db
+    db.close()
+
+
+@pytest.fixture()
+def student_lessons(db):
+    """Un estudiante y un módulo propio; las lecciones las agrega cada prueba."""
+    tag = uuid.uuid4().hex[:8]
+    estudiante = Estudiante(nombres=f"Audio {tag}", apellidos="Queries")
+    db.add(estudiante)
+    db.commit()
+
+    created = []
+
+    def add_lessons(count, with_progress_every=2):
+        for i in range(count):
+            lesson = AudioLesson(
+                titulo=f"Query test {tag} {len(created)}",
+                transcript_text="hello world",
+                audio_duration_ms=10_000,
+                orden=len(created) % 3,
+                activo=True
+            )
+            db.add(lesson)
+            db.flush()
+            if i % with_progress_every == 0:
+                db.add(StudentAudioProgress(
+                    estudiante_id=estudiante.id,
+                    audio_lesson_id=lesson.id,
+                    last_position_ms=5_000,
+                    total_time_listened_ms=5_000,
+                    completed=i % 4 == 0
+                ))
+            created.append(lesson.id)
+        db.commit()
+        return list(created)
+
+    yield estudiante, add_lessons
+
+    db.query(AudioLesson).filter(AudioLesson.id.in_(created)).delete(synchronize_session=False)
+    db.query(Estudiante).filter(Estudiante.id == estudiante.id).delete(synchronize_session=False)
+    db.commit()
+
+
+def _count_queries(db, estudiante_id):
+    db.expire_all()
+    with QueryCounter() as counter:
+        lessons = audio_lesson_service.get_student_lessons_with_progress(
+            db, estudiante_id=estudiante_id, limit=10_000
+        )
+    return counter.count, lessons
+
+
+def test_student_lessons_query_count_is_constant(db, student_lessons):
+    estudiante, add_lessons = student_lessons
+
+    add_lessons(3)
+    few_queries, few = _count_queries(db, estudiante.id)
+
+    ids = add_lessons(40)
+    many_queries, many = _count_queries(db, estudiante.id)
+
+    assert few_queries == many_queries == 1
+    own = [l for l in many if l["id"] in set(ids)]
+    assert len(own) == 43
+    assert sum(1 for l in own if l["progress"]) == 22
+    assert all(l["progress_percentage"] == 50.0 for l in own if l["progress"])
+
+
+def test_student_lessons_keyset_pagination(db, student_lessons):
+    estudiante, add_lessons = student_lessons
+    ids = set(add_lessons(25))
+
+    seen = []
+    after = None
+    while True:
+        page = audio_lesson_service.get_student_lessons_with_progress(
+            db, estudiante_id=estudiante.id, after=after, limit=7
+        )
+        seen.extend(l["id"] for l in page)
+        if len(page) < 7:
+            break
+        after = audio_lesson_service.decode_cursor(
+            audio_lesson_service.encode_cursor(page[-1]["orden"], page[-1]["id"])
+        )
+
+    assert len(seen) == len(set(seen))
+    assert ids <= set(seen)
+
+
+def test_lesson_details_single_query(db, student_lessons):
+    _, add_lessons = student_lessons
+    lesson_id = add_lessons(1)[0]
+
+    modulo = db.query(Modulo).first()
+    if modulo:
+        db.query(AudioLesson).filter(AudioLesson.id == lesson_id).update({"modulo_id": modulo.id})
+        db.commit()
+
+    db.expire_all()
+    with QueryCounter() as counter:
+        details = audio_lesson_service.get_lesson_with_details(db, lesson_id)
+
+    assert counter.count == 1
+    assert details["id"] == lesson_id
+    assert details["modulo_nombre"] == (modulo.nombre if modulo else None)
@@ -0,0 +1,69 @@
+import wave
+
+import numpy as np
+import pytest
+
+from app.services.audio_preprocessing import (
+    SAMPLE_RATE, AudioPreprocessingError, find_speech_bounds, preprocess_audio, write_wav
+)
+
+
+def tone(seconds, amplitude=0.5):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def test_speech_bounds_keep_padding():
+    samples = np.concatenate([silence(1.0), tone(0.5), silence(1.0)])
+    start, end = find_speech_bounds(samples, padding_ms=100)
+    assert abs(start - int(0.9 * SAMPLE_RATE)) <= 320
+    assert abs(end - int(1.6 * SAMPLE_RATE)) <= 320
+
+
+def test_preprocess_trims_and_writes_wav(tmp_path):
+    source = str(tmp_path / "upload.wav")
+    write_wav(source, np.concatenate([silence(1.0), tone(1.0), silence(2.0)]))
+
+    prepared = preprocess_audio(source, str(tmp_path / "clean.wav"))
+
+    assert prepared.original_duration_ms == 4000
+    assert 1000 <= prepared.duration_ms <= 1400
+    assert prepared.samples.dtype == np.float32
+    with wave.open(prepared.path) as f:
+        assert (f.getframerate(), f.getnchannels(), f.getnframes()) == (SAMPLE_RATE, 1, len(prepared.samples))
+
+
+def test_preprocess_rejects_silence_and_long_recordings(tmp_path):
+    quiet = str(tmp_path / "quiet.wav")
+    write_wav(quiet, silence(2.0))
+    with pytest.raises(AudioPreprocessingError):
+        preprocess_audio(quiet)
+
+    long = str(tmp_path / "long.wav")
+    write_wav(long, tone(3.0))
+    with pytest.raises(AudioPreprocessingError):
+        preprocess_audio(long, max_seconds=2)
+
+
+def test_preprocess_rejects_undecodable_upload(tmp_path):
+    broken = tmp_path / "broken.webm"
+    broken.write_bytes(b"not audio at all")
+    with pytest.raises(AudioPreprocessingError):
+        preprocess_audio(str(broken))
+
+
+def test_server_faults_are_not_reported_as_bad_audio(tmp_path, monkeypatch):
+    import faster_whisper.audio
+
+    def broken_decoder(*args, **kwargs):
+        raise RuntimeError("decoder misconfigured")
+
+    monkeypatch.setattr(faster_whisper.audio, "decode_audio", broken_decoder)
+    source = str(tmp_path / "upload.wav")
+    write_wav(source, tone(1.0))
+    with pytest.raises(RuntimeError):
+        preprocess_audio(source)
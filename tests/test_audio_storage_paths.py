@@ -0,0 +1,25 @@
+from app.services.audio_storage_service import AudioStorageService
+
+
+def test_public_path_is_under_uploads_mount_for_absolute_base(tmp_path):
+    storage = AudioStorageService(base_path=str(tmp_path / "data" / "audio"))
+    source = tmp_path / "line.mp3"
+    source.write_bytes(b"ID3 fake mp3 content")
+
+    relative_path, _, sha256 = storage.ingest_file(str(source), move=False)
+    public = storage.get_public_path(relative_path)
+
+    assert public == f"uploads/audio/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.mp3"
+    assert storage.parse_blob_sha256(public) == sha256
+
+
+def test_public_path_for_relative_base(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = AudioStorageService(base_path="uploads/audio")
+    assert storage.get_public_path("audio/lessons/a.mp3") == "uploads/audio/lessons/a.mp3"
+
+
+def test_public_path_repairs_absolute_blob_url(tmp_path):
+    storage = AudioStorageService(base_path=str(tmp_path / "audio"))
+    stored = str(tmp_path / "audio" / "blobs" / "ab" / "cd" / ("abcd" + "0" * 60 + ".mp3"))
+    assert storage.get_public_path(stored) == "uploads/audio/blobs/ab/cd/abcd" + "0" * 60 + ".mp3"
@@ -0,0 +1,49 @@
+import asyncio
+
+from aiohttp import web
+
+from app.services.alignment_cache import alignment_cache
+from app.services.gentle_service import CircuitBreaker, GentleService
+
+
+async def _cancel_half_open_probe(audio_path):
+    hang = asyncio.Event()
+
+    async def transcriptions(request):
+        await hang.wait()
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post("/transcriptions", transcriptions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    service = GentleService(gentle_url=f"http://127.0.0.1:{port}")
+    service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    service.breaker.record_failure()
+    assert service.breaker.state == CircuitBreaker.HALF_OPEN
+
+    try:
+        task = asyncio.create_task(service.align(audio_path, "hello world"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return service.breaker.allow_request()
+    finally:
+        hang.set()
+        await service.close()
+        await runner.cleanup()
+
+
+def test_cancelled_probe_releases_half_open_circuit(tmp_path, monkeypatch):
+    monkeypatch.setattr(alignment_cache, "enabled", False)
+    audio = tmp_path / "clip.wav"
+    audio.write_bytes(b"RIFF0000WAVE")
+
+    assert asyncio.run(_cancel_half_open_probe(str(audio)))
@@ -0,0 +1,18 @@
+from app.services import lesson_bundle_service as bundle_module
+from app.services.lesson_bundle_service import LessonBundleService
+
+
+def test_superseded_bundle_survives_grace_period(tmp_path, monkeypatch):
+    service = LessonBundleService(bundle_dir=tmp_path)
+    old = tmp_path / "modulo_7_aaa.zip"
+    new = tmp_path / "modulo_7_bbb.zip"
+    old.write_bytes(b"old")
+    new.write_bytes(b"new")
+
+    # Una descarga que ya recibió la ruta anterior todavía puede abrirla
+    service._remove_old_bundles(7, keep=new)
+    assert old.exists()
+
+    monkeypatch.setattr(bundle_module, "SUPERSEDED_GRACE_SECONDS", 0)
+    service._remove_old_bundles(7, keep=new)
+    assert not old.exists() and new.exists()
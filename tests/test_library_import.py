@@ -0,0 +1,25 @@
+import io
+
+import pytest
+
+from app.services.library_import_service import decodificar_lineas, iter_csv, iter_jsonl
+
+
+def test_jsonl_rows_keep_physical_line_numbers():
+    lineas = ['{"isbn": "1"}\n', "\n", "   \n", "no es json\n", '{"isbn": "2"}\n']
+    assert [n for n, _ in iter_jsonl(lineas)] == [1, 4, 5]
+
+
+def test_csv_rows_keep_physical_line_numbers():
+    lineas = ["isbn,titulo\n", "1,a\n", "\n", "2,b\n"]
+    assert [(n, fila["isbn"]) for n, fila in iter_csv(lineas)] == [(2, "1"), (4, "2")]
+
+
+def test_decoding_stops_at_the_invalid_line():
+    datos = "﻿isbn,titulo\n1,Ñandú\n".encode("utf-8") + b"2,\xff\n3,c\n"
+    lineas = decodificar_lineas(io.BytesIO(datos))
+
+    assert next(lineas) == "isbn,titulo\n"
+    assert next(lineas) == "1,Ñandú\n"
+    with pytest.raises(UnicodeDecodeError):
+        next(lineas)
@@ -0,0 +1,129 @@
+from hypothesis import given, settings, strategies as st
+
+from app.services.pronunciation_scoring import (
+    DELETION, DELETION_COST, INSERTION, INSERTION_COST, MATCH, SUBSTITUTION, SUBSTITUTION_COST,
+    align_words, alignment_cost, edit_distance, score_pronunciation, tokenize
+)
+
+# Vocabulario pequeño: obliga a repetir palabras y a que haya coincidencias
+words = st.lists(st.sampled_from(["the", "cat", "dog", "sat", "on", "a", "mat", "hello"]), max_size=25)
+
+
+def weighted_distance(a, b):
+    """Costo mínimo de referencia, sin backtrace."""
+    previous = [j * INSERTION_COST for j in range(len(b) + 1)]
+    for i, x in enumerate(a, 1):
+        current = [i * DELETION_COST]
+        for j, y in enumerate(b, 1):
+            current.append(min(
+                previous[j] + DELETION_COST,
+                current[j - 1] + INSERTION_COST,
+                previous[j - 1] + (0 if x == y else SUBSTITUTION_COST)
+            ))
+        previous = current
+    return previous[-1]
+
+
+@given(words, words)
+def test_alignment_covers_both_sequences_in_order(ref, hyp):
+    ops = align_words(ref, hyp)
+    assert [o.ref_index for o in ops if o.ref_index is not None] == list(range(len(ref)))
+    assert [o.hyp_index for o in ops if o.hyp_index is not None] == list(range(len(hyp)))
+    for o in ops:
+        if o.op == MATCH:
+            assert ref[o.ref_index] == hyp[o.hyp_index]
+        elif o.op == SUBSTITUTION:
+            assert ref[o.ref_index] != hyp[o.hyp_index]
+        elif o.op == DELETION:
+            assert o.hyp_index is None
+        else:
+            assert o.op == INSERTION and o.ref_index is None
+
+
+@given(words, words)
+def test_alignment_is_minimal(ref, hyp):
+    assert alignment_cost(align_words(ref, hyp)) == weighted_distance(ref, hyp)
+
+
+@given(words, words)
+def test_cost_is_symmetric(ref, hyp):
+    assert alignment_cost(align_words(ref, hyp)) == alignment_cost(align_words(hyp, ref))
+
+
+@given(words, words)
+def test_error_count_bounds(ref, hyp):
+    assert abs(len(ref) - len(hyp)) <= edit_distance(align_words(ref, hyp)) <= len(ref) + len(hyp)
+
+
+@given(words)
+def test_identical_sequences_align_as_matches(ref):
+    assert all(o.op == MATCH for o in align_words(ref, ref))
+
+
+@settings(max_examples=200)
+@given(words, words)
+def test_transcription_only_score_accounts_for_every_word(expected, spoken):
+    result = score_pronunciation(" ".join(expected), [], " ".join(spoken))
+    matched = sum(1 for w in result.word_evaluations if w["matched"])
+
+    assert 0 <= result.score <= 100
+    assert len(result.word_evaluations) == len(expected)
+    assert matched + result.substitutions + result.deletions == len(expected)
+    assert matched + result.substitutions + result.insertions == len(spoken)
+    assert result.missed_words == [w["word"] for w in result.word_evaluations if not w["matched"]]
+
+
+@given(words)
+def test_perfect_reading_scores_100(expected):
+    result = score_pronunciation(" ".join(expected), [], " ".join(expected))
+    assert result.score == 100
+    assert result.substitutions == result.deletions == result.insertions == 0
+
+
+def test_repeated_words_count_once_per_occurrence():
+    result = score_pronunciation("the cat and the dog", [], "the cat")
+    assert [w["status"] for w in result.word_evaluations] == [MATCH, MATCH, DELETION, DELETION, DELETION]
+    assert result.score == 40
+
+
+def test_word_order_matters():
+    result = score_pronunciation("good morning", [], "morning good")
+    assert sum(1 for w in result.word_evaluations if w["matched"]) == 1
+
+
+def test_substitution_reports_spoken_word():
+    result = score_pronunciation("I want a red apple.", [], "I want a bed apple")
+    red = result.word_evaluations[3]
+    assert (red["status"], red["spoken"]) == (SUBSTITUTION, "bed")
+    assert result.missed_words == ["red"]
+
+
+def test_aligner_words_provide_confidence_and_times():
+    aligned = [
+        {"word": "Hello,", "start": 0, "end": 300, "confidence": 0.95},
+        {"word": "world!\n", "start": 0, "end": 0, "confidence": 0.0},
+    ]
+    result = score_pronunciation("Hello, world!", aligned, "hello word")
+    hello, world = result.word_evaluations
+
+    assert (hello["status"], hello["confidence"], hello["end_ms"]) == (MATCH, 0.95, 300)
+    assert (world["status"], world["spoken"]) == (SUBSTITUTION, "word")
+
+
+def test_tokenize_drops_punctuation():
+    assert tokenize("  Don't   STOP, now! ") == ["dont", "stop", "now"]
+
+
+def test_misheard_word_from_whisper_aligner_is_a_substitution():
+    from app.services.aligner_service import map_words_to_transcript
+
+    recognized = [
+        {"word": w, "start": i * 0.3, "end": i * 0.3 + 0.25, "probability": 0.9}
+        for i, w in enumerate(["I", "have", "a", "bat"])
+    ]
+    alignment = map_words_to_transcript(recognized, "I have a hat")
+
+    result = score_pronunciation("I have a hat", alignment["words"], "I have a bat")
+    assert result.score == 75
+    assert result.substitutions == 1
+    assert result.missed_words == ["hat"]
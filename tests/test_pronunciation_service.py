@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from app.services.audio_preprocessing import SAMPLE_RATE, write_wav
+from app.services.pronunciation_service import PronunciationEvaluationError, PronunciationService
+
+
+class SlowWhisper:
+    async def transcribe(self, samples):
+        await asyncio.sleep(1)
+
+
+class BrokenAligner:
+    async def align(self, audio_path, text, samples=None):
+        raise ConnectionError("aligner down")
+
+
+def test_no_transcription_and_no_alignment_is_not_scored(tmp_path):
+    source = str(tmp_path / "attempt.webm")
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    write_wav(source, (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32))
+
+    service = PronunciationService(transcribe_timeout=0.05)
+    service.whisper = SlowWhisper()
+    service.aligner = BrokenAligner()
+
+    with pytest.raises(PronunciationEvaluationError) as info:
+        asyncio.run(service.evaluate(source, "I have a hat"))
+
+    assert info.value.stages == {"transcription": "timeout", "alignment": "failed"}
+    assert info.value.timed_out
+    assert not os.path.exists(str(tmp_path / "attempt.wav"))
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import whisper_batcher as batcher_module
+from app.services import whisper_service
+from app.services.whisper_batcher import WhisperBatcher
+from app.services.whisper_pool import WhisperPool, WhisperPoolBusy
+
+release = threading.Event()
+
+
+def _blocking_job(value):
+    started = time.time()
+    release.wait(5)
+    return value, started, time.time()
+
+
+def _blocking_batch(audios, language, word_timestamps, beam_size):
+    started = time.time()
+    release.wait(5)
+    return [{"text": a} for a in audios], started, time.time()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(whisper_service, "load_whisper_model", lambda *a, **k: object())
+    release.clear()
+    pool = WhisperPool(mode="thread", workers=1, max_queue=0)
+    yield pool
+    release.set()
+    pool.shutdown()
+
+
+async def _wait_idle(counter):
+    for _ in range(100):
+        if counter() == 0:
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("slot never released")
+
+
+def test_cancelled_wait_keeps_slot_until_job_finishes(pool):
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.submit(_blocking_job, 1), timeout=0.1)
+        # The worker is still running the abandoned job: no room for another
+        with pytest.raises(WhisperPoolBusy):
+            await pool.submit(_blocking_job, 2)
+
+        release.set()
+        await _wait_idle(lambda: pool.stats()["in_flight"])
+        assert await pool.submit(_blocking_job, 3) == 3
+
+    asyncio.run(scenario())
+
+
+def test_batcher_counts_abandoned_requests_until_batch_finishes(pool, monkeypatch):
+    monkeypatch.setattr(batcher_module, "_run_batch", _blocking_batch)
+    batcher = WhisperBatcher(pool=pool, max_batch_size=2, max_wait_ms=0)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                asyncio.gather(batcher.transcribe(b"a"), batcher.transcribe(b"b")), timeout=0.1
+            )
+        assert batcher.stats()["outstanding"] == 2
+
+        release.set()
+        await _wait_idle(lambda: batcher.stats()["outstanding"])
+
+    asyncio.run(scenario())